@@ -27,22 +27,22 @@ class RegisterView(CreateView):
 
 def home_view(request):
     """Home page view with dining hall data from database."""
-    from menus.models import DiningHall
+    from menus.cache import get_menu_snapshot
     import random
     import json
     
     # Limit number of dishes per meal type for visualization
     MAX_DISHES_PER_MEAL = 15
     
-    # Load all dining halls from database
-    db_halls = DiningHall.objects.all()
+    # Load all dining halls from the shared menu snapshot
+    snapshot = get_menu_snapshot()
     
     # Build dining hall data structure for JavaScript
     dining_hall_data = {}
     
-    for hall in db_halls:
+    for hall in snapshot.halls:
         hall_key = hall.hallName.lower()
-        meals = hall.meals or {"breakfast": [], "lunch": [], "dinner": []}
+        meals = hall.meals
         
         # Convert to format expected by frontend
         dining_hall_data[hall_key] = {
@@ -52,15 +52,16 @@ def home_view(request):
         }
         
         for meal_type in ['breakfast', 'lunch', 'dinner']:
-            items = meals.get(meal_type, [])
+            items = meals.get(meal_type, ())
+            selections = hall.selections.get(meal_type, ())
             
             # Convert items to the format needed
             converted_items = []
-            for item in items:
-                if isinstance(item, dict):
+            for item, count in zip(items, selections):
+                if not isinstance(item, str):
                     converted_items.append({
                         'name': item.get('name', 'Unknown'),
-                        'count': item.get('weeklySelections', random.randint(100, 500)),
+                        'count': random.randint(100, 500) if count is None else count,
                         'calories': item.get('calories', 0),
                         'preferences': item.get('dietCategories', []),
                         'ingredients': item.get('ingredients', ''),
@@ -76,7 +77,7 @@ def home_view(request):
     
     context = {
         'dining_hall_data': dining_hall_data_json,
-        'dining_halls_list': [hall.hallName for hall in db_halls]
+        'dining_halls_list': [hall.hallName for hall in snapshot.halls]
     }
     
     return render(request, 'home.html', context)
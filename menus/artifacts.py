@@ -0,0 +1,37 @@
+"""
+Counters for derived menu artifacts.
+
+Artifacts (dish records, per-date menus, meal indexes, per-meal filter/score
+summaries, dish rankings, precomputed rows) are keyed by the exact inputs
+they were derived from. When one hall's menu for one day changes, only the
+artifacts depending on it are rebuilt; everything else is carried over from
+the previous snapshot or found in the caches. These counters show how many
+were rebuilt versus reused.
+"""
+import threading
+
+
+class ArtifactCounters:
+    """Thread-safe rebuilt/reused counts per artifact kind."""
+
+    def __init__(self):
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def add(self, kind, rebuilt=0, reused=0):
+        with self._lock:
+            counts = self._counts.setdefault(kind, {'rebuilt': 0, 'reused': 0})
+            counts['rebuilt'] += rebuilt
+            counts['reused'] += reused
+
+    def info(self):
+        """{kind: {'rebuilt': n, 'reused': n}}"""
+        with self._lock:
+            return {kind: dict(counts) for kind, counts in self._counts.items()}
+
+    def clear(self):
+        with self._lock:
+            self._counts.clear()
+
+
+artifact_counters = ArtifactCounters()
@@ -0,0 +1,143 @@
+"""
+Versioned menu cache on top of Django's cache framework.
+
+- The current version number lives under MENU_VERSION_KEY in the
+  MENU_VERSION_CACHE cache, which every process shares, and is bumped on
+  every menu change, so stale snapshots are never read again
+- Each process keeps the last (version, snapshot) pair it built and only
+  rebuilds when the shared version moves on or MENU_CACHE_TIMEOUT runs out
+- If the version cache can't be read (e.g. its table is missing), snapshots
+  are built straight from the database and not kept
+- The pair is replaced with a single assignment, so readers never see a
+  half-built snapshot
+- The last snapshot outlives invalidation and is passed to the next build,
+  which reuses whatever did not change (see MenuSnapshot.from_db)
+
+It also provides LRUCache, a small thread-safe in-process cache for results
+derived from a given snapshot version.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .snapshot import MenuSnapshot
+
+
+MENU_VERSION_KEY = 'menus:version'
+
+_local = None  # (version, snapshot, expires_at)
+_previous = None  # last snapshot used by this process, kept across invalidation
+_build_lock = threading.Lock()
+
+
+def get_menu_cache_timeout():
+    return getattr(settings, 'MENU_CACHE_TIMEOUT', 300)
+
+
+def get_version_cache():
+    return caches[getattr(settings, 'MENU_VERSION_CACHE', 'default')]
+
+
+def get_menu_version():
+    """
+    Get the current menu version, initializing it if the cache is empty.
+    Returns None if the version cache is unavailable.
+    """
+    try:
+        version_cache = get_version_cache()
+        version = version_cache.get(MENU_VERSION_KEY)
+        if version is None:
+            # A time-based start avoids reusing version numbers after a cache flush
+            version_cache.add(MENU_VERSION_KEY, time.time_ns(), timeout=None)
+            version = version_cache.get(MENU_VERSION_KEY)
+    except Exception as e:
+        print(f"Error reading menu version: {e}")
+        return None
+    return version
+
+
+def invalidate_menu_cache(**kwargs):
+    """Move every process on to a new menu version. Usable as a signal receiver."""
+    global _local
+    _local = None
+    try:
+        version_cache = get_version_cache()
+        # Not every backend increments atomically; a fresh time-based value is
+        # distinct even when two processes invalidate at once
+        current = version_cache.get(MENU_VERSION_KEY) or 0
+        version_cache.set(MENU_VERSION_KEY, max(time.time_ns(), current + 1), timeout=None)
+    except Exception as e:
+        print(f"Error bumping menu version: {e}")
+
+
+def get_menu_snapshot():
+    """
+    Get the menu snapshot for the current version.
+
+    Returns this process's copy if the version matches and it has not
+    expired, otherwise a fresh build from the database.
+    """
+    global _local, _previous
+    version = get_menu_version()
+    if version is None:
+        with _build_lock:
+            return MenuSnapshot.from_db(previous=_previous)
+    local = _local
+    if local is not None and local[0] == version and local[2] > time.monotonic():
+        return local[1]
+
+    with _build_lock:
+        local = _local
+        if local is not None and local[0] == version and local[2] > time.monotonic():
+            return local[1]
+
+        snapshot = MenuSnapshot.from_db(previous=_previous)
+        snapshot.version = version
+        _local = (version, snapshot, time.monotonic() + get_menu_cache_timeout())
+        _previous = snapshot
+        return snapshot
+
+
+class LRUCache:
+    """
+    Thread-safe least-recently-used cache with hit/miss counters.
+    Values must be treated as read-only since they are shared between requests.
+    """
+
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_set(self, key, compute):
+        """Return the cached value for key, calling compute() on a miss."""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+
+        # Compute outside the lock; concurrent misses on one key just do duplicate work
+        value = compute()
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._data), 'maxsize': self.maxsize}
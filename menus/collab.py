@@ -0,0 +1,224 @@
+"""
+Collaborative-filtering dish scores learned from MealHistory and Review data.
+
+Training (the train_recommender command) runs offline:
+- build_interactions turns meal histories into a sparse user x dish matrix.
+  A dish is identified by its name, which is what MealHistory stores. Each
+  selection counts 1, scaled by the user's rating of that hall (rating / 3)
+  and by 1.5 when the dish has a diet tag the user listed in a review's
+  foodPreferences
+- train_als factorizes it with implicit-feedback alternating least squares
+  (confidence 1 + alpha * weight, preference 1 for every observed pair)
+- save_factors writes the factors to an uncompressed .npz
+
+At serve time load_factors memory-maps the arrays straight out of the .npz,
+so every worker shares the same pages and loading costs no copying. A user's
+score for a dish is the dot product of their factor rows.
+
+NumPy is optional: without it training raises ImportError and
+get_dish_factors returns None, so personalized scores are simply left out.
+"""
+import os
+import struct
+import threading
+import zipfile
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised only without numpy
+    np = None
+
+from django.conf import settings
+
+from .models import MealHistory, MenuItem, Review, get_diet_mask
+
+
+FACTORS = 16
+ITERATIONS = 10
+REGULARIZATION = 0.1
+ALPHA = 10.0
+
+# Weight multiplier for dishes matching a user's review foodPreferences
+PREFERENCE_BOOST = 1.5
+
+
+def get_factors_path():
+    return getattr(settings, 'DISH_FACTORS_PATH', os.path.join(settings.BASE_DIR, 'dish_factors.npz'))
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError('Collaborative filtering requires NumPy (pip install numpy)')
+
+
+def build_interactions():
+    """
+    User x dish weights from the database.
+
+    Returns:
+        (user_ids, dish_names, rows, cols, weights) where rows/cols index
+        user_ids/dish_names and weights are summed per (user, dish)
+    """
+    hall_ratings = {}
+    user_preferences = {}
+    for user_id, hall_name, rating, preferences in Review.objects.values_list(
+        'user_id', 'diningHall__hallName', 'rating', 'foodPreferences'
+    ).iterator():
+        hall_ratings[user_id, hall_name] = rating
+        user_preferences[user_id] = user_preferences.get(user_id, 0) | get_diet_mask(preferences or [])
+
+    dish_diet_masks = dict(MenuItem.objects.values_list('name', 'dietMask'))
+
+    weights = {}
+    for user_id, meals in MealHistory.objects.values_list('user_id', 'meals').iterator():
+        for meal in meals or []:
+            if not isinstance(meal, dict) or not meal.get('name'):
+                continue
+            name = str(meal['name'])
+            weight = hall_ratings.get((user_id, meal.get('diningHall')), 3) / 3
+            if dish_diet_masks.get(name, 0) & user_preferences.get(user_id, 0):
+                weight *= PREFERENCE_BOOST
+            weights[user_id, name] = weights.get((user_id, name), 0) + weight
+
+    user_ids = sorted({user_id for user_id, _ in weights})
+    dish_names = sorted({name for _, name in weights})
+    user_index = {user_id: i for i, user_id in enumerate(user_ids)}
+    dish_index = {name: i for i, name in enumerate(dish_names)}
+    rows = [user_index[user_id] for user_id, _ in weights]
+    cols = [dish_index[name] for _, name in weights]
+    return user_ids, dish_names, rows, cols, list(weights.values())
+
+
+def _als_step(fixed, rows, cols, confidence, count, regularization):
+    """Solve every row of one side given the other side's factors."""
+    factors = fixed.shape[1]
+    gram = fixed.T @ fixed
+    identity = regularization * np.eye(factors)
+    solved = np.zeros((count, factors))
+    order = np.argsort(rows, kind='stable')
+    rows, cols, confidence = rows[order], cols[order], confidence[order]
+    boundaries = np.flatnonzero(np.diff(rows)) + 1
+    for start, end in zip(np.r_[0, boundaries], np.r_[boundaries, len(rows)]):
+        if start == end:
+            continue
+        items = fixed[cols[start:end]]
+        c = confidence[start:end]
+        # (Y^T Y + Y^T (C - I) Y + lambda I) x = Y^T C p, with p = 1 on observed pairs
+        lhs = gram + (items.T * (c - 1)) @ items + identity
+        solved[rows[start]] = np.linalg.solve(lhs, items.T @ c)
+    return solved
+
+
+def train_als(rows, cols, weights, user_count, dish_count, factors=FACTORS, iterations=ITERATIONS,
+              regularization=REGULARIZATION, alpha=ALPHA, seed=0):
+    """
+    Implicit-feedback ALS over a sparse interaction matrix given as coordinates.
+
+    Returns:
+        (user_factors, dish_factors) as float32 arrays of shape (users, factors) / (dishes, factors)
+    """
+    _require_numpy()
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+    confidence = 1 + alpha * np.asarray(weights, dtype=np.float64)
+
+    rng = np.random.default_rng(seed)
+    user_factors = rng.normal(scale=0.1, size=(user_count, factors))
+    dish_factors = rng.normal(scale=0.1, size=(dish_count, factors))
+    for _ in range(iterations):
+        user_factors = _als_step(dish_factors, rows, cols, confidence, user_count, regularization)
+        dish_factors = _als_step(user_factors, cols, rows, confidence, dish_count, regularization)
+    return user_factors.astype(np.float32), dish_factors.astype(np.float32)
+
+
+def save_factors(path, user_ids, dish_names, user_factors, dish_factors):
+    """Write the model as an uncompressed .npz (compressed members can't be memory-mapped)."""
+    _require_numpy()
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(
+            f,
+            user_ids=np.asarray(user_ids, dtype=np.int64),
+            dish_names=np.asarray(dish_names, dtype=str),
+            user_factors=np.ascontiguousarray(user_factors, dtype=np.float32),
+            dish_factors=np.ascontiguousarray(dish_factors, dtype=np.float32),
+        )
+    # Readers never see a half-written file
+    os.replace(tmp_path, path)
+
+
+def load_npz_mmap(path):
+    """
+    Memory-map every array of an uncompressed .npz file.
+    np.load ignores mmap_mode for .npz archives, so the .npy members are
+    located inside the zip and mapped directly.
+    """
+    _require_numpy()
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as f:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f'{info.filename} in {path} is compressed and cannot be memory-mapped')
+            # Local file header: 30 fixed bytes, then the name and extra field
+            f.seek(info.header_offset)
+            name_length, extra_length = struct.unpack('<HH', f.read(30)[26:30])
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            if dtype.hasobject:
+                raise ValueError(f'{info.filename} in {path} holds Python objects')
+            arrays[info.filename.removesuffix('.npy')] = np.memmap(
+                path, dtype=dtype, mode='r', shape=shape, order='F' if fortran_order else 'C', offset=f.tell()
+            )
+    return arrays
+
+
+class DishFactors:
+    """Memory-mapped factors with name/user lookups."""
+
+    def __init__(self, arrays):
+        self.userFactors = arrays['user_factors']
+        self.dishFactors = arrays['dish_factors']
+        self.userIndex = {int(user_id): i for i, user_id in enumerate(arrays['user_ids'])}
+        self.dishIndex = {str(name): i for i, name in enumerate(arrays['dish_names'])}
+
+    def score(self, user_id, dish_names):
+        """
+        {dish name: dot product} for the given names the model knows.
+        Empty for users without history at training time.
+        """
+        user_row = self.userIndex.get(user_id)
+        if user_row is None:
+            return {}
+        known = [name for name in dict.fromkeys(dish_names) if name in self.dishIndex]
+        if not known:
+            return {}
+        scores = self.dishFactors[[self.dishIndex[name] for name in known]] @ self.userFactors[user_row]
+        return {name: float(score) for name, score in zip(known, scores)}
+
+
+_loaded = None  # (path, mtime, DishFactors)
+_load_lock = threading.Lock()
+
+
+def get_dish_factors():
+    """The trained factors, reloaded when the file changes, or None if there are none."""
+    global _loaded
+    if np is None:
+        return None
+    path = get_factors_path()
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    loaded = _loaded
+    if loaded is not None and loaded[:2] == (path, mtime):
+        return loaded[2]
+    with _load_lock:
+        loaded = _loaded
+        if loaded is None or loaded[:2] != (path, mtime):
+            loaded = _loaded = (path, mtime, DishFactors(load_npz_mmap(path)))
+    return loaded[2]
@@ -0,0 +1,182 @@
+"""
+Local lexical dish ranking: BM25 over dish names, categories and ingredients.
+
+Used by recommendation.py to rank the hard-filtered candidates against the
+user's mood text without an LLM call, either on its own or when the LLM is
+missing, slow or failing (see RECOMMENDATION_RANKER there).
+
+- Each candidate is one document: its name (counted twice, names are short
+  and the most telling), category and ingredients
+- The query is the mood text plus the user's "likes". Words with an entry in
+  SYNONYMS also match related dish words at SYNONYM_WEIGHT, so "something
+  spicy" finds the buffalo wings and "comfort food" the mac and cheese
+- Dishes matching one of the user's diets get DIET_BONUS on top, so picks
+  follow the profile when the mood text matches nothing
+- CandidateIndex.rank answers on its own; CandidateIndex.prerank is the
+  first stage in front of the LLM, keeping the best PRE_RANK_TOP_K dishes
+  per hall with the best-reviewed halls first
+
+BM25Index keeps postings per term, so scoring touches only the documents
+containing a query term. The synonym table is expanded once at import time;
+indexes are built once per candidate set and reused by the caller.
+No Django imports, like similarity.py.
+"""
+import math
+import re
+from collections import Counter
+
+
+K1 = 1.2
+B = 0.75
+SYNONYM_WEIGHT = 0.5
+DIET_BONUS = 0.5
+MAX_PICKS_PER_HALL = 3
+PRE_RANK_TOP_K = 15
+NEUTRAL_HALL_QUALITY = 3.0
+
+_WORD_RE = re.compile(r"[a-z]+")
+STOP_WORDS = frozenset({
+    'and', 'with', 'the', 'for', 'from', 'of', 'in', 'to', 'or', 'a', 'an', 'some', 'something', 'want',
+    'like', 'would', 'feel', 'feeling', 'today', 'me', 'my', 'i', 'im', 'food', 'eat', 'please', 'really',
+    'contains', 'less', 'than',
+})
+
+# Mood words -> dish words they should match
+_SYNONYM_GROUPS = {
+    ('spicy', 'spice', 'hot', 'heat', 'fiery'): (
+        'spicy', 'chili', 'chile', 'jalapeno', 'sriracha', 'buffalo', 'cajun', 'chipotle', 'curry', 'szechuan',
+        'habanero', 'pepper', 'salsa', 'gochujang', 'harissa', 'kimchi', 'hot',
+    ),
+    ('light', 'healthy', 'fresh', 'lean'): (
+        'salad', 'greens', 'grilled', 'steamed', 'vegetable', 'fruit', 'broth', 'soup', 'quinoa', 'yogurt',
+        'tofu', 'veggie', 'lettuce', 'cucumber', 'fresh',
+    ),
+    ('comfort', 'cozy', 'hearty', 'warm'): (
+        'macaroni', 'mac', 'cheese', 'mashed', 'potato', 'stew', 'chowder', 'soup', 'pie', 'casserole',
+        'lasagna', 'meatloaf', 'gravy', 'fried', 'pizza', 'grilled', 'pasta', 'chili', 'dumpling',
+    ),
+}
+
+
+def _stem(word):
+    """Plural to singular for the common cases, so "noodles" matches "noodle"."""
+    if len(word) > 4 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+def tokenize(text):
+    """Stemmed lowercase words of text, stop words removed (repeats kept)."""
+    return [_stem(word) for word in _WORD_RE.findall((text or '').lower()) if word not in STOP_WORDS]
+
+
+SYNONYMS = {
+    _stem(key): frozenset(_stem(word) for word in words)
+    for keys, words in _SYNONYM_GROUPS.items()
+    for key in keys
+}
+
+
+def expand_query(text):
+    """{term: weight}: each query word at 1, synonyms of mood words at SYNONYM_WEIGHT."""
+    weights = {}
+    for token in tokenize(text):
+        weights[token] = 1.0
+        for synonym in SYNONYMS.get(token, ()):
+            weights.setdefault(synonym, SYNONYM_WEIGHT)
+    return weights
+
+
+class BM25Index:
+    """Okapi BM25 over token lists."""
+
+    def __init__(self, documents):
+        self.count = len(documents)
+        self.lengths = [len(tokens) for tokens in documents]
+        average = sum(self.lengths) / self.count if self.count else 0
+        self.postings = {}  # term -> [(document, term frequency)]
+        for doc, tokens in enumerate(documents):
+            for term, tf in Counter(tokens).items():
+                self.postings.setdefault(term, []).append((doc, tf))
+        self.idf = {
+            term: math.log(1 + (self.count - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+        # Per-document length normalization, K1 * (1 - B + B * length / average)
+        self.norms = [K1 * (1 - B + B * length / average) if average else K1 for length in self.lengths]
+
+    def scores(self, query_weights):
+        """{document: score} for documents containing at least one query term."""
+        scores = {}
+        for term, weight in query_weights.items():
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc, tf in self.postings[term]:
+                scores[doc] = scores.get(doc, 0.0) + weight * idf * tf * (K1 + 1) / (tf + self.norms[doc])
+        return scores
+
+
+class CandidateIndex:
+    """BM25 index over recommendation candidates ({hall slug: [candidate dicts]})."""
+
+    def __init__(self, candidates, ingredients_by_name=None):
+        ingredients_by_name = ingredients_by_name or {}
+        self.entries = []  # (slug, candidate, lowercased diets) per document
+        documents = []
+        for slug, dishes in candidates.items():
+            for dish in dishes:
+                name = dish.get('name') or ''
+                self.entries.append((slug, dish, {str(diet).lower() for diet in dish.get('diets') or []}))
+                documents.append(
+                    tokenize(name) * 2 + tokenize(dish.get('category') or '') + tokenize(ingredients_by_name.get(name))
+                )
+        self.slugs = list(candidates)
+        self.bm25 = BM25Index(documents)
+
+    def _ranked(self, query_text, diets):
+        """{slug: [(-score, document, candidate)] best first}, ties in menu order, one entry per dish name."""
+        scores = self.bm25.scores(expand_query(query_text))
+        diets = {str(diet).lower() for diet in diets}
+        ranked = {slug: [] for slug in self.slugs}
+        for doc, (slug, dish, dish_diets) in enumerate(self.entries):
+            score = scores.get(doc, 0.0) + (DIET_BONUS if diets & dish_diets else 0.0)
+            ranked[slug].append((-score, doc, dish))
+        for slug, entries in ranked.items():
+            entries.sort(key=lambda entry: entry[:2])
+            unique = {}
+            for entry in entries:
+                unique.setdefault(entry[2].get('name'), entry)
+            ranked[slug] = list(unique.values())
+        return ranked
+
+    def rank(self, query_text, diets=(), limit=MAX_PICKS_PER_HALL):
+        """
+        Up to limit dish names per hall, best first.
+        Only dishes with a positive score (a query match or a diet match) are picked;
+        ties keep menu order.
+        """
+        return {
+            slug: [dish.get('name') or '' for score, _, dish in entries if score < 0][:limit]
+            for slug, entries in self._ranked(query_text, diets).items()
+        }
+
+    def prerank(self, query_text, diets=(), k=PRE_RANK_TOP_K, hall_quality=None):
+        """
+        First retrieval stage for the LLM: the k best candidates per hall.
+
+        Unlike rank, dishes without any match still fill the remaining places
+        (in menu order), so the LLM always has something to choose from.
+        Halls come out best-rated first (hall_quality: {slug: rating}, unrated
+        halls count as NEUTRAL_HALL_QUALITY), which is the order the prompt
+        builder fills its token budget in.
+
+        Returns:
+            {slug: [candidate dicts]}
+        """
+        hall_quality = hall_quality or {}
+        ranked = self._ranked(query_text, diets)
+        halls = sorted(ranked, key=lambda slug: -hall_quality.get(slug, NEUTRAL_HALL_QUALITY))
+        return {slug: [dish for _, _, dish in ranked[slug][:k]] for slug in halls}
@@ -0,0 +1,93 @@
+"""
+Django management command to benchmark the NumPy scoring engine against the
+pure-Python scoring helpers on synthetic menus.
+
+Usage:
+    python manage.py benchmark_scoring --halls 100 --dishes 500 --profiles 10000
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from menus.models import ALLERGEN_VOCABULARY, DIET_VOCABULARY
+from menus.scoring import ScoringEngine, ProfileBatch, MEAL_TYPES
+from menus.views import calculate_hall_score, calculate_meal_specific_score
+import random
+import time
+
+
+class Command(BaseCommand):
+    help = 'Benchmark vectorized hall/meal scoring against the pure-Python helpers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--halls', type=int, default=100, help='Number of dining halls')
+        parser.add_argument('--dishes', type=int, default=500, help='Dishes per hall (split across meals)')
+        parser.add_argument('--profiles', type=int, default=10000, help='Number of user profiles')
+        parser.add_argument('--python-sample', type=int, default=20,
+                            help='Profiles timed with the Python helpers (extrapolated to --profiles)')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        try:
+            hall_menus = self.build_menus(rng, options['halls'], options['dishes'])
+            profiles = [
+                (rng.sample(ALLERGEN_VOCABULARY, rng.randint(0, 2)), rng.sample(DIET_VOCABULARY, rng.randint(0, 2)))
+                for _ in range(options['profiles'])
+            ]
+
+            start = time.perf_counter()
+            engine = ScoringEngine(hall_menus)
+            batch = ProfileBatch(profiles)
+            build_seconds = time.perf_counter() - start
+        except ImportError as e:
+            raise CommandError(str(e))
+
+        start = time.perf_counter()
+        hall_results, meal_results = engine.score_all(batch)
+        numpy_seconds = time.perf_counter() - start
+
+        # Time the Python helpers on a sample and check they agree with the engine
+        sample = min(options['python_sample'], len(profiles))
+        start = time.perf_counter()
+        mismatches = 0
+        for profile_index in range(sample):
+            allergens, diets = profiles[profile_index]
+            for hall_index, hall_id in enumerate(engine.hallIds):
+                hall_data = {'meals': hall_menus[hall_id], 'isOpen': False}
+                expected = calculate_hall_score(hall_data, allergens, diets)
+                if expected != tuple(int(values[hall_index, profile_index]) for values in hall_results):
+                    mismatches += 1
+                for meal_type, results in meal_results.items():
+                    expected = calculate_meal_specific_score(hall_data, meal_type, allergens, diets)
+                    if expected != tuple(int(values[hall_index, profile_index]) for values in results):
+                        mismatches += 1
+        python_seconds = (time.perf_counter() - start) * len(profiles) / max(sample, 1)
+
+        self.stdout.write(
+            f"{options['halls']} halls x {options['dishes']} dishes x {len(profiles)} profiles "
+            f"({engine.featureCount} distinct feature rows)"
+        )
+        self.stdout.write(f'  engine build + profile encoding: {build_seconds * 1000:.1f} ms')
+        self.stdout.write(f'  numpy (hall + 3 meal scores):    {numpy_seconds * 1000:.1f} ms')
+        self.stdout.write(f'  python, extrapolated from {sample}:  {python_seconds * 1000:.1f} ms')
+        if mismatches:
+            raise CommandError(f'{mismatches} results differ from the Python helpers')
+        self.stdout.write(self.style.SUCCESS('  results identical on the sampled profiles'))
+
+    def build_menus(self, rng, hall_count, dish_count):
+        """Random menus: mostly dish dicts with 0-3 allergens/diet tags, a few plain strings."""
+        menus = {}
+        for hall_id in range(1, hall_count + 1):
+            meals = {meal_type: [] for meal_type in MEAL_TYPES}
+            for dish_index in range(dish_count):
+                meal_type = MEAL_TYPES[dish_index % len(MEAL_TYPES)]
+                if rng.random() < 0.02:
+                    meals[meal_type].append(f'Dish {dish_index}')
+                    continue
+                meals[meal_type].append({
+                    'name': f'Dish {dish_index}',
+                    'calories': rng.randint(0, 900),
+                    'allergens': rng.sample(ALLERGEN_VOCABULARY, rng.randint(0, 3)),
+                    'dietCategories': rng.sample(DIET_VOCABULARY, rng.randint(0, 3)),
+                })
+            menus[hall_id] = meals
+        return menus
@@ -3,11 +3,16 @@ Django management command to import menu data from scraped_menus.json into the d
 
 Usage:
     python manage.py import_menus
+    python manage.py import_menus --precompute   # also run precompute_recommendations
 """
 
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
 from django.db import transaction
-from menus.models import DiningHall
+from menus.models import DiningHall, MenuDay, MenuOffering, MenuItem
+from menus.cache import invalidate_menu_cache
+from menus.signals import menu_signals_paused
+from datetime import datetime
 import json
 import os
 
@@ -21,6 +26,11 @@ class Command(BaseCommand):
             action='store_true',
             help='Clear existing menu data before importing',
         )
+        parser.add_argument(
+            '--precompute',
+            action='store_true',
+            help='Precompute recommendations for the new menus after importing',
+        )
 
     def handle(self, *args, **options):
         # Get the JSON file path
@@ -44,36 +54,49 @@ class Command(BaseCommand):
             self.stdout.write(self.style.ERROR(f'Error reading JSON file: {e}'))
             return
 
-        # Clear existing data if requested
-        if options['clear']:
-            self.stdout.write(self.style.WARNING('Clearing existing dining hall data...'))
-            DiningHall.objects.all().delete()
-            self.stdout.write(self.style.SUCCESS('Existing data cleared'))
+        # Per-row cache invalidation is paused; the cache moves on once at the end
+        with menu_signals_paused():
+            # Clear existing data if requested
+            if options['clear']:
+                self.stdout.write(self.style.WARNING('Clearing existing dining hall data...'))
+                DiningHall.objects.all().delete()
+                self.stdout.write(self.style.SUCCESS('Existing data cleared'))
 
-        # Import data within a transaction
-        try:
-            with transaction.atomic():
-                self.import_dining_halls(data)
-        except Exception as e:
-            self.stdout.write(self.style.ERROR(f'Error importing data: {e}'))
-            raise
+            # Import data within a transaction
+            try:
+                with transaction.atomic():
+                    self.import_dining_halls(data)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'Error importing data: {e}'))
+                raise
+            finally:
+                invalidate_menu_cache()
 
         self.stdout.write(self.style.SUCCESS('Data import completed successfully!'))
 
+        if options['precompute']:
+            call_command('precompute_recommendations', stdout=self.stdout)
+
     def import_dining_halls(self, data):
         """Import dining halls and their menus."""
         dining_halls = data.get('diningHalls', [])
         
         self.stdout.write(f'Importing {len(dining_halls)} dining halls...')
         
+        # Store every distinct dish once; menus only keep references to it
+        self.content_hashes = {}
+        dish_ids = self.upsert_dishes(dining_halls)
+        
         for hall_data in dining_halls:
             hall_name = hall_data.get('hallName')
-            
-            # Get or create the dining hall
-            # Note: menuByDate is stored as TextField, so we need to serialize it as JSON string
             menu_by_date = hall_data.get('menuByDate', [])
-            menu_by_date_str = json.dumps(menu_by_date) if menu_by_date else None
+            meals = hall_data.get('meals', {
+                'breakfast': [],
+                'lunch': [],
+                'dinner': []
+            })
             
+            # Get or create the dining hall
             dining_hall, created = DiningHall.objects.update_or_create(
                 hallName=hall_name,
                 defaults={
@@ -83,17 +106,22 @@ class Command(BaseCommand):
                         'lunch': '11:00-14:30',
                         'dinner': '17:00-21:00'
                     }),
-                    'meals': hall_data.get('meals', {
-                        'breakfast': [],
-                        'lunch': [],
-                        'dinner': []
-                    }),
-                    'menuByDate': menu_by_date_str
+                    'meals': {
+                        meal_type: [
+                            {
+                                'dishId': dish_ids[self.content_hash(item)],
+                                'weeklySelections': self.get_weekly_selections(item),
+                            }
+                            for item in items
+                        ]
+                        for meal_type, items in meals.items()
+                    },
                 }
             )
             
+            day_count, offering_count = self.import_menu_days(dining_hall, menu_by_date, dish_ids)
+
             action = 'Created' if created else 'Updated'
-            meals = hall_data.get('meals', {})
             breakfast_count = len(meals.get('breakfast', []))
             lunch_count = len(meals.get('lunch', []))
             dinner_count = len(meals.get('dinner', []))
@@ -103,6 +131,83 @@ class Command(BaseCommand):
                     f'  {action} {hall_name}: '
                     f'{breakfast_count} breakfast, '
                     f'{lunch_count} lunch, '
-                    f'{dinner_count} dinner items'
+                    f'{dinner_count} dinner items, '
+                    f'{day_count} days ({offering_count} offerings)'
                 )
             )
+
+    def content_hash(self, item):
+        """Content hash of a scraped item, computed once per item per import."""
+        # The scraped data stays alive for the whole import, so ids are stable
+        key = id(item)
+        if key not in self.content_hashes:
+            self.content_hashes[key] = MenuItem.scraped_content_hash(item)
+        return self.content_hashes[key]
+
+    def upsert_dishes(self, dining_halls):
+        """Create any dishes not yet in the catalog and return {contentHash: dish id}."""
+        dishes = {}  # contentHash -> first scraped item with that content
+        for hall_data in dining_halls:
+            all_meals = [hall_data.get('meals') or {}]
+            all_meals += [day.get('meals') or {} for day in hall_data.get('menuByDate') or []]
+            for meals in all_meals:
+                for items in meals.values():
+                    for item in items:
+                        dishes.setdefault(self.content_hash(item), item)
+        
+        existing = set(
+            MenuItem.objects.filter(contentHash__in=dishes.keys()).values_list('contentHash', flat=True)
+        )
+        # Only new dishes are built, so only they pay for masks and the MinHash signature
+        new_dishes = [
+            MenuItem.from_scraped(item, content_hash=content_hash)
+            for content_hash, item in dishes.items() if content_hash not in existing
+        ]
+        MenuItem.objects.bulk_create(new_dishes, batch_size=500)
+        
+        self.stdout.write(f'  {len(dishes)} distinct dishes ({len(new_dishes)} new)')
+        return dict(
+            MenuItem.objects.filter(contentHash__in=dishes.keys()).values_list('contentHash', 'id')
+        )
+
+    def get_weekly_selections(self, item):
+        if isinstance(item, dict):
+            return item.get('weeklySelections', 0) or 0
+        return 0
+
+    def import_menu_days(self, dining_hall, menu_by_date, dish_ids):
+        """Replace a hall's MenuDay/MenuOffering rows with the given menuByDate list."""
+        MenuDay.objects.filter(diningHall=dining_hall).delete()
+
+        days = []
+        day_meals = []
+        for day_data in menu_by_date or []:
+            try:
+                date = datetime.strptime(day_data.get('date', ''), '%Y-%m-%d').date()
+            except ValueError:
+                continue
+            days.append(MenuDay(
+                diningHall=dining_hall,
+                date=date,
+                dateDisplay=day_data.get('dateDisplay') or '',
+                dayOfWeek=day_data.get('dayOfWeek') or '',
+                isWeekend=bool(day_data.get('isWeekend', False)),
+            ))
+            day_meals.append(day_data.get('meals') or {})
+
+        MenuDay.objects.bulk_create(days)
+
+        offerings = []
+        for day, meals in zip(days, day_meals):
+            for meal_type in ['breakfast', 'lunch', 'dinner']:
+                for position, item in enumerate(meals.get(meal_type, [])):
+                    offerings.append(MenuOffering(
+                        day=day,
+                        mealType=meal_type,
+                        position=position,
+                        dish_id=dish_ids[self.content_hash(item)],
+                        weeklySelections=self.get_weekly_selections(item),
+                    ))
+
+        MenuOffering.objects.bulk_create(offerings, batch_size=500)
+        return len(days), len(offerings)
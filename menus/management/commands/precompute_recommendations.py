@@ -0,0 +1,40 @@
+"""
+Django management command to precompute filtered menus and meal scores for
+every preference profile in UserProfile and every menu date.
+
+Run it after import_menus (or use import_menus --precompute). Each meal's
+results are tied to that meal's items; after a menu change the changed meals
+are computed live until the command runs again, and the next run only
+recomputes those meals.
+
+Usage:
+    python manage.py precompute_recommendations
+"""
+
+from django.core.management.base import BaseCommand
+from menus.cache import get_menu_snapshot
+from menus.precompute import precompute_recommendations, observed_profiles, menu_dates
+import time
+
+
+class Command(BaseCommand):
+    help = 'Precompute recommendations for every observed preference profile and menu date'
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        snapshot = get_menu_snapshot()
+        profiles = observed_profiles()
+        dates = menu_dates(snapshot)
+
+        self.stdout.write(
+            f'Scoring {len(profiles)} profiles x {len(dates)} dates x {len(snapshot.halls)} halls...'
+        )
+        counts = precompute_recommendations(snapshot, profiles, dates)
+
+        self.stdout.write(
+            f"Meals rebuilt: {counts['rebuilt']}, reused: {counts['reused']}; "
+            f"rows written: {counts['written']}"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored {counts['rows']} precomputed recommendations in {time.perf_counter() - start:.2f}s"
+        ))
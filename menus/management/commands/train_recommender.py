@@ -0,0 +1,52 @@
+"""
+Django management command to train the collaborative-filtering dish model
+from MealHistory and Review data (see menus/collab.py).
+
+The factors are written to DISH_FACTORS_PATH (default dish_factors.npz in the
+project root); running servers pick up the new file on their next request.
+
+Usage:
+    python manage.py train_recommender
+    python manage.py train_recommender --factors 32 --iterations 15 --output /tmp/factors.npz
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from menus import collab
+import time
+
+
+class Command(BaseCommand):
+    help = 'Train user x dish factors from meal histories and reviews'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--factors', type=int, default=collab.FACTORS, help='Latent factors per user/dish')
+        parser.add_argument('--iterations', type=int, default=collab.ITERATIONS, help='ALS sweeps')
+        parser.add_argument('--regularization', type=float, default=collab.REGULARIZATION)
+        parser.add_argument('--alpha', type=float, default=collab.ALPHA, help='Confidence per unit of weight')
+        parser.add_argument('--output', type=str, default=None, help='Output .npz path')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if collab.np is None:
+            raise CommandError('NumPy is required: pip install numpy')
+
+        start = time.perf_counter()
+        user_ids, dish_names, rows, cols, weights = collab.build_interactions()
+        if not weights:
+            raise CommandError('No meal history to train on')
+        self.stdout.write(f'{len(user_ids)} users x {len(dish_names)} dishes, {len(weights)} interactions')
+
+        user_factors, dish_factors = collab.train_als(
+            rows, cols, weights, len(user_ids), len(dish_names),
+            factors=options['factors'],
+            iterations=options['iterations'],
+            regularization=options['regularization'],
+            alpha=options['alpha'],
+            seed=options['seed'],
+        )
+        path = options['output'] or collab.get_factors_path()
+        collab.save_factors(path, user_ids, dish_names, user_factors, dish_factors)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Saved {options["factors"]} factors to {path} in {time.perf_counter() - start:.2f}s'
+        ))
@@ -0,0 +1,106 @@
+# Generated by Django 5.2.18 on 2026-10-15 06:58
+
+import json
+from datetime import datetime
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_menu_days(apps, schema_editor):
+    """Copy existing menuByDate JSON into MenuDay/MenuOffering rows."""
+    DiningHall = apps.get_model('menus', 'DiningHall')
+    MenuDay = apps.get_model('menus', 'MenuDay')
+    MenuOffering = apps.get_model('menus', 'MenuOffering')
+
+    for hall in DiningHall.objects.exclude(menuByDate__isnull=True).exclude(menuByDate=''):
+        try:
+            hall_dates = json.loads(hall.menuByDate)
+        except (json.JSONDecodeError, TypeError):
+            continue
+
+        for day_data in hall_dates:
+            try:
+                date = datetime.strptime(day_data.get('date', ''), '%Y-%m-%d').date()
+            except ValueError:
+                continue
+            day = MenuDay.objects.create(
+                diningHall=hall,
+                date=date,
+                dateDisplay=day_data.get('dateDisplay') or '',
+                dayOfWeek=day_data.get('dayOfWeek') or '',
+                isWeekend=bool(day_data.get('isWeekend', False)),
+            )
+            offerings = []
+            meals = day_data.get('meals') or {}
+            for meal_type in ['breakfast', 'lunch', 'dinner']:
+                for position, item in enumerate(meals.get(meal_type, [])):
+                    if isinstance(item, str):
+                        item = {'name': item}
+                    offerings.append(MenuOffering(
+                        day=day,
+                        mealType=meal_type,
+                        position=position,
+                        name=item.get('name', 'Unknown'),
+                        calories=item.get('calories', 0) or 0,
+                        allergens=item.get('allergens', []),
+                        dietCategories=item.get('dietCategories', []) or item.get('dietTags', []),
+                        ingredients=item.get('ingredients', '') or '',
+                        weeklySelections=item.get('weeklySelections', 0) or 0,
+                    ))
+            MenuOffering.objects.bulk_create(offerings)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menus', '0009_dininghall_menubydate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MenuDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('dateDisplay', models.CharField(blank=True, default='', max_length=20)),
+                ('dayOfWeek', models.CharField(blank=True, default='', max_length=20)),
+                ('isWeekend', models.BooleanField(default=False)),
+                ('diningHall', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='menu_days', to='menus.dininghall')),
+            ],
+            options={
+                'ordering': ['date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='MenuOffering',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mealType', models.CharField(choices=[('breakfast', 'Breakfast'), ('lunch', 'Lunch'), ('dinner', 'Dinner')], max_length=20)),
+                ('position', models.PositiveIntegerField(default=0)),
+                ('name', models.CharField(max_length=200)),
+                ('calories', models.IntegerField(default=0)),
+                ('allergens', models.JSONField(blank=True, default=list)),
+                ('dietCategories', models.JSONField(blank=True, default=list)),
+                ('ingredients', models.TextField(blank=True, default='')),
+                ('weeklySelections', models.IntegerField(default=0)),
+                ('day', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='offerings', to='menus.menuday')),
+            ],
+            options={
+                'ordering': ['day', 'mealType', 'position'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='menuday',
+            index=models.Index(fields=['date', 'diningHall'], name='menuday_date_hall_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='menuday',
+            unique_together={('diningHall', 'date')},
+        ),
+        migrations.AddIndex(
+            model_name='menuoffering',
+            index=models.Index(fields=['day', 'mealType', 'position'], name='offering_day_meal_idx'),
+        ),
+        migrations.RunPython(populate_menu_days, migrations.RunPython.noop),
+    ]
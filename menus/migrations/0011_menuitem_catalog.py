@@ -0,0 +1,212 @@
+# Generated by Django 5.2.18 on 2026-10-15 08:12
+
+import hashlib
+import json
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def _content_hash(name, ingredients, allergens, calories, diet_tags):
+    payload = json.dumps(
+        [name, ingredients or '', sorted(allergens or []), calories or 0, sorted(diet_tags or [])],
+        separators=(',', ':')
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def build_dish_catalog(apps, schema_editor):
+    """Deduplicate dishes into MenuItem and point menus at them by ID."""
+    DiningHall = apps.get_model('menus', 'DiningHall')
+    MenuItem = apps.get_model('menus', 'MenuItem')
+    MenuOffering = apps.get_model('menus', 'MenuOffering')
+
+    dish_ids = {}
+
+    # Existing catalog rows: hash them, dropping exact duplicates
+    for dish in MenuItem.objects.order_by('id'):
+        content_hash = _content_hash(dish.name, dish.ingredients, dish.allergens, dish.calories, dish.dietTags)
+        if content_hash in dish_ids:
+            dish.delete()
+            continue
+        dish.contentHash = content_hash
+        dish.save(update_fields=['contentHash'])
+        dish_ids[content_hash] = dish.id
+
+    def get_dish_id(name, calories, allergens, diet_tags, ingredients):
+        content_hash = _content_hash(name, ingredients, allergens, calories, diet_tags)
+        if content_hash not in dish_ids:
+            dish_ids[content_hash] = MenuItem.objects.create(
+                name=name,
+                calories=calories or 0,
+                allergens=allergens or [],
+                dietTags=diet_tags or [],
+                ingredients=ingredients or '',
+                contentHash=content_hash,
+            ).id
+        return dish_ids[content_hash]
+
+    for offering in MenuOffering.objects.all():
+        offering.dish_id = get_dish_id(
+            offering.name, offering.calories, offering.allergens,
+            offering.dietCategories, offering.ingredients
+        )
+        offering.save(update_fields=['dish'])
+
+    # Only halls whose meals came from the scraped data are converted;
+    # hand-entered string/dict meals keep working as before
+    for hall in DiningHall.objects.all():
+        meals = hall.meals or {}
+        items = [item for meal_items in meals.values() for item in meal_items]
+        if not items or not all(isinstance(item, dict) and 'ingredients' in item for item in items):
+            continue
+        hall.meals = {
+            meal_type: [
+                {
+                    'dishId': get_dish_id(
+                        item.get('name', 'Unknown'), item.get('calories', 0), item.get('allergens', []),
+                        item.get('dietCategories', []) or item.get('dietTags', []), item.get('ingredients', '')
+                    ),
+                    'weeklySelections': item.get('weeklySelections', 0) or 0,
+                }
+                for item in meal_items
+            ]
+            for meal_type, meal_items in meals.items()
+        }
+        hall.save(update_fields=['meals'])
+
+
+def restore_menu_json(apps, schema_editor):
+    """
+    Reverse of build_dish_catalog: copy each dish's fields back onto its
+    offerings, rebuild the menuByDate and meals JSON from the catalog and
+    drop the catalog rows the forward migration created.
+    """
+    DiningHall = apps.get_model('menus', 'DiningHall')
+    MenuItem = apps.get_model('menus', 'MenuItem')
+    MenuDay = apps.get_model('menus', 'MenuDay')
+    MenuOffering = apps.get_model('menus', 'MenuOffering')
+
+    dishes = {dish.id: dish for dish in MenuItem.objects.all()}
+
+    def dish_dict(dish, weekly_selections):
+        return {
+            'name': dish.name,
+            'calories': dish.calories,
+            'allergens': dish.allergens or [],
+            'dietCategories': dish.dietTags or [],
+            'ingredients': dish.ingredients or '',
+            'weeklySelections': weekly_selections or 0,
+        }
+
+    offerings_by_day = {}
+    for offering in MenuOffering.objects.order_by('day_id', 'mealType', 'position'):
+        dish = dishes[offering.dish_id]
+        offering.name = dish.name
+        offering.calories = dish.calories
+        offering.allergens = dish.allergens or []
+        offering.dietCategories = dish.dietTags or []
+        offering.ingredients = dish.ingredients or ''
+        offering.save(update_fields=['name', 'calories', 'allergens', 'dietCategories', 'ingredients'])
+        offerings_by_day.setdefault(offering.day_id, []).append(offering)
+
+    for hall in DiningHall.objects.all():
+        hall_dates = []
+        for day in MenuDay.objects.filter(diningHall=hall).order_by('date'):
+            meals = {'breakfast': [], 'lunch': [], 'dinner': []}
+            for offering in offerings_by_day.get(day.id, []):
+                meals.setdefault(offering.mealType, []).append(
+                    dish_dict(dishes[offering.dish_id], offering.weeklySelections)
+                )
+            hall_dates.append({
+                'date': day.date.isoformat(),
+                'dateDisplay': day.dateDisplay,
+                'dayOfWeek': day.dayOfWeek,
+                'isWeekend': day.isWeekend,
+                'meals': meals,
+            })
+        hall.menuByDate = json.dumps(hall_dates) if hall_dates else None
+
+        hall.meals = {
+            meal_type: [
+                dish_dict(dishes[item['dishId']], item.get('weeklySelections'))
+                if isinstance(item, dict) and item.get('dishId') in dishes else item
+                for item in meal_items
+            ]
+            for meal_type, meal_items in (hall.meals or {}).items()
+        }
+        hall.save(update_fields=['menuByDate', 'meals'])
+
+    # Dishes with ingredients can only have come from build_dish_catalog (the
+    # field is added here); the menus above hold their data again, and keeping
+    # them would leave ingredient-less duplicates when migrating forward
+    MenuOffering.objects.update(dish=None)
+    MenuItem.objects.exclude(ingredients='').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menus', '0010_menuday_menuoffering'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='menuitem',
+            name='ingredients',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='menuitem',
+            name='contentHash',
+            field=models.CharField(blank=True, default='', max_length=64),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='menuoffering',
+            name='dish',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='offerings', to='menus.menuitem'),
+        ),
+        migrations.RunPython(build_dish_catalog, restore_menu_json),
+        migrations.AlterField(
+            model_name='menuitem',
+            name='contentHash',
+            field=models.CharField(blank=True, max_length=64, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='menuoffering',
+            name='dish',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='offerings', to='menus.menuitem'),
+        ),
+        # A default lets the column be re-added to existing rows when reversing;
+        # restore_menu_json then fills it in from the catalog
+        migrations.AlterField(
+            model_name='menuoffering',
+            name='name',
+            field=models.CharField(default='', max_length=200),
+        ),
+        migrations.RemoveField(
+            model_name='menuoffering',
+            name='name',
+        ),
+        migrations.RemoveField(
+            model_name='menuoffering',
+            name='calories',
+        ),
+        migrations.RemoveField(
+            model_name='menuoffering',
+            name='allergens',
+        ),
+        migrations.RemoveField(
+            model_name='menuoffering',
+            name='dietCategories',
+        ),
+        migrations.RemoveField(
+            model_name='menuoffering',
+            name='ingredients',
+        ),
+        migrations.RemoveField(
+            model_name='dininghall',
+            name='menuByDate',
+        ),
+    ]
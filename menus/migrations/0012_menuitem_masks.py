@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-15 07:04
+
+from django.db import migrations, models
+
+from menus.models import get_allergen_mask, get_diet_mask
+
+
+def compute_masks(apps, schema_editor):
+    """Encode existing dishes' allergens/diet tags (vocabulary bits are append-only)."""
+    MenuItem = apps.get_model('menus', 'MenuItem')
+    dishes = list(MenuItem.objects.all())
+    for dish in dishes:
+        dish.allergenMask = get_allergen_mask(dish.allergens)
+        dish.dietMask = get_diet_mask(dish.dietTags)
+    MenuItem.objects.bulk_update(dishes, ['allergenMask', 'dietMask'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menus', '0011_menuitem_catalog'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='menuitem',
+            name='allergenMask',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='menuitem',
+            name='dietMask',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='menuitem',
+            index=models.Index(fields=['allergenMask', 'dietMask'], name='menuitem_masks_idx'),
+        ),
+        migrations.RunPython(compute_masks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-15 09:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_review_stats(apps, schema_editor):
+    """Aggregate existing reviews into one ReviewStats row per hall."""
+    DiningHall = apps.get_model('menus', 'DiningHall')
+    Review = apps.get_model('menus', 'Review')
+    ReviewStats = apps.get_model('menus', 'ReviewStats')
+
+    counts = {}
+    for hall_id, rating, count in (
+        Review.objects.order_by().values_list('diningHall_id', 'rating').annotate(count=Count('id'))
+    ):
+        counts.setdefault(hall_id, {})[rating] = count
+
+    ReviewStats.objects.bulk_create([
+        ReviewStats(
+            diningHall_id=hall_id,
+            reviewCount=sum(counts.get(hall_id, {}).values()),
+            ratingSum=sum(rating * count for rating, count in counts.get(hall_id, {}).items()),
+            **{f'rating{rating}': counts.get(hall_id, {}).get(rating, 0) for rating in range(1, 6)},
+        )
+        for hall_id in DiningHall.objects.values_list('id', flat=True)
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menus', '0012_menuitem_masks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReviewStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reviewCount', models.PositiveIntegerField(default=0)),
+                ('ratingSum', models.IntegerField(default=0)),
+                ('rating1', models.PositiveIntegerField(default=0)),
+                ('rating2', models.PositiveIntegerField(default=0)),
+                ('rating3', models.PositiveIntegerField(default=0)),
+                ('rating4', models.PositiveIntegerField(default=0)),
+                ('rating5', models.PositiveIntegerField(default=0)),
+                ('diningHall', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='review_stats', to='menus.dininghall')),
+            ],
+        ),
+        migrations.RunPython(backfill_review_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-15 09:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menus', '0013_reviewstats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['diningHall', '-createdAt', '-id'], name='review_hall_created_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-15 07:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menus', '0014_review_hall_created_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrecomputedRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('menuFingerprint', models.CharField(max_length=40)),
+                ('profileKey', models.CharField(max_length=40)),
+                ('date', models.DateField()),
+                ('halls', models.JSONField(default=list)),
+                ('createdAt', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'unique_together': {('menuFingerprint', 'profileKey', 'date')},
+            },
+        ),
+    ]
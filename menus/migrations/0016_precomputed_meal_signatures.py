@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-15 07:47
+
+from django.db import migrations
+
+
+def clear_precomputed(apps, schema_editor):
+    """Rows in the old per-fingerprint layout can't be read any more; the command rebuilds them."""
+    apps.get_model('menus', 'PrecomputedRecommendation').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menus', '0015_precomputedrecommendation'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_precomputed, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='precomputedrecommendation',
+            unique_together={('profileKey', 'date')},
+        ),
+        migrations.RemoveField(
+            model_name='precomputedrecommendation',
+            name='menuFingerprint',
+        ),
+        # Reversed first: the old layout has no fingerprint to give existing rows
+        migrations.RunPython(migrations.RunPython.noop, clear_precomputed),
+    ]
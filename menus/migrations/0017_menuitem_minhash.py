@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-15 09:12
+
+from django.db import migrations, models
+
+from menus.similarity import dish_tokens, minhash_signature
+
+
+def compute_minhashes(apps, schema_editor):
+    """Sign the dishes imported before signatures were computed on import."""
+    MenuItem = apps.get_model('menus', 'MenuItem')
+    dishes = list(MenuItem.objects.only('id', 'name', 'ingredients'))
+    for dish in dishes:
+        dish.minhash = minhash_signature(dish_tokens(dish.name, dish.ingredients))
+    MenuItem.objects.bulk_update(dishes, ['minhash'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menus', '0016_precomputed_meal_signatures'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='menuitem',
+            name='minhash',
+            field=models.BinaryField(blank=True, default=b''),
+        ),
+        migrations.RunPython(compute_minhashes, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,15 @@
+import hashlib
+import json
+
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db.models.signals import post_save
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
+from .similarity import dish_tokens, minhash_signature
+
 
 # Allergen choices for user preferences and menu items
 # Synced with scraped menu data from UMass Dining
@@ -30,6 +36,60 @@ DIET_CHOICES = [
     ('antibiotic_free', 'Antibiotic Free'),
 ]
 
+# Canonical tag vocabulary for the allergenMask/dietMask bitmask columns.
+# Covers ALLERGEN_CHOICES, DIET_CHOICES and the accounts/forms.py lists.
+# Bit positions are stored in the database, so only ever append to these lists.
+ALLERGEN_VOCABULARY = [
+    'dairy', 'eggs', 'fish', 'gluten', 'peanuts', 'soy', 'sesame', 'corn',
+    'shellfish', 'tree_nuts', 'wheat',
+]
+DIET_VOCABULARY = [
+    'vegetarian', 'plant_based', 'halal', 'local', 'sustainable', 'whole_grain',
+    'antibiotic_free', 'kosher', 'gluten_free',
+]
+
+# Spellings used elsewhere (accounts/forms.py) for the same tag; None means "no tag"
+ALLERGEN_ALIASES = {'milk': 'dairy'}
+DIET_ALIASES = {'vegan': 'plant_based', 'none': None}
+
+ALLERGEN_BITS = {tag: 1 << i for i, tag in enumerate(ALLERGEN_VOCABULARY)}
+DIET_BITS = {tag: 1 << i for i, tag in enumerate(DIET_VOCABULARY)}
+
+# Allergens outside the vocabulary all share this bit, so a user avoiding an
+# unknown allergen conservatively skips every dish with an unknown allergen
+UNKNOWN_ALLERGEN_BIT = 1 << 30
+
+
+def get_allergen_mask(allergens):
+    """Encode a list of allergen IDs as a bitmask."""
+    mask = 0
+    for allergen in allergens or []:
+        allergen = ALLERGEN_ALIASES.get(allergen, allergen)
+        mask |= ALLERGEN_BITS.get(allergen, UNKNOWN_ALLERGEN_BIT)
+    return mask
+
+
+def get_diet_mask(diet_tags):
+    """Encode a list of diet tags as a bitmask. Tags outside the vocabulary are ignored."""
+    mask = 0
+    for tag in diet_tags or []:
+        tag = DIET_ALIASES.get(tag, tag)
+        mask |= DIET_BITS.get(tag, 0)
+    return mask
+
+
+def get_item_masks(item):
+    """
+    Get (allergenMask, dietMask) for a menu item dict.
+    Uses the precomputed masks of catalog dishes and encodes hand-entered items on the fly.
+    """
+    if 'allergenMask' in item:
+        return item['allergenMask'], item.get('dietMask', 0)
+    return (
+        get_allergen_mask(item.get('allergens', [])),
+        get_diet_mask(item.get('dietCategories', []) or item.get('dietTags', [])),
+    )
+
 
 class UserProfile(models.Model):
     """
@@ -97,13 +157,40 @@ def save_user_profile(sender, instance, **kwargs):
         instance.profile.save()
 
 
+class MenuItemQuerySet(models.QuerySet):
+    """Bitmask filters evaluated in the database."""
+    
+    def safe_for(self, user_allergens):
+        """Dishes containing none of the user's allergens (allergenMask & mask = 0)."""
+        mask = get_allergen_mask(user_allergens)
+        if not mask:
+            return self
+        return self.annotate(
+            _allergen_conflict=models.F('allergenMask').bitand(mask)
+        ).filter(_allergen_conflict=0)
+    
+    def matching_diet(self, user_diet_prefs):
+        """Dishes tagged with at least one of the user's diet preferences."""
+        if not user_diet_prefs:
+            return self
+        mask = get_diet_mask(user_diet_prefs)
+        return self.annotate(
+            _diet_match=models.F('dietMask').bitand(mask)
+        ).exclude(_diet_match=0)
+
+
 class MenuItem(models.Model):
     """
-    Individual menu item with nutrition information.
+    Canonical dish with nutrition information.
+    Each distinct dish is stored once and menus reference it by ID.
     - name: Item name
     - calories: Calorie count
     - allergens: List of allergens present
     - dietTags: Diet tags (vegetarian, vegan, etc.)
+    - ingredients: Ingredient list as scraped
+    - contentHash: SHA-256 of the dish content, used to deduplicate on import
+    - allergenMask/dietMask: allergens/dietTags encoded with the canonical vocabulary
+    - minhash: MinHash signature of the name and ingredient words (see menus.similarity)
     """
     name = models.CharField(max_length=200)
     calories = models.IntegerField(
@@ -120,21 +207,121 @@ class MenuItem(models.Model):
         blank=True,
         help_text="Diet tags, e.g. ['vegetarian', 'halal']"
     )
+    ingredients = models.TextField(blank=True, default='')
+    contentHash = models.CharField(max_length=64, unique=True, blank=True)
+    allergenMask = models.BigIntegerField(default=0)
+    dietMask = models.BigIntegerField(default=0)
+    minhash = models.BinaryField(blank=True, default=b'')
+    
+    objects = MenuItemQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            # Covering index so mask predicates never touch the wide ingredient rows
+            models.Index(fields=['allergenMask', 'dietMask'], name='menuitem_masks_idx'),
+        ]
     
     def __str__(self):
         return f"{self.name} ({self.calories} cal)"
     
+    @staticmethod
+    def compute_content_hash(name, ingredients='', allergens=None, calories=0, dietTags=None):
+        """
+        Hash the fields that identify a dish.
+        Calories and diet tags are included because the scraped data has
+        dishes that share name, ingredients and allergens but differ in those.
+        """
+        payload = json.dumps(
+            [name, ingredients or '', sorted(allergens or []), calories or 0, sorted(dietTags or [])],
+            separators=(',', ':')
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    @staticmethod
+    def scraped_fields(item):
+        """Field values of a scraped menu item (dict or plain name)."""
+        if isinstance(item, str):
+            item = {'name': item}
+        return {
+            'name': item.get('name', 'Unknown'),
+            'calories': item.get('calories', 0) or 0,
+            'allergens': item.get('allergens', []) or [],
+            'dietTags': item.get('dietCategories', []) or item.get('dietTags', []) or [],
+            'ingredients': item.get('ingredients', '') or '',
+        }
+    
+    @classmethod
+    def scraped_content_hash(cls, item):
+        """Content hash of a scraped menu item, without building the dish."""
+        return cls.compute_content_hash(**cls.scraped_fields(item))
+    
+    @classmethod
+    def from_scraped(cls, item, content_hash=None):
+        """
+        Build an unsaved MenuItem from a scraped menu item (dict or plain name).
+        Pass content_hash if it is already known to skip hashing again.
+        """
+        menu_item = cls(**cls.scraped_fields(item))
+        menu_item.contentHash = content_hash or menu_item.get_content_hash()
+        menu_item.update_masks()
+        menu_item.update_minhash()
+        return menu_item
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Remember what the stored signature was computed from so saves can skip it
+        instance = super().from_db(db, field_names, values)
+        if {'name', 'ingredients'} <= instance.__dict__.keys():
+            instance._minhash_source = (instance.name, instance.ingredients)
+        return instance
+    
+    def get_content_hash(self):
+        return self.compute_content_hash(
+            self.name, self.ingredients, self.allergens, self.calories, self.dietTags
+        )
+    
+    def update_masks(self):
+        self.allergenMask = get_allergen_mask(self.allergens)
+        self.dietMask = get_diet_mask(self.dietTags)
+    
+    def update_minhash(self):
+        self.minhash = minhash_signature(dish_tokens(self.name, self.ingredients))
+        self._minhash_source = (self.name, self.ingredients)
+    
+    def save(self, *args, **kwargs):
+        if not self.contentHash:
+            self.contentHash = self.get_content_hash()
+        self.update_masks()
+        # The signature only depends on the name and ingredients
+        if not self.minhash or getattr(self, '_minhash_source', None) != (self.name, self.ingredients):
+            self.update_minhash()
+        super().save(*args, **kwargs)
+    
+    def to_dict(self, weeklySelections=0):
+        """Serialize in the same shape as a scraped menu item."""
+        return {
+            'id': self.id,
+            'name': self.name,
+            'calories': self.calories,
+            'weeklySelections': weeklySelections,
+            'dietCategories': self.dietTags,
+            'ingredients': self.ingredients,
+            'allergens': self.allergens,
+            'allergenMask': self.allergenMask,
+            'dietMask': self.dietMask,
+        }
+    
     def is_safe_for_user(self, user_allergens):
         """Check if item is safe for user with given allergens."""
         if not user_allergens:
             return True
-        return not any(a in self.allergens for a in user_allergens)
+        return not (self.allergenMask & get_allergen_mask(user_allergens))
     
     def matches_diet(self, user_diet_prefs):
         """Check if item matches user's diet preferences."""
         if not user_diet_prefs:
             return True
-        return any(d in self.dietTags for d in user_diet_prefs)
+        return bool(self.dietMask & get_diet_mask(user_diet_prefs))
 
 
 class DiningHall(models.Model):
@@ -143,21 +330,60 @@ class DiningHall(models.Model):
     mealHours = models.JSONField(default=dict, blank=True)
     # Updated meals structure with nutrition info
     # Format: {"breakfast": [{"name": "Oatmeal", "calories": 150, "allergens": [], "dietTags": ["vegetarian"]}], ...}
+    # Imported halls store dish references instead: {"breakfast": [{"dishId": 12, "weeklySelections": 227}], ...}
+    # Per-date menus live in MenuDay/MenuOffering
     meals = models.JSONField(default=dict, blank=True)
-    # Menu data organized by date for date-specific views
-    # Format: [{"date": "2025-12-06", "dateDisplay": "Dec 6", "dayOfWeek": "Saturday", "isWeekend": true, "meals": {...}}, ...]
-    # Note: Database stores this as TextField, not JSONField
-    menuByDate = models.TextField(blank=True, null=True)
 
     def __str__(self):
         return self.hallName
     
+    def get_dish_ids(self):
+        """Get the IDs of all dishes referenced from meals."""
+        return {
+            item['dishId']
+            for items in (self.meals or {}).values()
+            for item in items
+            if isinstance(item, dict) and 'dishId' in item
+        }
+    
+    def get_resolved_meals(self, dishes_by_id=None):
+        """
+        Get meals with dish references expanded into full item dicts.
+        
+        Args:
+            dishes_by_id: Optional {id: MenuItem} map, to resolve many halls with one query
+        """
+        meals = self.meals or {}
+        if dishes_by_id is None:
+            dish_ids = self.get_dish_ids()
+            dishes_by_id = MenuItem.objects.in_bulk(dish_ids) if dish_ids else {}
+        
+        resolved = {}
+        for meal_type, items in meals.items():
+            resolved[meal_type] = []
+            for item in items:
+                if isinstance(item, dict) and 'dishId' in item:
+                    dish = dishes_by_id.get(item['dishId'])
+                    if dish is not None:
+                        resolved[meal_type].append(dish.to_dict(item.get('weeklySelections', 0)))
+                else:
+                    resolved[meal_type].append(item)
+        return resolved
+    
     def get_filtered_meals(self, user_allergens=None, user_diet_prefs=None):
         """Get meals filtered by user preferences."""
         filtered = {"breakfast": [], "lunch": [], "dinner": []}
+        user_allergen_mask = get_allergen_mask(user_allergens)
+        user_diet_mask = get_diet_mask(user_diet_prefs)
+        
+        # Referenced dishes are filtered in the database; unsafe ones never get resolved
+        dishes_by_id = MenuItem.objects.filter(
+            id__in=self.get_dish_ids()
+        ).safe_for(user_allergens).matching_diet(user_diet_prefs).in_bulk()
+        meals = self.get_resolved_meals(dishes_by_id)
         
         for meal_type in ["breakfast", "lunch", "dinner"]:
-            items = self.meals.get(meal_type, [])
+            items = meals.get(meal_type, [])
             for item in items:
                 # Handle both old format (string) and new format (dict)
                 if isinstance(item, str):
@@ -168,14 +394,14 @@ class DiningHall(models.Model):
                         "dietTags": []
                     })
                 else:
+                    item_allergen_mask, item_diet_mask = get_item_masks(item)
+                    
                     # Check allergens
-                    item_allergens = item.get("allergens", [])
-                    if user_allergens and any(a in item_allergens for a in user_allergens):
+                    if item_allergen_mask & user_allergen_mask:
                         continue  # Skip items with user's allergens
                     
                     # Check diet preferences (if user has any, item must match at least one)
-                    item_diet_tags = item.get("dietTags", [])
-                    if user_diet_prefs and not any(d in item_diet_tags for d in user_diet_prefs):
+                    if user_diet_prefs and not item_diet_mask & user_diet_mask:
                         continue
                     
                     filtered[meal_type].append(item)
@@ -191,6 +417,121 @@ class DiningHall(models.Model):
         return total
 
 
+# Meal types served by the dining halls
+MEAL_TYPE_CHOICES = [
+    ('breakfast', 'Breakfast'),
+    ('lunch', 'Lunch'),
+    ('dinner', 'Dinner'),
+]
+
+
+class MenuDay(models.Model):
+    """
+    A dining hall's menu for a single date.
+    Replaces the per-hall menuByDate JSON blob so views can load one
+    (hall, date) slice instead of parsing the whole week.
+    The dishes for the day are stored as MenuOffering rows.
+    """
+    diningHall = models.ForeignKey(
+        DiningHall,
+        on_delete=models.CASCADE,
+        related_name='menu_days'
+    )
+
+    date = models.DateField()
+
+    # Display helpers carried over from the scraped data, e.g. "Dec 6" / "Saturday"
+    dateDisplay = models.CharField(max_length=20, blank=True, default='')
+    dayOfWeek = models.CharField(max_length=20, blank=True, default='')
+
+    # No breakfast service on weekends
+    isWeekend = models.BooleanField(default=False)
+
+    class Meta:
+        ordering = ['date']
+        # Each hall has exactly one menu per date
+        unique_together = ['diningHall', 'date']
+        indexes = [
+            models.Index(fields=['date', 'diningHall'], name='menuday_date_hall_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.diningHall.hallName} - {self.date}"
+
+    def to_dict(self, meals=None):
+        """Serialize in the same shape as a scraped menuByDate entry."""
+        return {
+            'date': self.date.strftime('%Y-%m-%d'),
+            'dateDisplay': self.dateDisplay,
+            'dayOfWeek': self.dayOfWeek,
+            'isWeekend': self.isWeekend,
+            'meals': meals if meals is not None else {'breakfast': [], 'lunch': [], 'dinner': []},
+        }
+
+
+class MenuOffering(models.Model):
+    """
+    A dish served at a hall for one meal on one date.
+    Indexed on (day, mealType) so a (hall, date, mealType) slice is one
+    index range scan through MenuDay's (diningHall, date) unique index.
+    """
+    day = models.ForeignKey(
+        MenuDay,
+        on_delete=models.CASCADE,
+        related_name='offerings'
+    )
+
+    mealType = models.CharField(max_length=20, choices=MEAL_TYPE_CHOICES)
+
+    # Order in which the dish appears on the scraped menu
+    position = models.PositiveIntegerField(default=0)
+
+    dish = models.ForeignKey(
+        MenuItem,
+        on_delete=models.PROTECT,
+        related_name='offerings'
+    )
+
+    # Popularity varies per hall and day, so it lives on the offering
+    weeklySelections = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['day', 'mealType', 'position']
+        indexes = [
+            models.Index(fields=['day', 'mealType', 'position'], name='offering_day_meal_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.dish.name} ({self.mealType})"
+
+    def to_dict(self):
+        """Serialize in the same shape as a scraped menu item."""
+        return self.dish.to_dict(self.weeklySelections)
+
+
+class PrecomputedRecommendation(models.Model):
+    """
+    Filtered menus and meal scores for one preference profile on one date,
+    written offline by the precompute_recommendations command.
+    - profileKey: see menus.precompute.profile_key
+    - halls: [[hallId, {mealType: [signature, keptPositions, mealScore,
+      matchingItems, calories, matchRate]}], ...] where signature is the
+      MealIndex.signature the meal was computed from; meals whose live
+      signature differs are stale and never read
+    """
+    profileKey = models.CharField(max_length=40)
+    date = models.DateField()
+    halls = models.JSONField(default=list)
+    createdAt = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # Also the index for the (profile, date) lookup
+        unique_together = ['profileKey', 'date']
+
+    def __str__(self):
+        return f"{self.profileKey} - {self.date}"
+
+
 class MealHistory(models.Model):
     """
     Daily meal history for a user.
@@ -334,11 +675,125 @@ class Review(models.Model):
         ordering = ['-createdAt']  # Default ordering by creation time (newest first)
         # Each user can only have one review per dining hall
         unique_together = ['user', 'diningHall']
+        indexes = [
+            # Keyset pagination of a hall's reviews, newest first
+            models.Index(fields=['diningHall', '-createdAt', '-id'], name='review_hall_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.diningHall.hallName} - {self.rating}★"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Remember the stored rating so saves can adjust ReviewStats without a query
+        instance = super().from_db(db, field_names, values)
+        if 'rating' in instance.__dict__:
+            instance._stored_rating = instance.rating
+        return instance
+    
     def get_preference_display_list(self):
         """Get display names for user's food preferences."""
         preference_map = dict(self.FOOD_PREFERENCE_CHOICES)
         return [preference_map.get(pref, pref) for pref in self.foodPreferences]
+
+
+class ReviewStats(models.Model):
+    """
+    Per-hall review aggregates, kept in step with Review rows.
+    - reviewCount / ratingSum: for the average rating
+    - rating1 ... rating5: rating histogram
+    Kept in a side table so review writes never touch DiningHall (and its menu cache).
+    """
+    diningHall = models.OneToOneField(
+        DiningHall,
+        on_delete=models.CASCADE,
+        related_name='review_stats'
+    )
+    reviewCount = models.PositiveIntegerField(default=0)
+    ratingSum = models.IntegerField(default=0)
+    rating1 = models.PositiveIntegerField(default=0)
+    rating2 = models.PositiveIntegerField(default=0)
+    rating3 = models.PositiveIntegerField(default=0)
+    rating4 = models.PositiveIntegerField(default=0)
+    rating5 = models.PositiveIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.diningHall.hallName} - {self.reviewCount} reviews"
+    
+    @property
+    def avgRating(self):
+        return round(self.ratingSum / self.reviewCount, 1) if self.reviewCount else 0
+    
+    def get_histogram(self):
+        """Get {rating: count} for ratings 1-5."""
+        return {rating: getattr(self, f'rating{rating}') for rating in range(1, 6)}
+    
+    def to_dict(self):
+        return {
+            "avgRating": self.avgRating,
+            "reviewCount": self.reviewCount,
+            "ratingHistogram": self.get_histogram(),
+        }
+    
+    @classmethod
+    def apply_change(cls, hall_id, old_rating=None, new_rating=None):
+        """
+        Move one review from old_rating to new_rating with F() updates.
+        - old_rating None: review was added
+        - new_rating None: review was removed
+        """
+        if old_rating == new_rating:
+            return
+        count_change = (new_rating is not None) - (old_rating is not None)
+        changes = {
+            'reviewCount': F('reviewCount') + count_change,
+            'ratingSum': F('ratingSum') + (new_rating or 0) - (old_rating or 0),
+        }
+        # Ratings outside 1-5 still count towards the average but have no histogram bucket
+        if old_rating in range(1, 6):
+            changes[f'rating{old_rating}'] = F(f'rating{old_rating}') - 1
+        if new_rating in range(1, 6):
+            changes[f'rating{new_rating}'] = F(f'rating{new_rating}') + 1
+        
+        if not cls.objects.filter(diningHall_id=hall_id).update(**changes) and new_rating is not None:
+            # No aggregate row yet: a delta on a fresh zero row could go negative
+            cls.rebuild([hall_id])
+    
+    @classmethod
+    def rebuild(cls, hall_ids=None):
+        """Recompute aggregates from the Review table."""
+        halls = DiningHall.objects.all()
+        if hall_ids is not None:
+            halls = halls.filter(id__in=hall_ids)
+        for hall_id in halls.values_list('id', flat=True):
+            counts = dict(
+                Review.objects.filter(diningHall_id=hall_id)
+                .order_by()
+                .values_list('rating')
+                .annotate(count=models.Count('id'))
+            )
+            cls.objects.update_or_create(diningHall_id=hall_id, defaults={
+                'reviewCount': sum(counts.values()),
+                'ratingSum': sum(rating * count for rating, count in counts.items()),
+                **{f'rating{rating}': counts.get(rating, 0) for rating in range(1, 6)},
+            })
+
+
+@receiver(post_save, sender=Review)
+def update_review_stats_on_save(sender, instance, created, **kwargs):
+    if created:
+        ReviewStats.apply_change(instance.diningHall_id, None, instance.rating)
+    elif hasattr(instance, '_stored_rating'):
+        ReviewStats.apply_change(instance.diningHall_id, instance._stored_rating, instance.rating)
+    else:
+        # Instance wasn't loaded from the DB, so the old rating is unknown
+        ReviewStats.rebuild([instance.diningHall_id])
+    instance._stored_rating = instance.rating
+
+
+@receiver(post_delete, sender=Review)
+def update_review_stats_on_delete(sender, instance, **kwargs):
+    if hasattr(instance, '_stored_rating'):
+        ReviewStats.apply_change(instance.diningHall_id, instance._stored_rating, None)
+    else:
+        ReviewStats.rebuild([instance.diningHall_id])
@@ -0,0 +1,126 @@
+"""
+Calorie-target meal planner.
+
+Picks breakfast, lunch and dinner (one hall per meal, 1 to MAX_DISHES_PER_MEAL
+distinct dishes each) from the user's safe, diet-matching dishes so the day's
+total lands as close as possible to UserProfile.calorieTarget.
+
+It is a bounded knapsack solved by dynamic programming over calorie buckets
+of CALORIE_BUCKET kcal:
+- meal_options: for one hall's meal, the best dish combination per bucket
+  (0/1 knapsack with a dish-count bound). It depends only on the meal's
+  filtered dishes, so it is cached per (MealIndex, preference profile) and
+  shared by every user with the same filtered menu
+- combine_meals: the best choice per bucket for the whole day, one meal at a
+  time. The table doesn't depend on the target, so one table answers every
+  calorie target for a (date, profile)
+- pick_plan: the bucket closest to the target
+
+"Best" means the highest preference score (10 per dish plus 15 per matching
+diet tag, as in the dish rankings). Ties keep the first candidate in menu and
+hall order, so results are deterministic.
+"""
+from collections.abc import Mapping
+
+from .models import get_diet_mask, get_item_masks
+
+
+CALORIE_BUCKET = 25
+MAX_DISHES_PER_MEAL = 3
+MAX_MEAL_CALORIES = 2500
+
+
+def dish_score(dish, user_diet_mask):
+    _, dish_diet_mask = get_item_masks(dish)
+    return 10 + (dish_diet_mask & user_diet_mask).bit_count() * 15
+
+
+def meal_options(dishes, user_diet_prefs=None):
+    """
+    Best combination of 1..MAX_DISHES_PER_MEAL distinct dishes per calorie bucket.
+
+    Args:
+        dishes: Candidate dishes in menu order; plain names, dishes without
+            calories and repeats of a name are skipped
+
+    Returns:
+        {bucket: (score, calories, dishes tuple)}
+    """
+    user_diet_mask = get_diet_mask(user_diet_prefs)
+    # layers[count] = {bucket: (score, calories, dishes)} using exactly count dishes
+    layers = [{0: (0, 0, ())}] + [{} for _ in range(MAX_DISHES_PER_MEAL)]
+    seen = set()
+    for dish in dishes:
+        if not isinstance(dish, Mapping):
+            continue
+        calories = dish.get('calories', 0) or 0
+        if calories <= 0 or calories > MAX_MEAL_CALORIES or dish['name'] in seen:
+            continue
+        seen.add(dish['name'])
+        score = dish_score(dish, user_diet_mask)
+        # Largest count first so each dish is used at most once
+        for count in range(MAX_DISHES_PER_MEAL, 0, -1):
+            layer = layers[count]
+            for previous_score, previous_calories, picked in layers[count - 1].values():
+                total = previous_calories + calories
+                if total > MAX_MEAL_CALORIES:
+                    continue
+                bucket = round(total / CALORIE_BUCKET)
+                current = layer.get(bucket)
+                if current is None or previous_score + score > current[0]:
+                    layer[bucket] = (previous_score + score, total, picked + (dish,))
+
+    options = {}
+    for layer in layers[1:]:
+        for bucket, entry in layer.items():
+            current = options.get(bucket)
+            if current is None or entry[0] > current[0]:
+                options[bucket] = entry
+    return options
+
+
+def combine_meals(meal_tables):
+    """
+    Best day per calorie bucket.
+
+    Args:
+        meal_tables: [(meal_type, [(hall, meal_options table), ...])] in serving order;
+            every listed meal gets exactly one hall
+
+    Returns:
+        {bucket: (score, calories, ((meal_type, hall, dishes), ...))}
+    """
+    day = {0: (0, 0, ())}
+    for meal_type, hall_tables in meal_tables:
+        # Best hall per bucket for this meal first, so the cross product stays small
+        meal = {}
+        for hall, table in hall_tables:
+            for bucket, (score, calories, dishes) in table.items():
+                current = meal.get(bucket)
+                if current is None or score > current[0]:
+                    meal[bucket] = (score, calories, (meal_type, hall, dishes))
+        if not meal:
+            continue
+
+        combined = {}
+        for day_score, day_calories, picks in day.values():
+            for score, calories, pick in meal.values():
+                total = day_calories + calories
+                bucket = round(total / CALORIE_BUCKET)
+                current = combined.get(bucket)
+                if current is None or day_score + score > current[0]:
+                    combined[bucket] = (day_score + score, total, picks + (pick,))
+        day = combined
+    return day
+
+
+def pick_plan(day, calorie_target):
+    """The entry of a combine_meals table closest to calorie_target (higher score on ties), or None."""
+    best = None
+    for score, calories, picks in day.values():
+        if not picks:
+            continue
+        key = (abs(calories - calorie_target), -score, calories)
+        if best is None or key < best[0]:
+            best = (key, (score, calories, picks))
+    return best[1] if best is not None else None
@@ -0,0 +1,171 @@
+"""
+Offline recommendations for the preference profiles users actually have.
+
+There are far fewer distinct (allergens, diet preferences) profiles than
+users, so precompute_recommendations scores every observed profile for every
+menu date ahead of time and stores one PrecomputedRecommendation row per
+(profile, date). get_filtered_hall_menus reads those rows with one keyed
+lookup and only computes live for profiles or meals it has not seen.
+
+Each hall's meals are stored separately, tagged with the MealIndex signature
+they were computed from. A stored meal is used only while the live meal has
+the same signature, and a new run recomputes only meals whose signature
+changed, so editing one hall's menu for one day leaves the rest untouched.
+
+Filtered lists are stored as bitsets of item positions in each meal's
+MealIndex, so a row stays small and is turned back into the snapshot's own
+Dish records on load.
+"""
+from datetime import datetime
+
+from django.db import transaction
+
+from .artifacts import artifact_counters
+from .models import PrecomputedRecommendation, UserProfile, get_allergen_mask, get_diet_mask
+
+
+MEAL_TYPES = ('breakfast', 'lunch', 'dinner')
+
+
+def profile_key(user_allergens, user_diet_prefs):
+    """
+    Canonical key for a preference profile.
+    Filtering and scoring only depend on the allergen mask, the diet mask and
+    whether any diet preference is set, so aliases and ordering share a key.
+    """
+    return (
+        f"{get_allergen_mask(user_allergens)}:{get_diet_mask(user_diet_prefs)}:"
+        f"{int(bool(user_diet_prefs))}"
+    )
+
+
+def observed_profiles():
+    """{profile_key: (allergens, diet preferences)} for every UserProfile, plus the empty profile."""
+    profiles = {profile_key([], []): ([], [])}
+    for allergens, diet_prefs in UserProfile.objects.values_list('allergens', 'dietPreferences').iterator():
+        allergens, diet_prefs = allergens or [], diet_prefs or []
+        profiles.setdefault(profile_key(allergens, diet_prefs), (allergens, diet_prefs))
+    return profiles
+
+
+def menu_dates(snapshot, today=None):
+    """Every date with a dated menu, plus today (halls without one fall back to their meals)."""
+    dates = {day.date for hall in snapshot.halls for day in hall.days}
+    dates.add((today or datetime.now().date()).strftime('%Y-%m-%d'))
+    return sorted(dates)
+
+
+def build_halls_data(snapshot, date_str, user_allergens, user_diet_prefs, previous=None, counts=None):
+    """
+    The PrecomputedRecommendation.halls value for one profile and date:
+    [[hall_id, {meal_type: [signature, positions, mealScore, matchingItems, calories, matchRate]}]]
+
+    Args:
+        previous: Optional existing halls value; meals whose signature is unchanged are copied from it
+        counts: Optional {'rebuilt': n, 'reused': n} updated with the number of meals of each kind
+    """
+    from .views import summarize_meal
+
+    previous = {hall_id: meals for hall_id, meals in previous or []}
+    counts = {'rebuilt': 0, 'reused': 0} if counts is None else counts
+    halls = []
+    for hall in snapshot.halls:
+        menu = hall.get_menu(date_str)
+        stored = previous.get(hall.id, {})
+        meals = {}
+        for meal_type in MEAL_TYPES:
+            index = menu.indexes[meal_type]
+            entry = stored.get(meal_type)
+            if entry is not None and entry[0] == index.signature:
+                counts['reused'] += 1
+            else:
+                counts['rebuilt'] += 1
+                summary = summarize_meal(index, user_allergens, user_diet_prefs)
+                entry = [
+                    index.signature, summary['positions'], summary['mealScore'],
+                    summary['matchingItems'], summary['calories'], summary['matchRate'],
+                ]
+            meals[meal_type] = entry
+        halls.append([hall.id, meals])
+    return halls
+
+
+def precompute_recommendations(snapshot, profiles=None, dates=None):
+    """
+    Bring the stored rows up to date with the snapshot's menus.
+
+    Only meals whose MealIndex signature changed are recomputed and only rows
+    that changed are written; rows for other profiles or dates are deleted.
+
+    Args:
+        profiles: {profile_key: (allergens, diet preferences)}, default observed_profiles()
+        dates: 'YYYY-MM-DD' strings, default menu_dates(snapshot)
+
+    Returns:
+        {'rows': rows kept, 'written': rows created or updated, 'rebuilt': meals computed, 'reused': meals copied}
+    """
+    profiles = observed_profiles() if profiles is None else profiles
+    dates = menu_dates(snapshot) if dates is None else dates
+
+    existing = {
+        (key, date.strftime('%Y-%m-%d')): (pk, halls)
+        for pk, key, date, halls in PrecomputedRecommendation.objects.values_list('pk', 'profileKey', 'date', 'halls')
+    }
+    counts = {'rebuilt': 0, 'reused': 0}
+    created, updated, keep = [], [], set()
+    for key, (allergens, diet_prefs) in profiles.items():
+        for date_str in dates:
+            pk, previous = existing.get((key, date_str), (None, None))
+            halls = build_halls_data(snapshot, date_str, allergens, diet_prefs, previous, counts)
+            if pk is None:
+                created.append(PrecomputedRecommendation(profileKey=key, date=date_str, halls=halls))
+                continue
+            keep.add(pk)
+            if halls != previous:
+                updated.append(PrecomputedRecommendation(pk=pk, halls=halls))
+
+    with transaction.atomic():
+        PrecomputedRecommendation.objects.exclude(pk__in=keep).delete()
+        PrecomputedRecommendation.objects.bulk_update(updated, ['halls'], batch_size=500)
+        PrecomputedRecommendation.objects.bulk_create(created, batch_size=500)
+    artifact_counters.add('precomputedMeals', **counts)
+    return {'rows': len(keep) + len(created), 'written': len(updated) + len(created), **counts}
+
+
+class StoredSummaries:
+    """
+    Stored meal summaries for one profile and date, loaded with one query on first use.
+    A stored meal is only returned for a MealIndex with the signature it was computed from.
+    """
+
+    def __init__(self, date_str, user_allergens, user_diet_prefs):
+        self.date = date_str
+        self.profileKey = profile_key(user_allergens, user_diet_prefs)
+        self._halls = None
+
+    def _load(self):
+        if self._halls is None:
+            halls = PrecomputedRecommendation.objects.filter(
+                profileKey=self.profileKey, date=self.date,
+            ).values_list('halls', flat=True).first()
+            self._halls = {hall_id: meals for hall_id, meals in halls or []}
+        return self._halls
+
+    def get(self, hall_id, meal_type, index):
+        """summarize_meal-shaped dict for the hall's meal, or None if missing or stale."""
+        entry = self._load().get(hall_id, {}).get(meal_type)
+        if entry is None or entry[0] != index.signature:
+            return None
+        _, positions, meal_score, matching_items, calories, match_rate = entry
+        return {
+            'filtered': tuple(index.items_at(positions)),
+            'positions': positions,
+            'mealScore': meal_score,
+            'matchingItems': matching_items,
+            'calories': calories,
+            'matchRate': match_rate,
+        }
+
+    def for_hall(self, hall_id, meal_type):
+        """Lookup callable for get_meal_summary."""
+        return lambda index: self.get(hall_id, meal_type, index)
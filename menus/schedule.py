@@ -0,0 +1,189 @@
+"""
+Precompiled opening schedules for dining halls.
+
+Hours strings like "07:00-21:00" are parsed once into minute-of-day windows.
+Each HallSchedule expands them into per-minute tables, so "open now",
+"current meal" and "next transition" are single index lookups instead of
+strptime calls on every request.
+"""
+from array import array
+from datetime import timedelta
+from functools import lru_cache
+
+
+MINUTES_PER_DAY = 24 * 60
+MEAL_TYPES = ('breakfast', 'lunch', 'dinner')
+
+# Default meal boundaries used when a hall has no meal hours (minute of day)
+BREAKFAST_END = 10 * 60 + 30
+LUNCH_END = 15 * 60
+
+
+def minute_of_day(value):
+    """Minute of day (0-1439) for a time or datetime."""
+    return value.hour * 60 + value.minute
+
+
+@lru_cache(maxsize=256)
+def parse_window(window_str):
+    """
+    Parse an 'HH:MM-HH:MM' string into (start, end) minutes of day.
+    The end minute is included. Returns None for missing or invalid strings.
+    """
+    try:
+        start_str, end_str = window_str.split('-')
+        bounds = []
+        for value in (start_str, end_str):
+            hour, minute = value.split(':')
+            hour, minute = int(hour), int(minute)
+            if not (0 <= hour < 24 and 0 <= minute < 60):
+                return None
+            bounds.append(hour * 60 + minute)
+        return tuple(bounds)
+    except (AttributeError, ValueError):
+        return None
+
+
+def window_contains(window, minute):
+    """Check whether a (start, end) window contains the minute; windows may wrap past midnight."""
+    start, end = window
+    if start <= end:
+        return start <= minute <= end
+    return minute >= start or minute <= end
+
+
+def default_meal_type(minute, weekend=False):
+    """Meal being served at this minute by the campus-wide defaults (no breakfast on weekends)."""
+    if not weekend and minute < BREAKFAST_END:
+        return 'breakfast'
+    if minute < LUNCH_END:
+        return 'lunch'
+    return 'dinner'
+
+
+def _next_change_table(states):
+    """For each minute, the next minute whose state differs (MINUTES_PER_DAY at midnight)."""
+    table = array('H', [MINUTES_PER_DAY]) * MINUTES_PER_DAY
+    for minute in range(MINUTES_PER_DAY - 2, -1, -1):
+        if states[minute + 1] != states[minute]:
+            table[minute] = minute + 1
+        else:
+            table[minute] = table[minute + 1]
+    return table
+
+
+def _transition_time(now, minute):
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    return midnight + timedelta(minutes=minute)
+
+
+class HallSchedule:
+    """
+    Per-minute schedule for one hall.
+    - openAt: 1 if the hall is open during that minute
+    - mealAt: index into MEAL_TYPES + 1 for the meal being served, 0 for none
+    - nextChange: next minute when either of the above changes
+    """
+    __slots__ = ('hours', 'mealHours', 'openAt', 'mealAt', 'nextChange')
+
+    def __init__(self, hours, mealHours=()):
+        self.hours = hours
+        self.mealHours = dict(mealHours)
+
+        open_at = bytearray(MINUTES_PER_DAY)
+        window = parse_window(hours)
+        if window is not None:
+            for minute in range(MINUTES_PER_DAY):
+                open_at[minute] = window_contains(window, minute)
+
+        meal_at = bytearray(MINUTES_PER_DAY)
+        for index, meal_type in enumerate(MEAL_TYPES, start=1):
+            meal_window = parse_window(self.mealHours.get(meal_type))
+            if meal_window is None:
+                continue
+            for minute in range(MINUTES_PER_DAY):
+                if not meal_at[minute] and window_contains(meal_window, minute):
+                    meal_at[minute] = index
+
+        self.openAt = bytes(open_at)
+        self.mealAt = bytes(meal_at)
+        self.nextChange = _next_change_table(list(zip(self.openAt, self.mealAt)))
+
+    @classmethod
+    @lru_cache(maxsize=64)
+    def for_hours(cls, hours, meal_hours_items=()):
+        """Shared schedule for an hours string and a tuple of mealHours items."""
+        return cls(hours, meal_hours_items)
+
+    def is_open(self, minute):
+        return bool(self.openAt[minute])
+
+    def current_meal(self, minute):
+        """Meal served at this minute according to the hall's meal hours, or None."""
+        index = self.mealAt[minute]
+        return MEAL_TYPES[index - 1] if index else None
+
+    def next_transition(self, now):
+        """Datetime of the next open/close or meal change after now."""
+        return _transition_time(now, self.nextChange[minute_of_day(now)])
+
+
+class ScheduleStatus:
+    """Open halls from validFrom until expiresAt (the next transition of any hall)."""
+    __slots__ = ('openHalls', 'validFrom', 'expiresAt')
+
+    def __init__(self, openHalls, validFrom, expiresAt):
+        self.openHalls = openHalls
+        self.validFrom = validFrom
+        self.expiresAt = expiresAt
+
+    def is_valid(self, now):
+        return self.validFrom <= now < self.expiresAt
+
+
+class ScheduleIndex:
+    """
+    Schedules for every hall in a menu snapshot.
+    status(now) is recomputed only when the previous result has expired,
+    so open/closed-dependent data changes exactly at hall transitions.
+    """
+    __slots__ = ('schedules', 'nextChange', '_status')
+
+    def __init__(self, halls):
+        self.schedules = {
+            hall.id: HallSchedule.for_hours(hall.hours, tuple(sorted((hall.mealHours or {}).items())))
+            for hall in halls
+        }
+
+        # Earliest upcoming change across all halls and the default meal boundaries
+        tables = {id(schedule): schedule.nextChange for schedule in self.schedules.values()}.values()
+        next_change = array('H', [MINUTES_PER_DAY]) * MINUTES_PER_DAY
+        for minute in range(MINUTES_PER_DAY):
+            candidates = [table[minute] for table in tables]
+            candidates.extend(boundary for boundary in (BREAKFAST_END, LUNCH_END) if boundary > minute)
+            next_change[minute] = min(candidates, default=MINUTES_PER_DAY)
+        self.nextChange = next_change
+        self._status = None
+
+    def get(self, hall_id):
+        return self.schedules.get(hall_id)
+
+    def next_transition(self, now):
+        """Datetime of the next change to any hall's status or the default meal."""
+        return _transition_time(now, self.nextChange[minute_of_day(now)])
+
+    def status(self, now):
+        """Open hall IDs at now, reused until the next transition."""
+        status = self._status
+        if status is None or not status.is_valid(now):
+            minute = minute_of_day(now)
+            open_halls = frozenset(
+                hall_id for hall_id, schedule in self.schedules.items() if schedule.is_open(minute)
+            )
+            status = ScheduleStatus(
+                open_halls,
+                now.replace(second=0, microsecond=0),
+                self.next_transition(now),
+            )
+            self._status = status
+        return status
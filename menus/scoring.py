@@ -0,0 +1,352 @@
+"""
+Vectorized scoring engine for halls x meals x user profiles.
+
+Computes the same results as calculate_hall_score, calculate_meal_specific_score
+and filter_meals_by_preferences in menus/views.py, but for every hall, meal
+type and profile at once with NumPy array operations.
+
+- Dishes are reduced to distinct feature rows (allergen one-hot, diet one-hot,
+  plain-string flag); each (hall, meal) segment keeps sparse counts over them
+- Profiles are one-hot encoded the same way, so conflicts and diet matches
+  for every feature row x profile are two matrix products
+- Per-segment totals are one np.add.reduceat over the sparse entries, and
+  hall totals sum the meal segments; all sums are integer-exact in float64
+- Duplicate profiles are scored once
+
+NumPy is optional: without it ScoringEngine raises ImportError and the views
+keep using the pure-Python helpers.
+"""
+from collections.abc import Mapping
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised only without numpy
+    np = None
+
+from .models import ALLERGEN_BITS, DIET_BITS, UNKNOWN_ALLERGEN_BIT, get_allergen_mask, get_diet_mask, get_item_masks
+
+
+MEAL_TYPES = ('breakfast', 'lunch', 'dinner')
+
+# Bit positions that get_allergen_mask / get_diet_mask can set
+ALLERGEN_BIT_POSITIONS = sorted({bit.bit_length() - 1 for bit in ALLERGEN_BITS.values()} |
+                                {UNKNOWN_ALLERGEN_BIT.bit_length() - 1})
+DIET_BIT_POSITIONS = sorted({bit.bit_length() - 1 for bit in DIET_BITS.values()})
+
+# Score weights, mirroring the pure-Python helpers
+OPEN_HALL_BONUS = 50
+MEAL_SAFE_POINTS = 10
+MEAL_DIET_POINTS = 15
+MEAL_STRING_POINTS = 5
+MEAL_VARIETY_POINTS = 2
+HALL_DIET_POINTS = 10
+HALL_MATCH_POINTS = 5
+
+# Upper bound on entries x profiles per chunk in ScoringEngine.segment_totals
+PROFILE_CHUNK_ENTRIES = 4_000_000
+
+
+def _one_hot(masks, positions):
+    masks = np.asarray(masks, dtype=np.int64).reshape(-1, 1)
+    return ((masks >> np.asarray(positions, dtype=np.int64)) & 1).astype(np.float64)
+
+
+class ProfileBatch:
+    """
+    Encoded user profiles.
+    - allergenOneHot / dietOneHot: profiles x bits
+    - hasAllergens / hasDiets: whether the original lists were non-empty
+      (the helpers branch on the lists, not on the masks)
+    """
+    __slots__ = ('allergenOneHot', 'dietOneHot', 'hasAllergens', 'hasDiets')
+
+    def __init__(self, profiles):
+        profiles = list(profiles)
+        allergen_masks = [get_allergen_mask(allergens) for allergens, _ in profiles]
+        diet_masks = [get_diet_mask(diets) for _, diets in profiles]
+        self.allergenOneHot = _one_hot(allergen_masks, ALLERGEN_BIT_POSITIONS)
+        self.dietOneHot = _one_hot(diet_masks, DIET_BIT_POSITIONS)
+        self.hasAllergens = np.array([bool(allergens) for allergens, _ in profiles])
+        self.hasDiets = np.array([bool(diets) for _, diets in profiles])
+
+    @classmethod
+    def from_arrays(cls, allergenOneHot, dietOneHot, hasAllergens, hasDiets):
+        batch = cls.__new__(cls)
+        batch.allergenOneHot = allergenOneHot
+        batch.dietOneHot = dietOneHot
+        batch.hasAllergens = hasAllergens
+        batch.hasDiets = hasDiets
+        return batch
+
+    def __len__(self):
+        return len(self.hasDiets)
+
+    def __getitem__(self, index):
+        """Slice of the batch (index must be a slice)."""
+        return ProfileBatch.from_arrays(
+            self.allergenOneHot[index], self.dietOneHot[index], self.hasAllergens[index], self.hasDiets[index]
+        )
+
+
+class ScoringEngine:
+    """
+    Feature matrices for a fixed set of hall menus.
+
+    Args:
+        hall_menus: {hall_id: {meal_type: [items]}} where items are dish
+            mappings (dicts or snapshot Dish records) or plain strings
+    """
+
+    def __init__(self, hall_menus):
+        if np is None:
+            raise ImportError("NumPy is required for ScoringEngine")
+
+        self.hallIds = list(hall_menus)
+        self.hallIndex = {hall_id: index for index, hall_id in enumerate(self.hallIds)}
+
+        feature_rows = {}
+        features = []  # (allergen mask, diet mask, is plain string)
+        segment_features = []  # per (hall, meal): feature row index of each item
+        segment_calories = []
+        self.items = []  # per (hall, meal): the original items, for filtering
+
+        for hall_id in self.hallIds:
+            meals = hall_menus[hall_id] or {}
+            for meal_type in MEAL_TYPES:
+                items = tuple(meals.get(meal_type, ()))
+                rows, calories = [], []
+                for item in items:
+                    if isinstance(item, Mapping):
+                        allergen_mask, diet_mask = get_item_masks(item)
+                        key = (allergen_mask, diet_mask, False)
+                        calories.append(item.get('calories', 0) or 0)
+                    else:
+                        key = (0, 0, True)
+                        calories.append(0)
+                    if key not in feature_rows:
+                        feature_rows[key] = len(features)
+                        features.append(key)
+                    rows.append(feature_rows[key])
+                segment_features.append(np.array(rows, dtype=np.intp))
+                segment_calories.append(calories)
+                self.items.append(items)
+
+        self.segmentFeatures = segment_features
+        self.segmentCount = len(segment_features)
+        self.featureCount = len(features)
+
+        # Sparse (segment, feature row) entries with item counts and calorie sums,
+        # ordered by segment so per-segment totals are a single np.add.reduceat
+        entries = {}
+        for segment, (rows, calories) in enumerate(zip(segment_features, segment_calories)):
+            for row, item_calories in zip(rows.tolist(), calories):
+                count, calorie_sum = entries.get((segment, row), (0, 0))
+                entries[(segment, row)] = (count + 1, calorie_sum + item_calories)
+        keys = sorted(entries)
+        self.entrySegments = np.array([segment for segment, _ in keys], dtype=np.intp)
+        self.entryFeatures = np.array([row for _, row in keys], dtype=np.intp)
+        self.entryCounts = np.array([entries[key][0] for key in keys], dtype=np.float64)
+        self.entryCalories = np.array([entries[key][1] for key in keys], dtype=np.float64)
+        self.segmentStarts, self.nonEmptySegments = self._segment_starts()
+
+        self.segmentTotals = np.zeros(self.segmentCount)
+        np.add.at(self.segmentTotals, self.entrySegments, self.entryCounts)
+        self.segmentStrings = np.zeros(self.segmentCount)
+        is_string_entry = np.array([features[row][2] for row in self.entryFeatures.tolist()], dtype=bool)
+        np.add.at(self.segmentStrings, self.entrySegments[is_string_entry], self.entryCounts[is_string_entry])
+
+        self.allergenOneHot = _one_hot([f[0] for f in features] or [0], ALLERGEN_BIT_POSITIONS)
+        self.dietOneHot = _one_hot([f[1] for f in features] or [0], DIET_BIT_POSITIONS)
+        self.isString = np.array([f[2] for f in features] or [False])
+
+    @classmethod
+    def from_snapshot(cls, snapshot, date_str=None):
+        """Engine over a menu snapshot, using each hall's menu for date_str when it has one."""
+        hall_menus = {}
+        for hall in snapshot.halls:
+            hall_menus[hall.id] = (hall.get_menu(date_str) if date_str else hall).meals
+        return cls(hall_menus)
+
+    def _segment(self, hall_index, meal_type):
+        return hall_index * len(MEAL_TYPES) + MEAL_TYPES.index(meal_type)
+
+    def _segment_starts(self):
+        if not len(self.entrySegments):
+            return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+        boundaries = np.flatnonzero(np.diff(self.entrySegments)) + 1
+        starts = np.concatenate(([0], boundaries)).astype(np.intp)
+        return starts, self.entrySegments[starts]
+
+    def _feature_matrices(self, profiles):
+        """Per feature row x profile: safe-dish flags and diet match counts, plus the plain-string column."""
+        conflicts = (self.allergenOneHot @ profiles.allergenOneHot.T) > 0
+        matches = self.dietOneHot @ profiles.dietOneHot.T
+        is_string = self.isString[:, None]
+        safe_dish = ~is_string & ~conflicts
+        return safe_dish, is_string, matches
+
+    def _segment_sums(self, values, weights):
+        """Sum weights * values[feature] over each segment's entries (segments x columns)."""
+        totals = np.zeros((self.segmentCount, values.shape[1]), dtype=values.dtype)
+        if len(self.segmentStarts):
+            weighted = values[self.entryFeatures] * weights[:, None]
+            totals[self.nonEmptySegments] = np.add.reduceat(weighted, self.segmentStarts, axis=0)
+        return totals
+
+    def segment_totals(self, profiles):
+        """
+        Per (hall, meal) segment x profile totals that every score is built from.
+        Identical profiles are computed once, and profiles are processed in
+        chunks so the per-entry intermediates stay small.
+
+        Returns:
+            dict of segments x profiles arrays: safeDishes, includedItems,
+            dietMatches, dietMatchedItems, safeCalories
+        """
+        encoded = np.hstack([
+            profiles.allergenOneHot, profiles.dietOneHot,
+            profiles.hasAllergens[:, None], profiles.hasDiets[:, None],
+        ])
+        unique_rows, inverse = np.unique(encoded, axis=0, return_inverse=True)
+        unique = ProfileBatch.from_arrays(
+            unique_rows[:, :len(ALLERGEN_BIT_POSITIONS)],
+            unique_rows[:, len(ALLERGEN_BIT_POSITIONS):-2],
+            unique_rows[:, -2].astype(bool),
+            unique_rows[:, -1].astype(bool),
+        )
+
+        names = ('safeDishes', 'includedItems', 'dietMatches', 'dietMatchedItems', 'safeCalories')
+        totals = {name: np.zeros((self.segmentCount, len(unique))) for name in names}
+        chunk_size = max(1, PROFILE_CHUNK_ENTRIES // max(len(self.entryFeatures), 1))
+        for start in range(0, len(unique), chunk_size):
+            chunk = unique[start:start + chunk_size]
+            columns = slice(start, start + len(chunk))
+            safe_dish, is_string, matches = self._feature_matrices(chunk)
+            diet_matches = matches * (safe_dish & chunk.hasDiets[None, :])
+            width = len(chunk)
+
+            stacked = np.hstack([safe_dish | is_string, safe_dish, diet_matches, diet_matches > 0])
+            # Item counts and diet-match sums stay far below 2**24, so float32 is exact
+            sums = self._segment_sums(stacked.astype(np.float32), self.entryCounts.astype(np.float32))
+            totals['includedItems'][:, columns] = sums[:, :width]
+            totals['safeDishes'][:, columns] = sums[:, width:2 * width]
+            totals['dietMatches'][:, columns] = sums[:, 2 * width:3 * width]
+            totals['dietMatchedItems'][:, columns] = sums[:, 3 * width:]
+            totals['safeCalories'][:, columns] = self._segment_sums(
+                safe_dish.astype(np.float64), self.entryCalories
+            )
+
+        inverse = inverse.reshape(-1)
+        return {name: values[:, inverse] for name, values in totals.items()}
+
+    def meal_scores(self, profiles, meal_type, open_halls=(), totals=None):
+        """
+        calculate_meal_specific_score for every hall x profile.
+
+        Args:
+            totals: Optional segment_totals(profiles) result to reuse
+
+        Returns:
+            (score, safe_items, match_rate) integer arrays of shape halls x profiles
+        """
+        if totals is None:
+            totals = self.segment_totals(profiles)
+        segments = [self._segment(index, meal_type) for index in range(len(self.hallIds))]
+        has_diets = profiles.hasDiets[None, :]
+
+        safe_items = totals['includedItems'][segments]
+        diet_matched_items = totals['dietMatchedItems'][segments]
+        total_items = self.segmentTotals[segments][:, None]
+
+        score = (
+            MEAL_SAFE_POINTS * totals['safeDishes'][segments]
+            + MEAL_DIET_POINTS * totals['dietMatches'][segments]
+            + MEAL_STRING_POINTS * self.segmentStrings[segments][:, None]
+            + MEAL_VARIETY_POINTS * safe_items
+            + OPEN_HALL_BONUS * self._open_column(open_halls)
+        )
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            safe_rate = (safe_items / total_items) * 100
+            diet_rate = np.where(safe_items > 0, (diet_matched_items / safe_items) * 100, 0.0)
+            match_rate = np.where(has_diets, np.trunc(safe_rate * 0.7 + diet_rate * 0.3), np.trunc(safe_rate))
+        match_rate = np.where(total_items > 0, np.clip(match_rate, 0, 100), 0)
+
+        return score.astype(np.int64), safe_items.astype(np.int64), match_rate.astype(np.int64)
+
+    def hall_scores(self, profiles, open_halls=(), totals=None):
+        """
+        calculate_hall_score for every hall x profile (all meal types).
+
+        Args:
+            totals: Optional segment_totals(profiles) result to reuse
+
+        Returns:
+            (score, matching_items, total_calories, match_rate) integer arrays of shape halls x profiles
+        """
+        if totals is None:
+            totals = self.segment_totals(profiles)
+        hall_count = len(self.hallIds)
+
+        def per_hall(values):
+            return values.reshape(hall_count, len(MEAL_TYPES), -1).sum(axis=1)
+
+        matching_items = per_hall(totals['includedItems'])
+        preference_matches = per_hall(totals['dietMatchedItems'])
+        total_items = per_hall(self.segmentTotals[:, None])
+
+        score = (
+            HALL_DIET_POINTS * per_hall(totals['dietMatches'])
+            + HALL_MATCH_POINTS * matching_items
+            + OPEN_HALL_BONUS * self._open_column(open_halls)
+        )
+        total_calories = per_hall(totals['safeCalories'])
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rate = np.trunc((matching_items / total_items) * 100) + preference_matches * 5
+        match_rate = np.where(total_items > 0, np.minimum(100, np.maximum(60, rate)), 70)
+
+        return (score.astype(np.int64), matching_items.astype(np.int64),
+                total_calories.astype(np.int64), match_rate.astype(np.int64))
+
+    def score_all(self, profiles, open_halls=()):
+        """
+        Hall scores and every meal type's scores from one pass over the menus.
+
+        Returns:
+            (hall_scores result, {meal_type: meal_scores result})
+        """
+        totals = self.segment_totals(profiles)
+        return (
+            self.hall_scores(profiles, open_halls, totals),
+            {meal_type: self.meal_scores(profiles, meal_type, open_halls, totals) for meal_type in MEAL_TYPES},
+        )
+
+    def filter_meals(self, profiles, profile_index=0):
+        """
+        filter_meals_by_preferences for every hall, for one profile of the batch.
+
+        Returns:
+            {hall_id: {meal_type: [items]}}
+        """
+        safe_dish, is_string, matches = self._feature_matrices(profiles)
+        column = profile_index
+        if profiles.hasDiets[column]:
+            keep = safe_dish[:, column] & (matches[:, column] > 0)
+        else:
+            keep = safe_dish[:, column].copy()
+        if not profiles.hasAllergens[column]:
+            keep |= self.isString
+
+        filtered = {}
+        for hall_index, hall_id in enumerate(self.hallIds):
+            filtered[hall_id] = {}
+            for meal_type in MEAL_TYPES:
+                segment = self._segment(hall_index, meal_type)
+                items = self.items[segment]
+                kept = keep[self.segmentFeatures[segment]] if items else ()
+                filtered[hall_id][meal_type] = [item for item, flag in zip(items, kept) if flag]
+        return filtered
+
+    def _open_column(self, open_halls):
+        return np.array([hall_id in open_halls for hall_id in self.hallIds], dtype=np.float64)[:, None]
@@ -0,0 +1,55 @@
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+
+from .models import DiningHall, MenuDay, MenuOffering, MenuItem
+from .cache import invalidate_menu_cache
+
+
+MENU_MODELS = (DiningHall, MenuDay, MenuOffering, MenuItem)
+
+
+def _bump_queued(connection):
+    """Whether the open transaction already has a commit-time version bump queued."""
+    return any(entry[1] is invalidate_menu_cache for entry in connection.run_on_commit)
+
+
+# Any change to menu data moves the menu cache to a new version
+def invalidate_menus(sender, using=None, **kwargs):
+    invalidate_menu_cache()
+    # Bump again once committed so other processes can't cache pre-commit data;
+    # one queued bump per transaction covers every row changed in it
+    connection = transaction.get_connection(using)
+    if connection.in_atomic_block and not _bump_queued(connection):
+        transaction.on_commit(invalidate_menu_cache, using=using)
+
+
+def _connect(model):
+    post_save.connect(invalidate_menus, sender=model)
+    post_delete.connect(invalidate_menus, sender=model)
+
+
+def _disconnect(model):
+    post_save.disconnect(invalidate_menus, sender=model)
+    post_delete.disconnect(invalidate_menus, sender=model)
+
+
+@contextmanager
+def menu_signals_paused():
+    """
+    Disconnect invalidate_menus for bulk menu writes; the caller invalidates
+    the menu cache once afterwards. Without receivers, deleting a MenuDay
+    also removes its offerings in one DELETE instead of row by row.
+    """
+    for model in MENU_MODELS:
+        _disconnect(model)
+    try:
+        yield
+    finally:
+        for model in MENU_MODELS:
+            _connect(model)
+
+
+for model in MENU_MODELS:
+    _connect(model)
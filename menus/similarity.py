@@ -0,0 +1,154 @@
+"""
+Dish similarity from ingredient lists: MinHash signatures and an LSH index.
+
+- Each dish is reduced to the set of words in its name and ingredients, and
+  minhash_signature summarizes that set in NUM_PERMUTATIONS 32-bit values.
+  The share of equal values estimates the Jaccard similarity of two sets.
+  MenuItem computes the signature when a dish is imported and stores it
+- LSHIndex splits signatures into BANDS bands and buckets dishes by band,
+  so dishes sharing any band are candidates. A query looks up BANDS buckets
+  instead of comparing against every dish; with 16 bands of 4 rows, pairs
+  above about 0.5 similarity are very likely to share a bucket
+- SimilarityIndex adds where each dish is served (hall, date, meal) for one
+  menu snapshot, so "similar safe alternatives" and "more like what I ate"
+  are answered from memory across all halls and dates
+
+The permutations come from a fixed seed and tokens are hashed with blake2b,
+so signatures are the same in every process and stay comparable with the
+stored ones.
+"""
+import hashlib
+import random
+import re
+import struct
+
+
+NUM_PERMUTATIONS = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERMUTATIONS // BANDS
+
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_SIGNATURE_FORMAT = f'<{NUM_PERMUTATIONS}I'
+_seed = random.Random(20251208)
+_PERMUTATIONS = tuple((_seed.randrange(1, _PRIME), _seed.randrange(0, _PRIME)) for _ in range(NUM_PERMUTATIONS))
+
+_WORD_RE = re.compile(r'[a-z]+')
+# Words in nearly every ingredient list carry no signal
+STOP_WORDS = frozenset({
+    'and', 'with', 'the', 'contains', 'less', 'than', 'etc', 'for', 'from', 'added', 'natural', 'flavor',
+    'flavors', 'salt', 'water', 'oil', 'sugar', 'or', 'of', 'in', 'to',
+})
+
+
+def dish_tokens(name, ingredients=''):
+    """Distinct lowercase words (3+ letters, no stop words) of a dish's name and ingredients."""
+    words = _WORD_RE.findall(f'{name} {ingredients or ""}'.lower())
+    return {word for word in words if len(word) > 2 and word not in STOP_WORDS}
+
+
+def _token_hash(token):
+    return int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def minhash_signature(tokens):
+    """MinHash of a token set, packed as NUM_PERMUTATIONS little-endian uint32 (b'' for no tokens)."""
+    if not tokens:
+        return b''
+    hashes = [_token_hash(token) for token in tokens]
+    return struct.pack(_SIGNATURE_FORMAT, *(
+        min((a * value + b) % _PRIME for value in hashes) & _MAX_HASH for a, b in _PERMUTATIONS
+    ))
+
+
+def unpack_signature(packed):
+    """Signature values from minhash_signature bytes, or None if there are none."""
+    if not packed or len(packed) != struct.calcsize(_SIGNATURE_FORMAT):
+        return None
+    return struct.unpack(_SIGNATURE_FORMAT, bytes(packed))
+
+
+def estimate_similarity(first, second):
+    """Estimated Jaccard similarity of the token sets behind two signatures."""
+    return sum(a == b for a, b in zip(first, second)) / NUM_PERMUTATIONS
+
+
+class LSHIndex:
+    """Banded locality-sensitive hash index over {key: signature values}."""
+
+    def __init__(self, signatures):
+        self.signatures = signatures
+        self.buckets = [{} for _ in range(BANDS)]
+        for key, signature in signatures.items():
+            for band, buckets in enumerate(self.buckets):
+                buckets.setdefault(signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND], []).append(key)
+
+    def candidates(self, signature):
+        """Keys sharing at least one band with the signature."""
+        found = set()
+        for band, buckets in enumerate(self.buckets):
+            found.update(buckets.get(signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND], ()))
+        return found
+
+    def query(self, signature, threshold=0.0):
+        """{key: estimated similarity} for candidates at or above threshold."""
+        result = {}
+        for key in self.candidates(signature):
+            similarity = estimate_similarity(signature, self.signatures[key])
+            if similarity >= threshold:
+                result[key] = similarity
+        return result
+
+
+class SimilarityIndex:
+    """
+    LSH over the catalog plus where each dish is served in one snapshot.
+    - lsh: LSHIndex keyed by dish ID
+    - servings: {dish ID: tuple of (HallMenu, date or None for the hall's default meals, meal_type)}
+    - idsByName: {dish name: dish IDs}, to resolve names stored in MealHistory
+    """
+
+    def __init__(self, snapshot, signatures):
+        self.snapshot = snapshot
+        self.lsh = LSHIndex(signatures)
+        servings = {}
+        for hall in snapshot.halls:
+            for menu in (hall, *hall.days):
+                date = getattr(menu, 'date', None)
+                for meal_type, items in menu.meals.items():
+                    for item in items:
+                        dish_id = getattr(item, 'id', None)
+                        if dish_id is not None:
+                            servings.setdefault(dish_id, {})[hall.id, date, meal_type] = (hall, date, meal_type)
+        self.servings = {dish_id: tuple(places.values()) for dish_id, places in servings.items()}
+        self.idsByName = {}
+        for dish_id, dish in snapshot.dishes.items():
+            self.idsByName.setdefault(dish.name, []).append(dish_id)
+
+    def similar(self, dish_ids, user_allergen_mask=0, user_diet_mask=0, has_diets=False, threshold=0.0):
+        """
+        Served dishes similar to any of dish_ids and safe for the profile.
+
+        Returns:
+            {dish ID: best estimated similarity}, excluding dish_ids and dishes with their names
+        """
+        excluded_names = {self.snapshot.dishes[dish_id].name for dish_id in dish_ids if dish_id in self.snapshot.dishes}
+        result = {}
+        for dish_id in dish_ids:
+            signature = self.lsh.signatures.get(dish_id)
+            if signature is None:
+                continue
+            for candidate, similarity in self.lsh.query(signature, threshold).items():
+                dish = self.snapshot.dishes.get(candidate)
+                if (
+                    dish is None
+                    or candidate not in self.servings
+                    or dish.name in excluded_names
+                    or dish.allergenMask & user_allergen_mask
+                    or (has_diets and not dish.dietMask & user_diet_mask)
+                ):
+                    continue
+                if similarity > result.get(candidate, -1):
+                    result[candidate] = similarity
+        return result
+
@@ -0,0 +1,444 @@
+"""
+Immutable in-memory snapshot of all menu data.
+
+The snapshot is built from the database and shared by every request; see
+menus.cache for how it is stored and invalidated. Dishes are compact __slots__
+records with interned strings, and each distinct dish is a single object no
+matter how many menus reference it.
+Views read meals straight from the snapshot instead of deep-copying JSON.
+
+Every meal also carries a MealIndex, an inverted index from allergen/diet tag
+bits to the positions of the dishes carrying them, so preference filtering is
+set algebra on int bitsets instead of a scan over the dishes.
+
+Rebuilding after a menu change reuses every dish, dated menu, meal index and
+the schedule that did not change (see MenuSnapshot.from_db), so results
+cached per meal index only need recomputing for the meals that were edited.
+"""
+import hashlib
+import sys
+from collections.abc import Mapping
+from types import MappingProxyType
+
+from .artifacts import artifact_counters
+from .models import DiningHall, MenuDay, MenuOffering, MenuItem, get_item_masks
+from .schedule import ScheduleIndex
+
+
+MEAL_TYPES = ('breakfast', 'lunch', 'dinner')
+
+
+def _bit_positions(bits):
+    """Yield the positions of the set bits of an int, lowest first."""
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+class MealIndex:
+    """
+    Inverted index of one meal's items, as bitsets over item positions.
+    - dishes / strings: positions of dish records / plain-name items
+    - byAllergen / byDiet: {tag bit: positions of dishes with that tag}
+    - signature: stable hash of what filtering and scoring depend on (see below)
+    """
+    __slots__ = ('items', 'dishes', 'strings', 'byAllergen', 'byDiet', '_signature')
+
+    def __init__(self, items):
+        self.items = tuple(items)
+        self._signature = None
+        self.dishes = 0
+        self.strings = 0
+        self.byAllergen = {}
+        self.byDiet = {}
+        for position, item in enumerate(self.items):
+            bit = 1 << position
+            if not isinstance(item, Mapping):
+                self.strings |= bit
+                continue
+            self.dishes |= bit
+            allergen_mask, diet_mask = get_item_masks(item)
+            for tag_bit in _bit_positions(allergen_mask):
+                self.byAllergen[tag_bit] = self.byAllergen.get(tag_bit, 0) | bit
+            for tag_bit in _bit_positions(diet_mask):
+                self.byDiet[tag_bit] = self.byDiet.get(tag_bit, 0) | bit
+
+    @property
+    def signature(self):
+        """
+        Hash of the item sequence: each dish's id, calories and allergen/diet
+        masks, and plain names as they are. It is the same in every process
+        and across restarts, so it can key results stored in the database.
+        """
+        if self._signature is None:
+            self._signature = hashlib.sha1(repr(tuple(
+                (item.get('id'), item.get('calories', 0) or 0, *get_item_masks(item))
+                if isinstance(item, Mapping) else item
+                for item in self.items
+            )).encode()).hexdigest()
+        return self._signature
+
+    @staticmethod
+    def _union(table, mask):
+        positions = 0
+        for tag_bit in _bit_positions(mask):
+            positions |= table.get(tag_bit, 0)
+        return positions
+
+    def safe_dishes(self, allergen_mask):
+        """Dishes with none of the allergens in the mask."""
+        return self.dishes & ~self._union(self.byAllergen, allergen_mask)
+
+    def matching(self, positions, diet_mask):
+        """The given dishes that have at least one of the diet tags in the mask."""
+        return positions & self._union(self.byDiet, diet_mask)
+
+    def diet_match_total(self, positions, diet_mask):
+        """Sum over the given dishes of how many of the mask's diet tags each one has."""
+        return sum((self.byDiet.get(tag_bit, 0) & positions).bit_count() for tag_bit in _bit_positions(diet_mask))
+
+    def items_at(self, positions):
+        """Items at the given positions, in menu order."""
+        return [self.items[position] for position in _bit_positions(positions)]
+
+    def entries_at(self, positions):
+        """(position, item) pairs for the given positions, in menu order."""
+        return [(position, self.items[position]) for position in _bit_positions(positions)]
+
+
+def build_meal_indexes(meals):
+    """{meal_type: MealIndex} for a meals mapping."""
+    return {meal_type: MealIndex(meals.get(meal_type, ())) for meal_type in MEAL_TYPES}
+
+
+def _freeze_meals(meals, selections):
+    return (
+        MappingProxyType({meal_type: tuple(meals.get(meal_type, ())) for meal_type in MEAL_TYPES}),
+        MappingProxyType({meal_type: tuple(selections.get(meal_type, ())) for meal_type in MEAL_TYPES}),
+    )
+
+
+class Dish(Mapping):
+    """
+    Read-only dish record.
+    Implements the Mapping protocol so existing code and templates that do
+    item.get('allergens') / item['name'] / {{ item.name }} keep working.
+    """
+    __slots__ = ('id', 'name', 'calories', 'allergens', 'dietCategories', 'ingredients',
+                 'allergenMask', 'dietMask')
+
+    def __init__(self, id, name, calories, allergens, dietCategories, ingredients, allergenMask, dietMask):
+        self.id = id
+        self.name = name
+        self.calories = calories
+        self.allergens = allergens
+        self.dietCategories = dietCategories
+        self.ingredients = ingredients
+        self.allergenMask = allergenMask
+        self.dietMask = dietMask
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self):
+        return iter(self.__slots__)
+
+    def __len__(self):
+        return len(self.__slots__)
+
+    def __repr__(self):
+        return f"Dish({self.id!r}, {self.name!r})"
+
+    def __reduce__(self):
+        return (Dish, tuple(getattr(self, key) for key in self.__slots__))
+
+
+class DayMenu:
+    """One hall's menu for one date."""
+    __slots__ = ('date', 'dateDisplay', 'dayOfWeek', 'isWeekend', 'meals', 'selections', 'indexes')
+
+    def __init__(self, date, dateDisplay, dayOfWeek, isWeekend, meals, selections, indexes=None):
+        self.date = date
+        self.dateDisplay = dateDisplay
+        self.dayOfWeek = dayOfWeek
+        self.isWeekend = isWeekend
+        self.meals, self.selections = _freeze_meals(meals, selections)
+        self.indexes = MappingProxyType(indexes or build_meal_indexes(self.meals))
+
+    def __reduce__(self):
+        return (DayMenu, (self.date, self.dateDisplay, self.dayOfWeek, self.isWeekend,
+                          dict(self.meals), dict(self.selections), dict(self.indexes)))
+
+
+class HallMenu:
+    """
+    One hall's menu data.
+    - meals: {meal_type: tuple of Dish (or plain names for old string menus)}
+    - selections: {meal_type: tuple of weeklySelections (None when unknown)}, parallel to meals
+    - indexes: {meal_type: MealIndex} over meals
+    - days: tuple of DayMenu ordered by date
+    """
+    __slots__ = ('id', 'hallName', 'hours', 'mealHours', 'meals', 'selections', 'indexes', 'days', 'daysByDate')
+
+    def __init__(self, id, hallName, hours, mealHours, meals, selections, days, indexes=None):
+        self.id = id
+        self.hallName = hallName
+        self.hours = hours
+        self.mealHours = MappingProxyType(dict(mealHours or {}))
+        self.meals, self.selections = _freeze_meals(meals, selections)
+        self.indexes = MappingProxyType(indexes or build_meal_indexes(self.meals))
+        self.days = tuple(days)
+        self.daysByDate = {day.date: day for day in self.days}
+
+    def __reduce__(self):
+        return (HallMenu, (self.id, self.hallName, self.hours, dict(self.mealHours),
+                           dict(self.meals), dict(self.selections), self.days, dict(self.indexes)))
+
+    def get_day(self, date_str):
+        return self.daysByDate.get(date_str)
+
+    def get_menu(self, date_str):
+        """The dated menu for date_str if it lists any dishes, otherwise the hall's default meals (self)."""
+        day = self.daysByDate.get(date_str)
+        return day if day is not None and any(day.meals.values()) else self
+
+
+class _Interner:
+    """Share one object per distinct string / tag tuple / dish."""
+
+    def __init__(self):
+        self.tuples = {}
+
+    def tags(self, values):
+        key = tuple(sys.intern(v) for v in values or [] if isinstance(v, str))
+        return self.tuples.setdefault(key, key)
+
+    def dish(self, dish):
+        return Dish(
+            dish.id,
+            sys.intern(dish.name),
+            dish.calories,
+            self.tags(dish.allergens),
+            self.tags(dish.dietTags),
+            dish.ingredients,
+            dish.allergenMask,
+            dish.dietMask,
+        )
+
+    def legacy_item(self, item):
+        """Convert a hand-entered meal dict into a Dish (strings stay strings)."""
+        if isinstance(item, str):
+            return sys.intern(item)
+        allergen_mask, diet_mask = get_item_masks(item)
+        return Dish(
+            None,
+            sys.intern(str(item.get('name', 'Unknown'))),
+            item.get('calories', 0) or 0,
+            self.tags(item.get('allergens', [])),
+            self.tags(item.get('dietCategories', []) or item.get('dietTags', [])),
+            item.get('ingredients', '') or '',
+            allergen_mask,
+            diet_mask,
+        )
+
+
+class _Carryover:
+    """
+    Reuse the parts of a previous snapshot that are unchanged in the database.
+    Reused menus keep their MealIndex objects, so anything cached per index
+    stays valid; changed meals get new indexes. Counts go to artifact_counters.
+    """
+
+    def __init__(self, previous):
+        self.dishes = previous.dishes if previous is not None else {}
+        self.halls = previous.hallsById if previous is not None else {}
+        self.previous = previous
+        self.counts = {kind: [0, 0] for kind in ('dishes', 'menus', 'mealIndexes', 'schedule')}
+
+    def _count(self, kind, reused, amount=1):
+        self.counts[kind][reused] += amount
+
+    def dish(self, dish):
+        previous = self.dishes.get(dish.id)
+        if previous is not None and previous == dish:
+            self._count('dishes', True)
+            return previous
+        self._count('dishes', False)
+        return dish
+
+    def indexes(self, meals, previous):
+        """(meals, indexes) with the previous tuple and index for every unchanged meal."""
+        meals, indexes = dict(meals), {}
+        for meal_type in MEAL_TYPES:
+            if previous is not None and previous.meals[meal_type] == meals[meal_type]:
+                meals[meal_type] = previous.meals[meal_type]
+                indexes[meal_type] = previous.indexes[meal_type]
+                self._count('mealIndexes', True)
+            else:
+                indexes[meal_type] = MealIndex(meals[meal_type])
+                self._count('mealIndexes', False)
+        return meals, indexes
+
+    def day(self, hall_id, date, dateDisplay, dayOfWeek, isWeekend, meals, selections):
+        meals, selections = _freeze_meals(meals, selections)
+        hall = self.halls.get(hall_id)
+        previous = hall.get_day(date) if hall is not None else None
+        if (
+            previous is not None
+            and (previous.dateDisplay, previous.dayOfWeek, previous.isWeekend) == (dateDisplay, dayOfWeek, isWeekend)
+            and previous.meals == meals
+            and previous.selections == selections
+        ):
+            self._count('menus', True)
+            self._count('mealIndexes', True, len(MEAL_TYPES))
+            return previous
+        self._count('menus', False)
+        meals, indexes = self.indexes(meals, previous)
+        return DayMenu(date, dateDisplay, dayOfWeek, isWeekend, meals, selections, indexes)
+
+    def hall(self, id, hallName, hours, mealHours, meals, selections, days):
+        meals, selections = _freeze_meals(meals, selections)
+        previous = self.halls.get(id)
+        if (
+            previous is not None
+            and (previous.hallName, previous.hours, previous.mealHours) == (hallName, hours, dict(mealHours or {}))
+            and previous.meals == meals
+            and previous.selections == selections
+            and len(previous.days) == len(days)
+            and all(old is new for old, new in zip(previous.days, days))
+        ):
+            self._count('menus', True)
+            self._count('mealIndexes', True, len(MEAL_TYPES))
+            return previous
+        self._count('menus', False)
+        meals, indexes = self.indexes(meals, previous)
+        return HallMenu(id, hallName, hours, mealHours, meals, selections, days, indexes)
+
+    def schedule(self, halls):
+        """The previous ScheduleIndex if no hall's id, hours or meal hours changed."""
+        if self.previous is not None:
+            key = [(hall.id, hall.hours, hall.mealHours) for hall in halls]
+            if key == [(hall.id, hall.hours, hall.mealHours) for hall in self.previous.halls]:
+                self._count('schedule', True)
+                return self.previous.schedule
+        self._count('schedule', False)
+        return None
+
+    def flush(self):
+        for kind, (rebuilt, reused) in self.counts.items():
+            artifact_counters.add(kind, rebuilt=rebuilt, reused=reused)
+
+
+class MenuSnapshot:
+    """
+    Every hall, dish and dated menu, loaded with four queries.
+    - version: menu cache version the snapshot was built for (None if uncached)
+    - schedule: ScheduleIndex of the halls' opening and meal hours
+    """
+    __slots__ = ('halls', 'hallsById', 'dishes', 'version', 'schedule')
+
+    def __init__(self, halls, dishes, version=None, schedule=None):
+        self.halls = tuple(halls)
+        self.hallsById = {hall.id: hall for hall in self.halls}
+        self.dishes = dishes
+        self.version = version
+        self.schedule = schedule or ScheduleIndex(self.halls)
+
+    def __reduce__(self):
+        return (MenuSnapshot, (self.halls, self.dishes, self.version))
+
+    @classmethod
+    def from_db(cls, previous=None):
+        """
+        Build a snapshot from the database.
+
+        Args:
+            previous: Optional earlier snapshot. Unchanged dishes, menus, meal
+                indexes and the schedule are taken from it instead of rebuilt,
+                so per-index caches only miss for the meals that changed.
+        """
+        interner = _Interner()
+        carryover = _Carryover(previous)
+        dishes = {dish.id: carryover.dish(interner.dish(dish)) for dish in MenuItem.objects.all()}
+
+        day_rows = {}
+        for day in MenuDay.objects.order_by('diningHall_id', 'date'):
+            day_rows.setdefault(day.diningHall_id, []).append(day)
+
+        day_meals = {}
+        for day_id, meal_type, dish_id, selections in MenuOffering.objects.order_by(
+            'day_id', 'mealType', 'position'
+        ).values_list('day_id', 'mealType', 'dish_id', 'weeklySelections'):
+            meals, counts = day_meals.setdefault(day_id, ({}, {}))
+            meals.setdefault(meal_type, []).append(dishes[dish_id])
+            counts.setdefault(meal_type, []).append(selections)
+
+        halls = []
+        for hall in DiningHall.objects.order_by('id'):
+            meals, selections = {}, {}
+            for meal_type, items in (hall.meals or {}).items():
+                meals[meal_type], selections[meal_type] = [], []
+                for item in items:
+                    if isinstance(item, dict) and 'dishId' in item:
+                        dish = dishes.get(item['dishId'])
+                        if dish is None:
+                            continue
+                        meals[meal_type].append(dish)
+                        selections[meal_type].append(item.get('weeklySelections', 0))
+                    else:
+                        meals[meal_type].append(interner.legacy_item(item))
+                        selections[meal_type].append(
+                            item.get('weeklySelections') if isinstance(item, dict) else None
+                        )
+
+            days = []
+            for day in day_rows.get(hall.id, []):
+                day_meal_lists, day_counts = day_meals.get(day.id, ({}, {}))
+                days.append(carryover.day(
+                    hall.id,
+                    day.date.strftime('%Y-%m-%d'),
+                    day.dateDisplay,
+                    day.dayOfWeek,
+                    day.isWeekend,
+                    day_meal_lists,
+                    day_counts,
+                ))
+
+            halls.append(carryover.hall(
+                hall.id,
+                hall.hallName,
+                hall.hours,
+                hall.mealHours,
+                meals,
+                selections,
+                days,
+            ))
+
+        schedule = carryover.schedule(halls)
+        carryover.flush()
+        return cls(halls, dishes, schedule=schedule)
+
+    def get_menus_by_date(self, date_str=None):
+        """
+        Per-date menus in the menuByDate shape used by templates.
+
+        Args:
+            date_str: Optional 'YYYY-MM-DD'; when given only that day is returned
+
+        Returns:
+            {hallName: [DayMenu, ...]} for halls that have dated menus
+        """
+        menus_by_date = {}
+        for hall in self.halls:
+            if date_str is None:
+                days = list(hall.days)
+            else:
+                day = hall.get_day(date_str)
+                days = [day] if day is not None else []
+            if days:
+                menus_by_date[hall.hallName] = days
+        return menus_by_date
+
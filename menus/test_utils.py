@@ -1,13 +1,35 @@
 """
 Test cases for utility functions and helpers in menus app.
 """
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.contrib.auth.models import User
+from django.core.management import call_command
+from io import StringIO
+from unittest import skipUnless
 from unittest.mock import patch, MagicMock
-from datetime import datetime
+from datetime import datetime, date
 import json
+import os
+import tempfile
 
-from .models import DiningHall, UserProfile
+from .models import (
+    DiningHall, UserProfile, MenuDay, MenuOffering, MenuItem, PrecomputedRecommendation, MealHistory, Review,
+    get_allergen_mask, get_diet_mask
+)
+from .precompute import (
+    profile_key, observed_profiles, menu_dates, precompute_recommendations, StoredSummaries
+)
+from .artifacts import artifact_counters
+from .snapshot import Dish, MealIndex
+from .planner import meal_options, combine_meals, pick_plan, MAX_DISHES_PER_MEAL
+from .lexical import BM25Index, CandidateIndex, expand_query
+from .similarity import dish_tokens, minhash_signature, unpack_signature, estimate_similarity, LSHIndex
+from .schedule import parse_window, HallSchedule, ScheduleIndex
+from . import cache as menu_cache
+from . import scoring
+from . import collab
+from .scoring import ScoringEngine, ProfileBatch
+from .cache import get_menu_snapshot, get_menu_version, invalidate_menu_cache, LRUCache
 from .views import (
     get_menu_data_from_db,
     is_hall_open,
@@ -17,7 +39,12 @@ from .views import (
     calculate_hall_score,
     calculate_meal_specific_score,
     filter_meals_by_preferences,
-    get_dining_halls_data
+    score_and_filter_meals,
+    get_dining_halls_data,
+    get_hall_quality_for_recommendation,
+    get_filtered_hall_menus,
+    filtered_menu_cache,
+    meal_artifact_cache
 )
 
 
@@ -63,6 +90,487 @@ class MenuDataUtilsTest(TestCase):
         self.assertIn('dietCategories', data)
 
 
+class MenuSnapshotTest(TestCase):
+    """Test cases for the shared in-memory menu snapshot."""
+    
+    def setUp(self):
+        """Set up one hall whose menus reference the same dish twice."""
+        invalidate_menu_cache()
+        self.dish = MenuItem.objects.create(
+            name='Tofu Bowl', calories=400, allergens=['soy'], dietTags=['vegetarian']
+        )
+        self.hall = DiningHall.objects.create(
+            hallName='Berkshire',
+            hours='07:00-20:00',
+            meals={
+                'lunch': [{'dishId': self.dish.id, 'weeklySelections': 12}],
+                'dinner': [{'dishId': self.dish.id, 'weeklySelections': 3}, 'Plain Rice'],
+            }
+        )
+        day = MenuDay.objects.create(diningHall=self.hall, date=date(2025, 12, 8))
+        MenuOffering.objects.create(day=day, mealType='lunch', dish=self.dish, weeklySelections=20)
+    
+    def test_dish_record_behaves_like_mapping(self):
+        """Test that Dish records support dict-style access but not new attributes."""
+        dish = get_menu_snapshot().dishes[self.dish.id]
+        
+        self.assertIsInstance(dish, Dish)
+        self.assertEqual(dish['name'], 'Tofu Bowl')
+        self.assertEqual(dish.get('allergens'), ('soy',))
+        self.assertIsNone(dish.get('weeklySelections'))
+        self.assertFalse(hasattr(dish, '__dict__'))
+        with self.assertRaises(AttributeError):
+            dish.extra = 1
+    
+    def test_dishes_shared_across_menus(self):
+        """Test that every menu references the same Dish object."""
+        snapshot = get_menu_snapshot()
+        hall = snapshot.hallsById[self.hall.id]
+        day = hall.get_day('2025-12-08')
+        
+        self.assertIs(hall.meals['lunch'][0], hall.meals['dinner'][0])
+        self.assertIs(hall.meals['lunch'][0], day.meals['lunch'][0])
+        self.assertEqual(hall.selections['dinner'], (3, None))
+        self.assertEqual(day.selections['lunch'], (20,))
+        self.assertEqual(hall.meals['dinner'][1], 'Plain Rice')
+    
+    def test_snapshot_is_immutable(self):
+        """Test that meals cannot be modified in place."""
+        hall = get_menu_snapshot().halls[0]
+        
+        with self.assertRaises(TypeError):
+            hall.meals['lunch'] = []
+        with self.assertRaises(AttributeError):
+            hall.meals['lunch'].append('Soup')
+    
+    def test_snapshot_reused_until_data_changes(self):
+        """Test that saving menu data invalidates the snapshot."""
+        snapshot = get_menu_snapshot()
+        self.assertIs(get_menu_snapshot(), snapshot)
+        
+        self.dish.name = 'Tofu Rice Bowl'
+        self.dish.save()
+        
+        rebuilt = get_menu_snapshot()
+        self.assertIsNot(rebuilt, snapshot)
+        self.assertEqual(rebuilt.dishes[self.dish.id].name, 'Tofu Rice Bowl')
+    
+    def test_snapshot_menus_by_date(self):
+        """Test per-date lookup from the snapshot."""
+        snapshot = get_menu_snapshot()
+        
+        self.assertEqual(list(snapshot.get_menus_by_date('2025-12-08')), ['Berkshire'])
+        self.assertEqual(snapshot.get_menus_by_date('2025-12-09'), {})
+        self.assertEqual([d.date for d in snapshot.get_menus_by_date()['Berkshire']], ['2025-12-08'])
+    
+    def test_rebuild_reuses_unchanged_menus(self):
+        """Test that editing one day's meal only rebuilds that meal's index and cached results."""
+        second_day = MenuDay.objects.create(diningHall=self.hall, date=date(2025, 12, 9))
+        MenuOffering.objects.create(day=second_day, mealType='dinner', dish=self.dish)
+        before = get_menu_snapshot()
+        for date_str in ('2025-12-08', '2025-12-09'):
+            get_filtered_hall_menus(before, date_str, 'lunch', ['eggs'], [])
+        artifact_counters.clear()
+        
+        MenuOffering.objects.create(day=second_day, mealType='lunch', dish=self.dish)
+        after = get_menu_snapshot()
+        old_hall, new_hall = before.hallsById[self.hall.id], after.hallsById[self.hall.id]
+        
+        self.assertIsNot(after, before)
+        self.assertIs(after.dishes[self.dish.id], before.dishes[self.dish.id])
+        self.assertIs(after.schedule, before.schedule)
+        self.assertIs(new_hall.get_day('2025-12-08'), old_hall.get_day('2025-12-08'))
+        self.assertIs(new_hall.indexes['lunch'], old_hall.indexes['lunch'])
+        old_day, new_day = old_hall.get_day('2025-12-09'), new_hall.get_day('2025-12-09')
+        self.assertIs(new_day.indexes['dinner'], old_day.indexes['dinner'])
+        self.assertIsNot(new_day.indexes['lunch'], old_day.indexes['lunch'])
+        
+        for date_str in ('2025-12-08', '2025-12-09'):
+            get_filtered_hall_menus(after, date_str, 'lunch', ['eggs'], [])
+        counts = artifact_counters.info()
+        self.assertEqual(counts['menus'], {'rebuilt': 2, 'reused': 1})
+        self.assertEqual(counts['mealIndexes'], {'rebuilt': 1, 'reused': 8})
+        self.assertEqual(counts['mealSummaries'], {'rebuilt': 1, 'reused': 5})
+        self.assertEqual(counts['schedule'], {'rebuilt': 0, 'reused': 1})
+    
+    def test_meal_index_bitsets(self):
+        """Test that each meal's inverted index maps tags to item positions."""
+        hall = get_menu_snapshot().hallsById[self.hall.id]
+        index = hall.indexes['dinner']
+        
+        self.assertEqual(index.dishes, 0b01)
+        self.assertEqual(index.strings, 0b10)
+        self.assertEqual(index.safe_dishes(get_allergen_mask(['soy'])), 0)
+        self.assertEqual(index.safe_dishes(get_allergen_mask(['eggs'])), 0b01)
+        self.assertEqual(index.matching(0b01, get_diet_mask(['vegetarian'])), 0b01)
+        self.assertEqual(index.matching(0b01, get_diet_mask(['halal'])), 0)
+        self.assertEqual(index.items_at(0b11), [hall.meals['dinner'][0], 'Plain Rice'])
+        self.assertEqual(hall.get_day('2025-12-08').indexes['lunch'].dishes, 0b1)
+        self.assertEqual(hall.indexes['breakfast'].items, ())
+    
+    def test_meal_index_unknown_allergens_and_diet_counts(self):
+        """Test that unknown allergens share one set and diet matches are counted per tag."""
+        index = MealIndex([
+            {'name': 'Mystery Stew', 'allergens': ['mystery'], 'dietCategories': ['vegetarian', 'halal']},
+            {'name': 'Salad', 'allergens': [], 'dietCategories': ['vegetarian']},
+        ])
+        
+        self.assertEqual(index.safe_dishes(get_allergen_mask(['other unknown'])), 0b10)
+        self.assertEqual(index.diet_match_total(0b11, get_diet_mask(['vegetarian', 'halal'])), 3)
+
+
+class MenuCacheTest(TestCase):
+    """Test cases for the versioned menu cache."""
+    
+    def setUp(self):
+        """Set up a hall and start from a fresh menu version."""
+        invalidate_menu_cache()
+        self.hall = DiningHall.objects.create(
+            hallName='Berkshire',
+            hours='07:00-20:00',
+            meals={'lunch': [{'name': 'Soup', 'calories': 120, 'allergens': ['dairy']}]}
+        )
+    
+    def test_hall_save_bumps_version(self):
+        """Test that saving or deleting a hall moves the cache to a new version."""
+        version = get_menu_version()
+        
+        self.hall.hours = '08:00-20:00'
+        self.hall.save()
+        self.assertGreater(get_menu_version(), version)
+        self.assertEqual(get_menu_snapshot().halls[0].hours, '08:00-20:00')
+        
+        self.hall.delete()
+        self.assertEqual(get_menu_snapshot().halls, ())
+    
+    def test_snapshot_rebuilt_without_process_copy(self):
+        """Test that a process without its own copy builds one for the shared version."""
+        snapshot = get_menu_snapshot()
+        menu_cache._local = None  # simulate a different worker process
+        
+        restored = get_menu_snapshot()
+        self.assertIsNot(restored, snapshot)
+        self.assertEqual(restored.version, snapshot.version)
+        self.assertEqual(restored.halls[0].meals['lunch'][0]['name'], 'Soup')
+        self.assertEqual(restored.halls[0].meals['lunch'][0].allergens, ('dairy',))
+    
+    def test_version_cache_failure_falls_back_to_database(self):
+        """Test that menus are still served when the version cache can't be read."""
+        with patch.object(menu_cache, 'get_version_cache', side_effect=RuntimeError('no such table')):
+            with patch('builtins.print'):
+                snapshot = get_menu_snapshot()
+                invalidate_menu_cache()
+        
+        self.assertIsNone(snapshot.version)
+        self.assertEqual(snapshot.halls[0].hallName, 'Berkshire')
+    
+    def test_process_copy_reused_for_same_version(self):
+        """Test that repeated lookups reuse the process-local snapshot."""
+        snapshot = get_menu_snapshot()
+        
+        with self.assertNumQueries(1):
+            self.assertIs(get_menu_snapshot(), snapshot)
+    
+    def test_version_bump_from_another_process(self):
+        """Test that a bump written to the shared cache (e.g. by import_menus) is seen at once."""
+        snapshot = get_menu_snapshot()
+        
+        # Another process only shares the version cache, not this process's memory
+        version_cache = menu_cache.get_version_cache()
+        version_cache.set(menu_cache.MENU_VERSION_KEY, get_menu_version() + 1, timeout=None)
+        
+        self.assertIsNot(get_menu_snapshot(), snapshot)
+    
+    def test_bulk_change_queues_one_commit_bump(self):
+        """Test that many menu rows changed in one transaction queue a single commit-time bump."""
+        from django.db import connection
+        for hour in range(3):
+            self.hall.hours = f'0{hour}:00-20:00'
+            self.hall.save()
+        
+        queued = [entry for entry in connection.run_on_commit if entry[1] is invalidate_menu_cache]
+        self.assertEqual(len(queued), 1)
+    
+    def test_paused_signals_skip_per_row_invalidation(self):
+        """Test that menu_signals_paused leaves cache invalidation to the caller."""
+        from .signals import menu_signals_paused
+        day = MenuDay.objects.create(diningHall=self.hall, date=date(2025, 12, 6))
+        dish = MenuItem.objects.create(name='Soup')
+        MenuOffering.objects.create(day=day, mealType='lunch', position=0, dish=dish)
+        
+        with patch('menus.signals.invalidate_menu_cache') as invalidate:
+            with menu_signals_paused():
+                # One DELETE per table, the offerings are no longer fetched row by row
+                with self.assertNumQueries(2):
+                    day.delete()
+        
+        invalidate.assert_not_called()
+        self.assertEqual(MenuOffering.objects.count(), 0)
+    
+    @override_settings(MENU_CACHE_TIMEOUT=0)
+    def test_snapshot_expires_after_timeout(self):
+        """Test that an expired snapshot is rebuilt from the database."""
+        snapshot = get_menu_snapshot()
+        
+        self.assertIsNot(get_menu_snapshot(), snapshot)
+
+
+class LRUCacheTest(TestCase):
+    """Test cases for the in-process LRU cache."""
+    
+    def test_hits_and_misses_counted(self):
+        """Test that repeated keys are served from the cache."""
+        lru = LRUCache(maxsize=4)
+        calls = []
+        
+        for _ in range(3):
+            value = lru.get_or_set('a', lambda: calls.append(1) or 'value')
+        
+        self.assertEqual(value, 'value')
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(lru.info(), {'hits': 2, 'misses': 1, 'size': 1, 'maxsize': 4})
+    
+    def test_least_recently_used_evicted(self):
+        """Test that the oldest unused key is evicted first."""
+        lru = LRUCache(maxsize=2)
+        lru.get_or_set('a', lambda: 1)
+        lru.get_or_set('b', lambda: 2)
+        lru.get_or_set('a', lambda: 1)  # 'a' is now most recent
+        lru.get_or_set('c', lambda: 3)
+        
+        self.assertEqual(lru.get_or_set('a', lambda: 'rebuilt'), 1)
+        self.assertEqual(lru.get_or_set('b', lambda: 'rebuilt'), 'rebuilt')
+
+
+class FilteredHallMenusTest(TestCase):
+    """Test cases for the shared filtered-menu cache."""
+    
+    def setUp(self):
+        """Set up a hall with one safe and one egg dish for lunch."""
+        invalidate_menu_cache()
+        filtered_menu_cache.clear()
+        self.hall = DiningHall.objects.create(
+            hallName='Berkshire',
+            hours='07:00-20:00',
+            meals={
+                'lunch': [
+                    {'name': 'Salad', 'calories': 100, 'allergens': [], 'dietCategories': ['vegetarian']},
+                    {'name': 'Omelette', 'calories': 300, 'allergens': ['eggs'], 'dietCategories': ['vegetarian']},
+                ]
+            }
+        )
+    
+    def test_same_profile_shares_entry(self):
+        """Test that preference order and duplicates don't split the cache."""
+        snapshot = get_menu_snapshot()
+        first = get_filtered_hall_menus(snapshot, '2025-12-08', 'lunch', ['eggs', 'soy'], ['vegetarian'])
+        second = get_filtered_hall_menus(snapshot, '2025-12-08', 'lunch', ['soy', 'eggs', 'eggs'], ['vegetarian'])
+        
+        self.assertIs(first, second)
+        self.assertEqual(filtered_menu_cache.info()['hits'], 1)
+        self.assertEqual([item['name'] for item in first[self.hall.id]['filteredMeals']['lunch']], ['Salad'])
+        self.assertEqual(first[self.hall.id]['matchingItems'], 1)
+    
+    def test_menu_change_misses(self):
+        """Test that a new menu version is not served stale results."""
+        get_filtered_hall_menus(get_menu_snapshot(), '2025-12-08', 'lunch', [], [])
+        
+        self.hall.meals = {'lunch': ['Plain Rice']}
+        self.hall.save()
+        result = get_filtered_hall_menus(get_menu_snapshot(), '2025-12-08', 'lunch', [], [])
+        
+        self.assertEqual(filtered_menu_cache.info()['misses'], 2)
+        self.assertEqual(result[self.hall.id]['filteredMeals']['lunch'], ('Plain Rice',))
+    
+    def test_score_excludes_open_bonus(self):
+        """Test that cached scores don't depend on the time of the request."""
+        result = get_filtered_hall_menus(get_menu_snapshot(), '2025-12-08', 'lunch', [], [])
+        expected, _, _ = calculate_meal_specific_score(
+            {'meals': self.hall.meals, 'isOpen': False}, 'lunch'
+        )
+        
+        self.assertEqual(result[self.hall.id]['mealScore'], expected)
+
+    
+    def test_filters_and_scores_in_one_pass(self):
+        """Test that the index-based pass gives the same results as the helpers."""
+        with patch('menus.views.calculate_meal_specific_score') as meal_score, \
+                patch('menus.views.filter_meals_by_preferences') as filter_meals:
+            result = get_filtered_hall_menus(get_menu_snapshot(), '2025-12-08', 'lunch', ['eggs'], [])
+        
+        meal_score.assert_not_called()
+        filter_meals.assert_not_called()
+        hall_menu = result[self.hall.id]
+        self.assertEqual([item['name'] for item in hall_menu['filteredMeals']['lunch']], ['Salad'])
+        self.assertEqual(hall_menu['filteredCount'], {'breakfast': 0, 'lunch': 1, 'dinner': 0})
+        self.assertEqual(
+            (hall_menu['mealScore'], hall_menu['matchingItems'], hall_menu['matchRate']),
+            calculate_meal_specific_score({'meals': self.hall.meals, 'isOpen': False}, 'lunch', ['eggs'])
+        )
+
+
+class PrecomputedRecommendationsTest(TestCase):
+    """Test cases for offline precomputed recommendations."""
+    
+    def setUp(self):
+        """Set up a hall with a dated menu and a user avoiding eggs."""
+        invalidate_menu_cache()
+        filtered_menu_cache.clear()
+        meal_artifact_cache.clear()
+        self.hall = DiningHall.objects.create(
+            hallName='Berkshire',
+            hours='07:00-20:00',
+            meals={'lunch': [
+                {'name': 'Salad', 'calories': 100, 'allergens': [], 'dietCategories': ['vegetarian']},
+                {'name': 'Omelette', 'calories': 300, 'allergens': ['eggs'], 'dietCategories': ['vegetarian']},
+                'Plain Rice',
+            ]}
+        )
+        day = MenuDay.objects.create(diningHall=self.hall, date=date(2025, 12, 8))
+        dish = MenuItem.objects.create(name='Tofu Bowl', calories=400, allergens=['soy'], dietTags=['vegetarian'])
+        MenuOffering.objects.create(day=day, mealType='dinner', dish=dish)
+        user = User.objects.create(username='eggless')
+        user.profile.allergens = ['eggs']
+        user.profile.save()
+    
+    def test_profile_key_is_canonical(self):
+        """Test that order and aliases don't create new profiles."""
+        self.assertEqual(profile_key(['milk', 'eggs'], ['vegan']), profile_key(['eggs', 'dairy'], ['plant_based']))
+        self.assertNotEqual(profile_key([], []), profile_key([], ['none']))
+        self.assertEqual(len(observed_profiles()), 2)
+    
+    def test_stored_results_match_live(self):
+        """Test that a stored row gives the same result without computing live."""
+        snapshot = get_menu_snapshot()
+        live = {
+            (date_str, meal_type): get_filtered_hall_menus(snapshot, date_str, meal_type, ['eggs'], [])
+            for date_str in ('2025-12-08', datetime.now().strftime('%Y-%m-%d')) for meal_type in ('lunch', 'dinner')
+        }
+        filtered_menu_cache.clear()
+        meal_artifact_cache.clear()
+        
+        call_command('precompute_recommendations', stdout=StringIO())
+        self.assertEqual(PrecomputedRecommendation.objects.count(), 2 * len(menu_dates(snapshot)))
+        
+        with patch('menus.views.summarize_meal') as summarize:
+            for (date_str, meal_type), expected in live.items():
+                filtered_menu_cache.clear()
+                meal_artifact_cache.clear()
+                stored = get_filtered_hall_menus(snapshot, date_str, meal_type, ['eggs'], [])
+                self.assertEqual(stored, expected)
+        summarize.assert_not_called()
+    
+    def test_menu_change_ignores_stale_meals(self):
+        """Test that stored meals computed from older items are not used, and other meals still are."""
+        precompute_recommendations(get_menu_snapshot(), dates=['2025-12-08'])
+        
+        offering = MenuOffering.objects.get()
+        MenuOffering.objects.create(day=offering.day, mealType='lunch', dish=offering.dish)
+        snapshot = get_menu_snapshot()
+        result = get_filtered_hall_menus(snapshot, '2025-12-08', 'lunch', ['eggs'], [])
+        
+        self.assertEqual([dish['name'] for dish in result[self.hall.id]['filteredMeals']['lunch']], ['Tofu Bowl'])
+        stored = StoredSummaries('2025-12-08', ['eggs'], [])
+        indexes = snapshot.hallsById[self.hall.id].get_day('2025-12-08').indexes
+        self.assertIsNone(stored.get(self.hall.id, 'lunch', indexes['lunch']))
+        self.assertEqual(stored.get(self.hall.id, 'dinner', indexes['dinner'])['mealScore'], 12)
+    
+    def test_calorie_change_ignores_stale_meals(self):
+        """Test that editing a dish's calories invalidates the stored meals that serve it."""
+        precompute_recommendations(get_menu_snapshot(), dates=['2025-12-08'])
+        
+        dish = MenuItem.objects.get(name='Tofu Bowl')
+        dish.calories = 550
+        dish.save()
+        snapshot = get_menu_snapshot()
+        
+        indexes = snapshot.hallsById[self.hall.id].get_day('2025-12-08').indexes
+        self.assertIsNone(StoredSummaries('2025-12-08', ['eggs'], []).get(self.hall.id, 'dinner', indexes['dinner']))
+        
+        # The rerun recomputes that dinner for both profiles
+        second = precompute_recommendations(snapshot, dates=['2025-12-08'])
+        self.assertEqual((second['rebuilt'], second['reused']), (2, 4))
+        stored = StoredSummaries('2025-12-08', ['eggs'], []).get(self.hall.id, 'dinner', indexes['dinner'])
+        self.assertEqual(stored['calories'], 550)
+    
+    def test_rerun_rebuilds_only_changed_meals(self):
+        """Test that a second run only recomputes meals whose items changed."""
+        first = precompute_recommendations(get_menu_snapshot(), dates=['2025-12-08'])
+        self.assertEqual((first['rebuilt'], first['reused'], first['written']), (6, 0, 2))
+        
+        offering = MenuOffering.objects.get()
+        MenuOffering.objects.create(day=offering.day, mealType='dinner', dish=offering.dish, position=1)
+        second = precompute_recommendations(get_menu_snapshot(), dates=['2025-12-08'])
+        
+        # Only the dinner of the one dated menu changed, for each of the two profiles
+        self.assertEqual((second['rebuilt'], second['reused'], second['written'], second['rows']), (2, 4, 2, 2))
+
+
+class MealPlannerTest(TestCase):
+    """Test cases for the calorie-bucket meal planner."""
+    
+    def test_meal_options_use_each_dish_once(self):
+        """Test that combinations are bounded in size and never repeat a dish."""
+        dishes = [{'name': f'Dish {i}', 'calories': 100} for i in range(5)] + ['Plain Rice']
+        options = meal_options(dishes + [{'name': 'Dish 0', 'calories': 100}])
+        
+        self.assertEqual(sorted(entry[1] for entry in options.values()), [100, 200, 300])
+        for score, calories, picked in options.values():
+            self.assertLessEqual(len(picked), MAX_DISHES_PER_MEAL)
+            self.assertEqual(len({dish['name'] for dish in picked}), len(picked))
+    
+    def test_pick_plan_prefers_closest_then_diet_matches(self):
+        """Test that the closest total wins and diet matches break ties."""
+        breakfast = meal_options([
+            {'name': 'Toast', 'calories': 400, 'dietCategories': []},
+            {'name': 'Tofu Scramble', 'calories': 400, 'dietCategories': ['vegan']},
+            {'name': 'Pancakes', 'calories': 900},
+        ], ['vegan'])
+        day = combine_meals([('breakfast', [('hall', breakfast)])])
+        
+        score, calories, picks = pick_plan(day, 450)
+        self.assertEqual(calories, 400)
+        self.assertEqual([dish['name'] for dish in picks[0][2]], ['Tofu Scramble'])
+        self.assertEqual(pick_plan(day, 1300)[1], 1300)
+        self.assertIsNone(pick_plan(combine_meals([]), 2000))
+
+
+class DishSimilarityTest(TestCase):
+    """Test cases for ingredient MinHash signatures and the LSH index."""
+    
+    def signature(self, words):
+        return unpack_signature(minhash_signature(set(words)))
+    
+    def test_minhash_estimates_jaccard(self):
+        """Test that signature agreement tracks the Jaccard similarity of the word sets."""
+        base = [f'word{i}' for i in range(40)]
+        half = base[:20] + [f'other{i}' for i in range(20)]  # Jaccard 20/60
+        
+        self.assertEqual(estimate_similarity(self.signature(base), self.signature(base)), 1.0)
+        self.assertAlmostEqual(estimate_similarity(self.signature(base), self.signature(half)), 1 / 3, delta=0.15)
+        self.assertEqual(minhash_signature(set()), b'')
+        self.assertIsNone(unpack_signature(b''))
+    
+    def test_lsh_returns_similar_keys_only(self):
+        """Test that near duplicates are candidates and unrelated sets are not."""
+        soup = dish_tokens('Chicken Noodle Soup', 'Chicken Stock, Carrots, Celery, Onions, Thyme, Parsley, Pepper')
+        self.assertNotIn('and', dish_tokens('Rice and Beans'))
+        index = LSHIndex({
+            'rice soup': self.signature(soup - {'noodle'} | {'rice'}),
+            'cake': self.signature(dish_tokens('Chocolate Cake', 'Cocoa, Flour, Butter, Eggs, Vanilla')),
+        })
+        
+        self.assertEqual(set(index.query(self.signature(soup), threshold=0.25)), {'rice soup'})
+    
+    def test_dishes_signed_when_saved(self):
+        """Test that MenuItem stores a signature of its name and ingredients."""
+        dish = MenuItem.objects.create(name='Tofu Bowl', ingredients='Tofu, Rice, Scallions')
+        scraped = MenuItem.from_scraped({'name': 'Tofu Bowl', 'ingredients': 'Tofu, Rice, Scallions'})
+        
+        self.assertEqual(bytes(MenuItem.objects.get(pk=dish.pk).minhash), scraped.minhash)
+        self.assertEqual(scraped.minhash, minhash_signature(dish_tokens('Tofu Bowl', 'Tofu, Rice, Scallions')))
+
+
 class HallStatusUtilsTest(TestCase):
     """Test cases for hall status utility functions."""
     
@@ -171,6 +679,61 @@ class HallStatusUtilsTest(TestCase):
         self.assertEqual(get_current_meal_type(), 'dinner')
 
 
+class HallScheduleTest(TestCase):
+    """Test cases for precompiled hall schedules."""
+    
+    def setUp(self):
+        """Set up a schedule with a gap between lunch and dinner."""
+        self.schedule = HallSchedule('07:00-21:00', {
+            'breakfast': '07:00-10:30',
+            'lunch': '11:00-14:30',
+            'dinner': '17:00-21:00',
+        })
+    
+    def test_parse_window(self):
+        """Test parsing hours strings into minute-of-day windows."""
+        self.assertEqual(parse_window('07:00-21:00'), (420, 1260))
+        self.assertIsNone(parse_window('invalid'))
+        self.assertIsNone(parse_window('25:00-26:00'))
+        self.assertIsNone(parse_window(None))
+    
+    def test_open_and_current_meal(self):
+        """Test open status and meal lookups by minute."""
+        self.assertFalse(self.schedule.is_open(6 * 60 + 59))
+        self.assertTrue(self.schedule.is_open(21 * 60))
+        self.assertFalse(self.schedule.is_open(21 * 60 + 1))
+        self.assertEqual(self.schedule.current_meal(8 * 60), 'breakfast')
+        self.assertIsNone(self.schedule.current_meal(15 * 60))
+        self.assertEqual(self.schedule.current_meal(18 * 60), 'dinner')
+    
+    def test_next_transition(self):
+        """Test that the next transition is the next open/close or meal change."""
+        self.assertEqual(self.schedule.next_transition(datetime(2025, 12, 8, 12, 15, 40)),
+                         datetime(2025, 12, 8, 14, 31))
+        self.assertEqual(self.schedule.next_transition(datetime(2025, 12, 8, 22, 0)),
+                         datetime(2025, 12, 9, 0, 0))
+    
+    def test_overnight_window(self):
+        """Test hours that wrap past midnight."""
+        schedule = HallSchedule('21:00-02:00')
+        
+        self.assertTrue(schedule.is_open(23 * 60))
+        self.assertTrue(schedule.is_open(60))
+        self.assertFalse(schedule.is_open(12 * 60))
+    
+    def test_index_status_reused_until_transition(self):
+        """Test that open-hall status is cached until the next transition."""
+        hall = DiningHall(id=1, hallName='Berkshire', hours='07:00-21:00', mealHours={})
+        index = ScheduleIndex([hall])
+        
+        status = index.status(datetime(2025, 12, 8, 9, 0))
+        self.assertEqual(status.openHalls, frozenset({1}))
+        self.assertEqual(status.expiresAt, datetime(2025, 12, 8, 10, 30))
+        self.assertIs(index.status(datetime(2025, 12, 8, 10, 29)), status)
+        self.assertIsNot(index.status(datetime(2025, 12, 8, 10, 30)), status)
+        self.assertEqual(index.status(datetime(2025, 12, 8, 22, 0)).openHalls, frozenset())
+
+
 class MealFilteringUtilsTest(TestCase):
     """Test cases for meal filtering utility functions."""
     
@@ -371,6 +934,188 @@ class ScoringUtilsTest(TestCase):
         self.assertEqual(match_rate, 0)
 
 
+@skipUnless(collab.np is not None, "NumPy is not installed")
+class CollaborativeFilteringTest(TestCase):
+    """Test cases for the offline collaborative-filtering model."""
+    
+    def setUp(self):
+        """Use a temporary directory for factor files."""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'factors.npz')
+    
+    def tearDown(self):
+        self.tmpdir.cleanup()
+    
+    def test_als_learns_taste_groups(self):
+        """Test that a user scores dishes of their group above the other group's."""
+        # Users 0-2 eat dishes 0-1, users 3-5 eat dishes 2-3; user 0 has only tried dish 0
+        pairs = [(0, 0)] + [(u, d) for u in (1, 2) for d in (0, 1)] + [(u, d) for u in (3, 4, 5) for d in (2, 3)]
+        rows, cols = zip(*pairs)
+        users, dishes = collab.train_als(rows, cols, [1.0] * len(pairs), 6, 4, factors=4, iterations=15)
+        
+        scores = dishes @ users[0]
+        self.assertGreater(scores[1], scores[2])
+        self.assertGreater(scores[1], scores[3])
+    
+    def test_factors_are_memory_mapped(self):
+        """Test that saved factors load as memory maps and score with dot products."""
+        users = collab.np.arange(6, dtype=collab.np.float32).reshape(2, 3)
+        dishes = collab.np.ones((2, 3), dtype=collab.np.float32)
+        collab.save_factors(self.path, [7, 9], ['Salad', 'Soup'], users, dishes)
+        
+        arrays = collab.load_npz_mmap(self.path)
+        self.assertIsInstance(arrays['user_factors'], collab.np.memmap)
+        self.assertEqual(list(arrays['dish_names']), ['Salad', 'Soup'])
+        factors = collab.DishFactors(arrays)
+        self.assertEqual(factors.score(9, ['Soup', 'Pizza']), {'Soup': 12.0})
+        self.assertEqual(factors.score(8, ['Soup']), {})
+        
+        collab.np.savez_compressed(self.path, user_factors=users)
+        with self.assertRaises(ValueError):
+            collab.load_npz_mmap(self.path)
+    
+    def test_train_command_uses_history_and_reviews(self):
+        """Test interaction weights from ratings and food preferences, and the trained file."""
+        hall = DiningHall.objects.create(hallName='Worcester', hours='07:00-20:00')
+        MenuItem.objects.create(name='Salad', dietTags=['vegetarian'])
+        user = User.objects.create(username='eater')
+        Review.objects.create(user=user, diningHall=hall, reviewText='Great', rating=5, foodPreferences=['vegetarian'])
+        MealHistory.objects.create(user=user, date=date(2025, 12, 8), meals=[
+            {'name': 'Salad', 'diningHall': 'Worcester'},
+            {'name': 'Burger', 'diningHall': 'Berkshire'},
+        ])
+        
+        user_ids, dish_names, rows, cols, weights = collab.build_interactions()
+        self.assertEqual((user_ids, dish_names), ([user.id], ['Burger', 'Salad']))
+        self.assertEqual(dict(zip((dish_names[c] for c in cols), weights)), {'Salad': 2.5, 'Burger': 1.0})
+        
+        out = StringIO()
+        call_command('train_recommender', output=self.path, factors=2, stdout=out)
+        self.assertIn('1 users x 2 dishes', out.getvalue())
+        with override_settings(DISH_FACTORS_PATH=self.path):
+            self.assertEqual(set(collab.get_dish_factors().score(user.id, ['Salad', 'Burger'])), {'Salad', 'Burger'})
+
+
+@skipUnless(scoring.np is not None, "NumPy is not installed")
+class ScoringEngineTest(TestCase):
+    """Test that the vectorized scoring engine matches the Python scoring helpers."""
+
+    def setUp(self):
+        """Set up menus with tags, plain strings, unknown allergens and empty meals."""
+        self.hall_menus = {
+            1: {
+                'breakfast': [
+                    {'name': 'Oatmeal', 'calories': 150, 'allergens': [], 'dietCategories': ['vegetarian']},
+                    {'name': 'Eggs', 'calories': 200, 'allergens': ['eggs'], 'dietCategories': []},
+                    'Toast',
+                ],
+                'lunch': [
+                    {'name': 'Salad', 'calories': 100, 'allergens': ['sesame', 'mystery'],
+                     'dietTags': ['vegan', 'vegetarian']},
+                    {'name': 'Pizza', 'calories': 300, 'allergens': ['milk', 'gluten'], 'dietCategories': ['halal']},
+                ],
+                'dinner': [],
+            },
+            2: {
+                'breakfast': [],
+                'lunch': ['Soup of the day'],
+                'dinner': [
+                    {'name': 'Tofu', 'calories': 250, 'allergens': ['soy'], 'dietCategories': ['vegan']},
+                    {'name': 'Tofu', 'calories': 250, 'allergens': ['soy'], 'dietCategories': ['vegan']},
+                ],
+            },
+            3: {},
+        }
+        self.profiles = [
+            ([], []),
+            (['eggs'], []),
+            ([], ['vegetarian']),
+            (['soy', 'milk'], ['vegan', 'halal']),
+            (['mystery'], ['kosher']),
+            (['eggs'], []),
+        ]
+        self.engine = ScoringEngine(self.hall_menus)
+        self.batch = ProfileBatch(self.profiles)
+
+    def test_hall_scores_match_python(self):
+        """Test hall scores for every hall and profile, with an open hall."""
+        results = self.engine.hall_scores(self.batch, open_halls={2})
+
+        for hall_index, hall_id in enumerate(self.engine.hallIds):
+            hall_data = {'meals': self.hall_menus[hall_id], 'isOpen': hall_id == 2}
+            for profile_index, (allergens, diets) in enumerate(self.profiles):
+                expected = calculate_hall_score(hall_data, allergens, diets)
+                actual = tuple(int(values[hall_index, profile_index]) for values in results)
+                self.assertEqual(actual, expected, (hall_id, allergens, diets))
+
+    def test_meal_scores_match_python(self):
+        """Test meal scores for every meal type, hall and profile."""
+        _, meal_results = self.engine.score_all(self.batch, open_halls={1})
+
+        for meal_type, results in meal_results.items():
+            for hall_index, hall_id in enumerate(self.engine.hallIds):
+                hall_data = {'meals': self.hall_menus[hall_id], 'isOpen': hall_id == 1}
+                for profile_index, (allergens, diets) in enumerate(self.profiles):
+                    expected = calculate_meal_specific_score(hall_data, meal_type, allergens, diets)
+                    actual = tuple(int(values[hall_index, profile_index]) for values in results)
+                    self.assertEqual(actual, expected, (meal_type, hall_id, allergens, diets))
+
+    def test_filter_meals_match_python(self):
+        """Test per-profile filtering keeps the same items in the same order."""
+        for profile_index, (allergens, diets) in enumerate(self.profiles):
+            filtered = self.engine.filter_meals(self.batch, profile_index)
+            for hall_id, meals in self.hall_menus.items():
+                expected = filter_meals_by_preferences(meals, allergens, diets)
+                for meal_type in ('breakfast', 'lunch', 'dinner'):
+                    self.assertEqual(filtered[hall_id][meal_type], expected.get(meal_type, []))
+
+    def test_chunked_profiles_match(self):
+        """Test that splitting profiles into small chunks gives the same totals."""
+        expected = self.engine.hall_scores(self.batch)
+        with patch.object(scoring, 'PROFILE_CHUNK_ENTRIES', 1):
+            actual = self.engine.hall_scores(self.batch)
+
+        for expected_values, actual_values in zip(expected, actual):
+            self.assertTrue((expected_values == actual_values).all())
+
+
+class ScoreAndFilterMealsTest(TestCase):
+    """Test cases for the single-pass filter-and-score helper."""
+    
+    def setUp(self):
+        """Set up meals with dish dicts, a plain string and an allergen conflict."""
+        self.meals = {
+            'breakfast': [
+                {'name': 'Oatmeal', 'calories': 150, 'allergens': [], 'dietCategories': ['vegetarian']},
+                {'name': 'Eggs', 'calories': 200, 'allergens': ['eggs'], 'dietCategories': []},
+                'Toast',
+            ],
+            'lunch': [
+                {'name': 'Salad', 'calories': 100, 'allergens': ['sesame'], 'dietTags': ['vegan', 'vegetarian']},
+                {'name': 'Pizza', 'calories': 300, 'allergens': ['milk'], 'dietCategories': []},
+            ],
+        }
+    
+    def test_matches_separate_helpers(self):
+        """Test that filtering and scoring agree with the two original helpers."""
+        profiles = [([], []), (['eggs'], []), ([], ['vegetarian']), (['milk'], ['vegan'])]
+        for allergens, diets in profiles:
+            for meal_type in ('breakfast', 'lunch', 'dinner'):
+                summary = score_and_filter_meals(self.meals, meal_type, allergens, diets)
+                self.assertEqual(summary['filteredMeals'], filter_meals_by_preferences(self.meals, allergens, diets))
+                self.assertEqual(
+                    (summary['mealScore'], summary['matchingItems'], summary['matchRate']),
+                    calculate_meal_specific_score({'meals': self.meals, 'isOpen': False}, meal_type, allergens, diets)
+                )
+    
+    def test_calories_of_safe_dishes(self):
+        """Test that calories only count safe dishes of the scored meal."""
+        summary = score_and_filter_meals(self.meals, 'breakfast', ['eggs'], [])
+        
+        self.assertEqual(summary['calories'], 150)
+        self.assertEqual(summary['filteredMeals']['breakfast'], [self.meals['breakfast'][0]])
+
+
 class GetDiningHallsDataTest(TestCase):
     """Test cases for get_dining_halls_data function."""
     
@@ -477,3 +1222,218 @@ class GetDiningHallsDataTest(TestCase):
         self.assertEqual(halls_data[0]['avgRating'], 4.5)  # (5+4)/2
         self.assertIsNotNone(halls_data[0]['userReview'])
 
+
+class RankCacheTest(TestCase):
+    """Test cases for the LLM ranking cache in recommendation.py."""
+
+    def setUp(self):
+        import recommendation
+        self.recommendation = recommendation
+        recommendation.rank_cache.clear()
+        self.addCleanup(recommendation.rank_cache.clear)
+        self.candidates = {'worcester': [{'name': 'Pad Thai', 'calories': 500}], 'franklin': []}
+
+    def test_repeated_request_uses_cache(self):
+        """Test that equivalent mood text and preferences reuse one LLM ranking."""
+        ranked = {'worcester': [{'name': 'Pad Thai', 'calories': 500}], 'franklin': []}
+        with patch.object(self.recommendation, '_rank_with_llm', return_value=ranked) as llm:
+            first = self.recommendation._rank_with_cache(
+                'Something SPICY!', {'diet': ['vegan', 'halal']}, self.candidates
+            )
+            first['worcester'].clear()
+            second = self.recommendation._rank_with_cache(
+                '  something   spicy ', {'diet': ['Halal', 'vegan']}, self.candidates
+            )
+        self.assertEqual(llm.call_count, 1)
+        self.assertEqual(second, ranked)
+        info = self.recommendation.rank_cache.info()
+        self.assertEqual((info['hits'], info['misses']), (1, 1))
+
+    def test_different_candidates_miss(self):
+        """Test that a changed candidate set is ranked again."""
+        with patch.object(self.recommendation, '_rank_with_llm', return_value={}) as llm:
+            self.recommendation._rank_with_cache('spicy', {}, self.candidates)
+            self.recommendation._rank_with_cache('spicy', {}, {'worcester': [{'name': 'Ramen', 'calories': 450}]})
+        self.assertEqual(llm.call_count, 2)
+        self.assertEqual(self.recommendation.rank_cache.info()['misses'], 2)
+
+    def test_expiry_and_eviction(self):
+        """Test that entries expire at the end of the meal window and the least recently used is evicted."""
+        from recommendation import RankCache, _meal_window_end
+
+        lunch = datetime(2025, 12, 8, 12, 30)
+        self.assertEqual(_meal_window_end(lunch), datetime(2025, 12, 8, 16, 0))
+        self.assertEqual(_meal_window_end(datetime(2025, 12, 8, 22, 0)), datetime(2025, 12, 9, 0, 0))
+        self.assertEqual(_meal_window_end(datetime(2025, 12, 8, 3, 0)), datetime(2025, 12, 8, 7, 0))
+
+        cache = RankCache(maxsize=2)
+        cache.set('a', {'a': []}, _meal_window_end(lunch))
+        self.assertEqual(cache.get('a', datetime(2025, 12, 8, 15, 59)), {'a': []})
+        self.assertIsNone(cache.get('a', datetime(2025, 12, 8, 16, 0)))
+
+        cache.set('a', 1, _meal_window_end(lunch))
+        cache.set('b', 2, _meal_window_end(lunch))
+        cache.get('a', lunch)
+        cache.set('c', 3, _meal_window_end(lunch))
+        self.assertIsNone(cache.get('b', lunch))
+        self.assertEqual(cache.get('a', lunch), 1)
+        info = cache.info()
+        self.assertEqual((info['expired'], info['evictions'], info['size']), (1, 1, 2))
+
+
+class LexicalRankerTest(TestCase):
+    """Test cases for the BM25 dish ranker."""
+
+    def setUp(self):
+        self.candidates = {
+            'worcester': [
+                {'name': 'Buffalo Chicken Wrap', 'category': 'Grill', 'diets': []},
+                {'name': 'Garden Salad', 'category': 'Salad Bar', 'diets': ['Vegan']},
+                {'name': 'Macaroni and Cheese', 'category': 'Entrees', 'diets': ['Vegetarian']},
+            ],
+            'franklin': [
+                {'name': 'Tofu Stir Fry', 'category': 'Wok', 'diets': ['Vegan']},
+                {'name': 'Beef Noodle Soup', 'category': 'Soup', 'diets': []},
+            ],
+        }
+        self.ingredients = {'Tofu Stir Fry': 'tofu, broccoli, sriracha, soy sauce'}
+
+    def test_synonyms_and_ingredients(self):
+        """Test that mood words match dishes through synonyms, including ingredient words."""
+        index = CandidateIndex(self.candidates, self.ingredients)
+
+        self.assertEqual(expand_query('spicy')['buffalo'], 0.5)
+        ranked = index.rank('I want something spicy')
+        self.assertEqual(ranked, {'worcester': ['Buffalo Chicken Wrap'], 'franklin': ['Tofu Stir Fry']})
+        self.assertEqual(index.rank('comfort food')['worcester'], ['Macaroni and Cheese'])
+        self.assertEqual(index.rank('noodles')['franklin'], ['Beef Noodle Soup'])
+
+    def test_diet_bonus_and_no_match(self):
+        """Test that diet matches are picked when the mood matches nothing, and nothing otherwise."""
+        index = CandidateIndex(self.candidates, self.ingredients)
+
+        self.assertEqual(index.rank('surprise me', ['vegan']), {'worcester': ['Garden Salad'], 'franklin': ['Tofu Stir Fry']})
+        self.assertEqual(index.rank('surprise me'), {'worcester': [], 'franklin': []})
+
+    def test_bm25_prefers_rarer_terms(self):
+        """Test that a term found in fewer dishes outweighs a common one."""
+        index = BM25Index([['chicken', 'soup'], ['chicken', 'wrap'], ['chicken', 'salad']])
+        scores = index.scores({'chicken': 1.0, 'soup': 1.0})
+
+        self.assertGreater(scores[0], scores[1])
+        self.assertAlmostEqual(scores[1], scores[2])
+
+
+class RankPromptTest(TestCase):
+    """Test cases for the compact, token-budgeted LLM ranking prompt."""
+
+    def setUp(self):
+        import recommendation
+        self.recommendation = recommendation
+        self.candidates = {
+            'berkshire': [
+                {'name': f'Berkshire Dish {i}', 'meal': 'lunch', 'category': 'Lunch', 'allergens': ['Milk'], 'diets': ['Vegan']}
+                for i in range(30)
+            ],
+            'worcester': [
+                {'name': 'Pad Thai', 'meal': 'lunch', 'category': 'Wok', 'allergens': ['Peanuts', 'Milk'], 'diets': []},
+            ],
+        }
+
+    def test_compact_encoding(self):
+        """Test that dishes get short IDs and allergens/diets are encoded once in a legend."""
+        prompt, ids = self.recommendation._build_rank_prompt('spicy', {'diet': ['Vegan'], 'likes': []}, self.candidates)
+
+        self.assertIn('Codes: a1=Milk,a2=Peanuts;d1=Vegan\n', prompt)
+        self.assertIn('\nB1|Berkshire Dish 0||a1|d1\n', prompt)
+        self.assertIn('\nW1|Pad Thai|Wok|a2 a1|\n', prompt)
+        self.assertIn('Preferences: {"diet":["Vegan"]}\n', prompt)
+        self.assertEqual(ids['W1'], ('worcester', 'Pad Thai'))
+        self.assertEqual(len(ids), 31)
+
+    def test_ids_unique_for_halls_sharing_a_letter(self):
+        """Test that new halls whose slugs start like an existing hall's get their own ID prefix."""
+        candidates = {
+            'hampshire': [{'name': 'Hampshire Soup', 'meal': 'lunch'}],
+            'hampden': [{'name': 'Hampden Soup', 'meal': 'lunch'}],
+            'franklin': [{'name': 'Franklin Soup', 'meal': 'lunch'}],
+            'franklin-grab': [{'name': 'Grab Soup', 'meal': 'lunch'}],
+        }
+        _, ids = self.recommendation._build_rank_prompt('soup', {}, candidates)
+
+        self.assertEqual(ids['H1'], ('hampshire', 'Hampshire Soup'))
+        self.assertEqual(ids['HA1'], ('hampden', 'Hampden Soup'))
+        self.assertEqual(ids['F1'], ('franklin', 'Franklin Soup'))
+        self.assertEqual(ids['FR1'], ('franklin-grab', 'Grab Soup'))
+
+    def test_token_budget(self):
+        """Test that candidates are packed round-robin until the budget is reached."""
+        prompt, ids = self.recommendation._build_rank_prompt('spicy', {}, self.candidates, token_budget=200)
+
+        self.assertLessEqual(self.recommendation.count_tokens(prompt), 200)
+        self.assertIn('W1', ids)
+        self.assertIn('B1', ids)
+        self.assertLess(len(ids), 31)
+
+    def test_answer_ids_are_looked_up(self):
+        """Test that the answer's IDs map back to dishes and everything else is dropped."""
+        _, ids = self.recommendation._build_rank_prompt('spicy', {}, self.candidates)
+        resp = MagicMock()
+        resp.choices[0].message.content = json.dumps({
+            'berkshire': ['b2', 'W1', 'Made Up Dish', 'B99', 'B2', 'B3', 'B4', 'B5'],
+            'worcester': 'W1',
+        })
+
+        result = self.recommendation._parse_rank_response(resp, ids)
+        self.assertEqual(result['berkshire'], ['Berkshire Dish 1', 'Berkshire Dish 2', 'Berkshire Dish 3'])
+        self.assertEqual(result['worcester'], ['Pad Thai'])
+        self.assertEqual(result['franklin'], [])
+
+
+class PreRankTest(TestCase):
+    """Test cases for the local first stage in front of the LLM."""
+
+    def setUp(self):
+        import recommendation
+        self.recommendation = recommendation
+        recommendation.rank_cache.clear()
+        recommendation.lexical_index_cache.clear()
+        self.addCleanup(recommendation.rank_cache.clear)
+        self.candidates = {
+            'berkshire': [{'name': f'Plain Dish {i}', 'category': 'Entrees', 'diets': []} for i in range(20)]
+            + [{'name': 'Spicy Chili', 'category': 'Soup', 'diets': []}],
+            'worcester': [
+                {'name': 'Steamed Rice', 'category': 'Sides', 'diets': []},
+                {'name': 'Tofu Bowl', 'category': 'Entrees', 'diets': ['Vegan']},
+            ],
+        }
+
+    def test_prerank_top_k(self):
+        """Test that matches move to the front, the rest fill up to k and better halls come first."""
+        index = CandidateIndex(self.candidates)
+        shortlist = index.prerank('something spicy', ['vegan'], k=3, hall_quality={'worcester': 4.5})
+
+        self.assertEqual(list(shortlist), ['worcester', 'berkshire'])
+        self.assertEqual([d['name'] for d in shortlist['berkshire']], ['Spicy Chili', 'Plain Dish 0', 'Plain Dish 1'])
+        self.assertEqual([d['name'] for d in shortlist['worcester']], ['Tofu Bowl', 'Steamed Rice'])
+
+    def test_llm_sees_shortlist(self):
+        """Test that only the pre-ranked top k per hall reach the LLM."""
+        with patch.object(self.recommendation, 'PRE_RANK_TOP_K', 2), \
+                patch.object(self.recommendation, '_rank_with_llm', return_value={}) as llm:
+            self.recommendation._rank('spicy', {}, self.candidates, {}, {'berkshire': 4.0})
+
+        shortlist = llm.call_args.args[2]
+        self.assertEqual(list(shortlist), ['berkshire', 'worcester'])
+        self.assertEqual([d['name'] for d in shortlist['berkshire']], ['Spicy Chili', 'Plain Dish 0'])
+
+    def test_hall_quality_is_shrunk(self):
+        """Test that few reviews count for less than many."""
+        quality = get_hall_quality_for_recommendation([
+            {'hallName': 'Berkshire', 'avgRating': 5.0, 'reviewCount': 1},
+            {'hallName': 'Worcester', 'avgRating': 4.0, 'reviewCount': 100},
+            {'hallName': 'Franklin', 'avgRating': 0, 'reviewCount': 0},
+        ])
+
+        self.assertGreater(quality['worcester'], quality['berkshire'])
+        self.assertEqual(quality['franklin'], 3)
@@ -1,13 +1,17 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 from django.db import IntegrityError
 from datetime import datetime, date, timedelta
+import asyncio
 import json
+import os
+import tempfile
+import time
 
 from .models import (
-    UserProfile, MenuItem, DiningHall, Review, MealHistory,
-    ALLERGEN_CHOICES, DIET_CHOICES
+    UserProfile, MenuItem, DiningHall, Review, ReviewStats, MealHistory, MenuDay, MenuOffering,
+    ALLERGEN_CHOICES, DIET_CHOICES, get_allergen_mask, get_diet_mask
 )
 
 
@@ -147,6 +151,68 @@ class MenuItemModelTest(TestCase):
         
         item.calories = 0
         item.full_clean()  # Should not raise
+    
+    def test_content_hash_set_on_save(self):
+        """Test that saving a dish fills in its content hash."""
+        self.assertEqual(len(self.menu_item.contentHash), 64)
+        self.assertEqual(self.menu_item.contentHash, self.menu_item.get_content_hash())
+    
+    def test_content_hash_ignores_list_order(self):
+        """Test that allergen/diet order does not change a dish's identity."""
+        a = MenuItem.from_scraped({'name': 'Tofu', 'allergens': ['soy', 'corn'], 'dietCategories': ['vegetarian', 'halal']})
+        b = MenuItem.from_scraped({'name': 'Tofu', 'allergens': ['corn', 'soy'], 'dietCategories': ['halal', 'vegetarian']})
+        c = MenuItem.from_scraped({'name': 'Tofu', 'allergens': ['soy'], 'dietCategories': ['vegetarian', 'halal']})
+        self.assertEqual(a.contentHash, b.contentHash)
+        self.assertNotEqual(a.contentHash, c.contentHash)
+    
+    def test_masks_set_on_save(self):
+        """Test that allergen/diet bitmasks are computed when saving."""
+        self.assertEqual(self.menu_item.allergenMask, get_allergen_mask(['eggs']))
+        self.assertEqual(self.menu_item.dietMask, get_diet_mask(['halal', 'antibiotic_free']))
+    
+    def test_minhash_reused_when_words_unchanged(self):
+        """Test that saving a loaded dish only re-signs it when its name or ingredients change."""
+        from .similarity import minhash_signature
+        dish = MenuItem.objects.get(pk=self.menu_item.pk)
+        
+        with patch('menus.models.minhash_signature', wraps=minhash_signature) as sign:
+            dish.calories += 10
+            dish.save()
+            self.assertEqual(sign.call_count, 0)
+            
+            dish.name = 'Scrambled Tofu'
+            dish.save()
+            self.assertEqual(sign.call_count, 1)
+    
+    def test_safe_for_queryset(self):
+        """Test that allergen filtering runs in the database."""
+        MenuItem.objects.create(name='Salad', allergens=[], dietTags=['vegetarian'])
+        MenuItem.objects.create(name='Cheese Pizza', allergens=['dairy', 'gluten'], dietTags=['vegetarian'])
+        
+        names = set(MenuItem.objects.safe_for(['eggs']).values_list('name', flat=True))
+        self.assertEqual(names, {'Salad', 'Cheese Pizza'})
+        names = set(MenuItem.objects.safe_for(['eggs', 'gluten']).values_list('name', flat=True))
+        self.assertEqual(names, {'Salad'})
+        self.assertEqual(MenuItem.objects.safe_for([]).count(), 3)
+    
+    def test_matching_diet_queryset(self):
+        """Test that diet filtering runs in the database."""
+        MenuItem.objects.create(name='Salad', allergens=[], dietTags=['vegetarian'])
+        
+        names = set(MenuItem.objects.matching_diet(['vegetarian', 'halal']).values_list('name', flat=True))
+        self.assertEqual(names, {'Salad', 'Grilled Chicken'})
+        names = set(MenuItem.objects.safe_for(['eggs']).matching_diet(['vegetarian']).values_list('name', flat=True))
+        self.assertEqual(names, {'Salad'})
+    
+    def test_content_hash_unique(self):
+        """Test that the same dish cannot be stored twice."""
+        with self.assertRaises(IntegrityError):
+            MenuItem.objects.create(
+                name='Grilled Chicken',
+                calories=250,
+                allergens=['eggs'],
+                dietTags=['antibiotic_free', 'halal']
+            )
 
 
 class DiningHallModelTest(TestCase):
@@ -207,6 +273,23 @@ class DiningHallModelTest(TestCase):
         self.assertEqual(len(filtered['lunch']), 1)
         self.assertEqual(filtered['lunch'][0]['name'], 'Salad')
     
+    def test_get_filtered_meals_dish_references(self):
+        """Test filtering meals that reference catalog dishes."""
+        tofu = MenuItem.objects.create(name='Tofu Bowl', allergens=['soy'], dietTags=['plant_based'])
+        pasta = MenuItem.objects.create(name='Pasta', allergens=['gluten'], dietTags=['vegetarian'])
+        self.hall.meals = {
+            'breakfast': [],
+            'lunch': [{'dishId': tofu.id, 'weeklySelections': 10}, {'dishId': pasta.id, 'weeklySelections': 5}],
+            'dinner': []
+        }
+        self.hall.save()
+        
+        filtered = self.hall.get_filtered_meals(user_allergens=['gluten'])
+        self.assertEqual([item['name'] for item in filtered['lunch']], ['Tofu Bowl'])
+        
+        filtered = self.hall.get_filtered_meals(user_diet_prefs=['vegetarian'])
+        self.assertEqual([item['name'] for item in filtered['lunch']], ['Pasta'])
+    
     def test_get_filtered_meals_combined(self):
         """Test filtering meals with both allergens and diet preferences."""
         filtered = self.hall.get_filtered_meals(
@@ -514,11 +597,191 @@ class MealHistoryModelTest(TestCase):
         self.assertEqual(histories[2].date, day_before)
 
 
+class TagMaskTest(TestCase):
+    """Test cases for the canonical allergen/diet bitmask vocabulary."""
+    
+    def test_masks_are_distinct_bits(self):
+        """Test that every known tag gets its own bit."""
+        masks = [get_allergen_mask([a]) for a, _ in ALLERGEN_CHOICES]
+        self.assertEqual(len(set(masks)), len(masks))
+        for mask in masks:
+            self.assertEqual(mask.bit_count(), 1)
+    
+    def test_empty_masks(self):
+        """Test that no tags encode to zero."""
+        self.assertEqual(get_allergen_mask([]), 0)
+        self.assertEqual(get_allergen_mask(None), 0)
+        self.assertEqual(get_diet_mask(['none']), 0)
+    
+    def test_form_aliases(self):
+        """Test that accounts/forms.py spellings share the canonical bit."""
+        self.assertEqual(get_allergen_mask(['milk']), get_allergen_mask(['dairy']))
+        self.assertEqual(get_diet_mask(['vegan']), get_diet_mask(['plant_based']))
+        self.assertNotEqual(get_allergen_mask(['shellfish']), get_allergen_mask(['fish']))
+    
+    def test_unknown_allergens_are_conservative(self):
+        """Test that unknown allergens still conflict with each other."""
+        self.assertTrue(get_allergen_mask(['mustard']) & get_allergen_mask(['celery']))
+        self.assertFalse(get_allergen_mask(['mustard']) & get_allergen_mask(['eggs']))
+
+
+class MenuDayModelTest(TestCase):
+    """Test cases for MenuDay and MenuOffering models."""
+    
+    def setUp(self):
+        """Set up test dining hall and menu day."""
+        self.hall = DiningHall.objects.create(
+            hallName='Berkshire',
+            hours='07:00-20:00'
+        )
+        self.day = MenuDay.objects.create(
+            diningHall=self.hall,
+            date=date(2025, 12, 6),
+            dateDisplay='Dec 6',
+            dayOfWeek='Saturday',
+            isWeekend=True
+        )
+        salad = MenuItem.objects.create(name='Salad', calories=100, dietTags=['vegetarian'])
+        chicken = MenuItem.objects.create(name='Grilled Chicken', calories=250, allergens=['eggs'], dietTags=['halal'])
+        MenuOffering.objects.create(day=self.day, mealType='lunch', position=1, dish=salad, weeklySelections=40)
+        MenuOffering.objects.create(day=self.day, mealType='lunch', position=0, dish=chicken)
+    
+    def test_menu_day_str(self):
+        """Test MenuDay string representation."""
+        self.assertEqual(str(self.day), 'Berkshire - 2025-12-06')
+    
+    def test_menu_day_unique_together(self):
+        """Test that a hall can only have one menu per date."""
+        with self.assertRaises(IntegrityError):
+            MenuDay.objects.create(diningHall=self.hall, date=date(2025, 12, 6))
+    
+    def test_offerings_ordered_by_position(self):
+        """Test that offerings keep the scraped menu order."""
+        names = [o.dish.name for o in self.day.offerings.filter(mealType='lunch')]
+        self.assertEqual(names, ['Grilled Chicken', 'Salad'])
+    
+    def test_to_dict_matches_scraped_format(self):
+        """Test that MenuDay/MenuOffering serialize like a menuByDate entry."""
+        meals = {'breakfast': [], 'lunch': [o.to_dict() for o in self.day.offerings.all()], 'dinner': []}
+        data = self.day.to_dict(meals)
+        
+        self.assertEqual(data['date'], '2025-12-06')
+        self.assertEqual(data['dateDisplay'], 'Dec 6')
+        self.assertTrue(data['isWeekend'])
+        self.assertEqual(data['meals']['lunch'][0]['name'], 'Grilled Chicken')
+        self.assertEqual(data['meals']['lunch'][0]['allergens'], ['eggs'])
+        self.assertEqual(data['meals']['lunch'][1]['dietCategories'], ['vegetarian'])
+        self.assertEqual(data['meals']['lunch'][1]['weeklySelections'], 40)
+    
+    def test_deleting_hall_cascades(self):
+        """Test that deleting a hall removes its menu days and offerings but keeps dishes."""
+        self.hall.delete()
+        self.assertEqual(MenuDay.objects.count(), 0)
+        self.assertEqual(MenuOffering.objects.count(), 0)
+        self.assertEqual(MenuItem.objects.count(), 2)
+
+
+class ImportMenusCommandTest(TestCase):
+    """Test cases for the import_menus management command."""
+    
+    def setUp(self):
+        """Set up a small scraped data payload."""
+        self.data = {
+            'diningHalls': [{
+                'hallName': 'Berkshire',
+                'hours': '07:00-21:00',
+                'mealHours': {'breakfast': '07:00-10:30', 'lunch': '11:00-14:30', 'dinner': '17:00-21:00'},
+                'meals': {'breakfast': [], 'lunch': [], 'dinner': []},
+                'menuByDate': [
+                    {
+                        'date': '2025-12-06', 'dateDisplay': 'Dec 6', 'dayOfWeek': 'Saturday', 'isWeekend': True,
+                        'meals': {
+                            'breakfast': [],
+                            'lunch': [{'name': 'Salad', 'calories': 100, 'allergens': [], 'dietCategories': ['vegetarian']}],
+                            'dinner': [{'name': 'Pasta', 'calories': 400, 'allergens': ['gluten'], 'dietCategories': []}]
+                        }
+                    },
+                    {
+                        'date': '2025-12-08', 'dateDisplay': 'Dec 8', 'dayOfWeek': 'Monday', 'isWeekend': False,
+                        'meals': {
+                            'breakfast': [{'name': 'Oatmeal', 'calories': 150, 'allergens': [], 'dietCategories': []}],
+                            'lunch': [],
+                            'dinner': []
+                        }
+                    }
+                ]
+            }]
+        }
+    
+    def _run_import(self):
+        from io import StringIO
+        from .management.commands.import_menus import Command
+        command = Command(stdout=StringIO())
+        command.import_dining_halls(self.data)
+    
+    def test_import_populates_menu_tables(self):
+        """Test that importing creates one MenuDay per date with its offerings."""
+        self._run_import()
+        
+        hall = DiningHall.objects.get(hallName='Berkshire')
+        self.assertEqual(hall.menu_days.count(), 2)
+        day = hall.menu_days.get(date=date(2025, 12, 6))
+        self.assertTrue(day.isWeekend)
+        self.assertEqual(
+            [(o.mealType, o.dish.name) for o in day.offerings.all()],
+            [('dinner', 'Pasta'), ('lunch', 'Salad')]
+        )
+    
+    def test_reimport_replaces_menu_days(self):
+        """Test that re-importing does not duplicate menu rows."""
+        self._run_import()
+        self._run_import()
+        
+        self.assertEqual(MenuDay.objects.count(), 2)
+        self.assertEqual(MenuOffering.objects.count(), 3)
+        self.assertEqual(MenuItem.objects.count(), 3)
+    
+    def test_reimport_signs_only_new_dishes(self):
+        """Test that re-importing builds signatures only for dishes not yet in the catalog."""
+        from .similarity import minhash_signature
+        self._run_import()
+        self.data['diningHalls'][0]['menuByDate'][1]['meals']['dinner'] = [
+            {'name': 'Chili', 'calories': 300, 'allergens': [], 'dietCategories': []}
+        ]
+        
+        with patch('menus.models.minhash_signature', wraps=minhash_signature) as sign:
+            self._run_import()
+        
+        self.assertEqual(sign.call_count, 1)
+        self.assertEqual(MenuItem.objects.count(), 4)
+    
+    def test_import_deduplicates_dishes(self):
+        """Test that a dish served on several days is stored once and referenced."""
+        salad = {'name': 'Salad', 'calories': 100, 'allergens': [], 'dietCategories': ['vegetarian'], 'weeklySelections': 12}
+        hall_data = self.data['diningHalls'][0]
+        hall_data['meals']['lunch'] = [salad]
+        hall_data['menuByDate'][1]['meals']['lunch'] = [dict(salad, weeklySelections=30)]
+        self._run_import()
+        
+        dish = MenuItem.objects.get(name='Salad')
+        self.assertEqual(dish.offerings.count(), 2)
+        self.assertEqual(MenuItem.objects.count(), 3)
+        
+        hall = DiningHall.objects.get(hallName='Berkshire')
+        self.assertEqual(hall.meals['lunch'], [{'dishId': dish.id, 'weeklySelections': 12}])
+        resolved = hall.get_resolved_meals()
+        self.assertEqual(resolved['lunch'][0]['name'], 'Salad')
+        self.assertEqual(resolved['lunch'][0]['dietCategories'], ['vegetarian'])
+        self.assertEqual(resolved['lunch'][0]['weeklySelections'], 12)
+
+
 # ============== View Tests ==============
 
 from django.test import Client
 from django.urls import reverse
+from django.utils import timezone
 from unittest.mock import patch, MagicMock
+from .views import REVIEW_PAGE_SIZE
 
 
 class MenuViewTest(TestCase):
@@ -640,6 +903,318 @@ class RecommendationsViewTest(TestCase):
         response = self.client.get(reverse('recommendations') + '?meal=lunch')
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.context['current_meal'], 'lunch')
+    
+    def test_recommendations_view_uses_todays_menu(self):
+        """Test that today's MenuDay replaces the hall's default meals."""
+        day = MenuDay.objects.create(diningHall=self.hall, date=datetime.now().date())
+        burger = MenuItem.objects.create(name='Veggie Burger', calories=350, dietTags=['vegetarian'])
+        MenuOffering.objects.create(day=day, mealType='lunch', dish=burger)
+        self.client.login(username='testuser', password='testpass123')
+        
+        response = self.client.get(reverse('recommendations') + '?meal=lunch')
+        self.assertEqual(response.status_code, 200)
+        lunch_items = response.context['dining_halls'][0]['filteredMeals']['lunch']
+        self.assertEqual([item['name'] for item in lunch_items], ['Veggie Burger'])
+    
+    def test_recommendations_view_empty_day_uses_default_meals(self):
+        """Test that a MenuDay without offerings falls back to the hall's default meals."""
+        MenuDay.objects.create(diningHall=self.hall, date=datetime.now().date())
+        self.client.login(username='testuser', password='testpass123')
+        
+        response = self.client.get(reverse('recommendations') + '?meal=lunch')
+        self.assertEqual(response.status_code, 200)
+        lunch_items = response.context['dining_halls'][0]['filteredMeals']['lunch']
+        self.assertEqual([item['name'] for item in lunch_items], ['Grilled Chicken', 'Salad'])
+
+    
+    def test_recommendations_view_skips_hall_scores(self):
+        """Test that the page only computes the meal scores it renders."""
+        self.client.login(username='testuser', password='testpass123')
+        
+        with patch('menus.views.calculate_hall_score') as hall_score, \
+                patch('menus.scoring.ScoringEngine.hall_scores') as engine_hall_scores:
+            response = self.client.get(reverse('recommendations') + '?meal=lunch')
+        
+        self.assertEqual(response.status_code, 200)
+        hall_score.assert_not_called()
+        engine_hall_scores.assert_not_called()
+        hall = response.context['dining_halls'][0]
+        self.assertEqual(hall['filteredCount']['lunch'], len(hall['filteredMeals']['lunch']))
+
+
+class TopDishesViewTest(TestCase):
+    """Test cases for the dish-level top-K API."""
+    
+    def setUp(self):
+        """Set up an always-open and a closed hall and a user avoiding eggs who prefers vegetarian food."""
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.user.profile.allergens = ['eggs']
+        self.user.profile.dietPreferences = ['vegetarian', 'halal']
+        self.user.profile.save()
+        self.open_hall = DiningHall.objects.create(
+            hallName='Worcester',
+            hours='00:00-23:59',
+            meals={'lunch': [
+                {'name': 'Salad', 'calories': 100, 'allergens': [], 'dietTags': ['vegetarian'],
+                 'weeklySelections': 40},
+                {'name': 'Egg Wrap', 'calories': 300, 'allergens': ['eggs'], 'dietTags': ['vegetarian', 'halal']},
+                {'name': 'Steak', 'calories': 500, 'allergens': [], 'dietTags': []},
+            ]}
+        )
+        self.closed_hall = DiningHall.objects.create(
+            hallName='Berkshire',
+            hours='',
+            meals={'lunch': [
+                {'name': 'Falafel', 'calories': 350, 'allergens': [], 'dietTags': ['vegetarian', 'halal'],
+                 'weeklySelections': 10},
+                {'name': 'Veggie Soup', 'calories': 120, 'allergens': [], 'dietTags': ['vegetarian'],
+                 'weeklySelections': 90},
+                {'name': 'Veggie Soup', 'calories': 120, 'allergens': [], 'dietTags': ['vegetarian'],
+                 'weeklySelections': 5},
+            ]}
+        )
+    
+    def test_top_dishes_requires_login(self):
+        """Test that the API redirects anonymous users to login."""
+        response = self.client.get(reverse('top_dishes'))
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('login', response.url)
+    
+    def test_top_dishes_ranking(self):
+        """Test that safe, diet-matching dishes are ranked with the open-hall bonus."""
+        self.client.login(username='testuser', password='testpass123')
+        
+        response = self.client.get(reverse('top_dishes') + '?meal=lunch')
+        data = json.loads(response.content)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(data['success'])
+        self.assertEqual(data['meal'], 'lunch')
+        self.assertEqual(
+            [(dish['name'], dish['hallName'], dish['score']) for dish in data['dishes']],
+            [('Salad', 'Worcester', 75), ('Falafel', 'Berkshire', 40), ('Veggie Soup', 'Berkshire', 25)]
+        )
+        self.assertEqual(data['dishes'][1]['matchedDiets'], ['vegetarian', 'halal'])
+        self.assertEqual(data['dishes'][2]['weeklySelections'], 90)
+        self.assertTrue(data['dishes'][0]['isOpen'])
+    
+    def test_top_dishes_limit(self):
+        """Test the limit parameter and its validation."""
+        self.client.login(username='testuser', password='testpass123')
+        
+        response = self.client.get(reverse('top_dishes') + '?meal=lunch&limit=1')
+        self.assertEqual([dish['name'] for dish in json.loads(response.content)['dishes']], ['Salad'])
+        
+        response = self.client.get(reverse('top_dishes') + '?limit=abc')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(json.loads(response.content)['success'])
+    
+    def test_top_dishes_personal_scores(self):
+        """Test that trained collaborative-filtering scores are attached when a model exists."""
+        from . import collab
+        if collab.np is None:
+            self.skipTest("NumPy is not installed")
+        self.client.login(username='testuser', password='testpass123')
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'factors.npz')
+            with override_settings(DISH_FACTORS_PATH=path):
+                response = self.client.get(reverse('top_dishes') + '?meal=lunch')
+                self.assertIsNone(json.loads(response.content)['dishes'][0]['personalScore'])
+                
+                collab.save_factors(path, [self.user.id], ['Salad'], [[1.0, 2.0]], [[0.5, 0.25]])
+                dishes = json.loads(self.client.get(reverse('top_dishes') + '?meal=lunch').content)['dishes']
+        self.assertEqual(dishes[0]['personalScore'], 1.0)
+        self.assertIsNone(dishes[1]['personalScore'])
+
+
+class WeekPlanViewTest(TestCase):
+    """Test cases for the "plan my week" API."""
+    
+    def setUp(self):
+        """Set up two halls with dated menus on a weekday and one with a weekend lunch."""
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.user.profile.allergens = ['eggs']
+        self.user.profile.save()
+        omelette = MenuItem.objects.create(name='Omelette', calories=300, allergens=['eggs'])
+        salad = MenuItem.objects.create(name='Salad', calories=100, dietTags=['vegetarian'])
+        soup = MenuItem.objects.create(name='Soup', calories=150)
+        self.worcester = DiningHall.objects.create(hallName='Worcester', hours='07:00-20:00')
+        self.berkshire = DiningHall.objects.create(hallName='Berkshire', hours='07:00-20:00')
+        
+        monday = MenuDay.objects.create(diningHall=self.worcester, date=date(2025, 12, 8))
+        MenuOffering.objects.create(day=monday, mealType='breakfast', dish=omelette, position=0)
+        MenuOffering.objects.create(day=monday, mealType='lunch', dish=omelette, position=0)
+        MenuOffering.objects.create(day=monday, mealType='lunch', dish=salad, position=1)
+        monday = MenuDay.objects.create(diningHall=self.berkshire, date=date(2025, 12, 8))
+        MenuOffering.objects.create(day=monday, mealType='lunch', dish=salad, position=0)
+        MenuOffering.objects.create(day=monday, mealType='lunch', dish=soup, position=1)
+        saturday = MenuDay.objects.create(
+            diningHall=self.berkshire, date=date(2025, 12, 13), dayOfWeek='Saturday', isWeekend=True
+        )
+        MenuOffering.objects.create(day=saturday, mealType='lunch', dish=soup, position=0)
+    
+    def test_week_plan_requires_login(self):
+        """Test that the API redirects anonymous users to login."""
+        response = self.client.get(reverse('week_plan'))
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('login', response.url)
+    
+    def test_week_plan_ranks_halls_for_every_date_and_meal(self):
+        """Test that every dated meal is ranked with only safe dishes."""
+        self.client.login(username='testuser', password='testpass123')
+        
+        response = self.client.get(reverse('week_plan'))
+        data = json.loads(response.content)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(data['success'])
+        self.assertEqual([day['date'] for day in data['days']], ['2025-12-08', '2025-12-13'])
+        monday, saturday = data['days']
+        self.assertEqual(list(monday['meals']), ['breakfast', 'lunch'])
+        self.assertEqual(monday['meals']['breakfast'][0]['dishes'], [])
+        self.assertEqual(
+            [(hall['hallName'], hall['matchRate'], [dish['name'] for dish in hall['dishes']])
+             for hall in monday['meals']['lunch']],
+            [('Berkshire', 100, ['Salad', 'Soup']), ('Worcester', 50, ['Salad'])]
+        )
+        self.assertTrue(saturday['isWeekend'])
+        self.assertEqual([hall['hallId'] for hall in saturday['meals']['lunch']], [self.berkshire.id])
+    
+    def test_week_plan_computed_in_one_pass(self):
+        """Test that the plan is built once per profile and menu version, not once per meal."""
+        self.client.login(username='testuser', password='testpass123')
+        self.client.get(reverse('week_plan'))
+        
+        with patch('menus.views.summarize_meal') as summarize:
+            response = self.client.get(reverse('week_plan'))
+        summarize.assert_not_called()
+        self.assertEqual(len(json.loads(response.content)['days']), 2)
+
+
+class MealPlanViewTest(TestCase):
+    """Test cases for the calorie-target meal planner API."""
+    
+    def setUp(self):
+        """Set up a hall with one egg dish and a user avoiding eggs."""
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.user.profile.allergens = ['eggs']
+        self.user.profile.calorieTarget = 1450
+        self.user.profile.save()
+        DiningHall.objects.create(
+            hallName='Worcester',
+            hours='07:00-20:00',
+            meals={
+                'breakfast': [
+                    {'name': 'Oatmeal', 'calories': 300, 'allergens': []},
+                    {'name': 'Eggs Benedict', 'calories': 500, 'allergens': ['eggs']},
+                ],
+                'lunch': [
+                    {'name': 'Salad', 'calories': 200, 'allergens': []},
+                    {'name': 'Burger', 'calories': 700, 'allergens': []},
+                ],
+                'dinner': [
+                    {'name': 'Pasta', 'calories': 600, 'allergens': []},
+                    {'name': 'Steak', 'calories': 900, 'allergens': []},
+                ],
+            }
+        )
+    
+    def test_meal_plan_requires_login(self):
+        """Test that the API redirects anonymous users to login."""
+        response = self.client.get(reverse('meal_plan'))
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('login', response.url)
+    
+    def test_meal_plan_hits_calorie_target(self):
+        """Test that the plan is the safe combination closest to the profile's target."""
+        self.client.login(username='testuser', password='testpass123')
+        
+        response = self.client.get(reverse('meal_plan'))
+        data = json.loads(response.content)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((data['calorieTarget'], data['totalCalories']), (1450, 1400))
+        self.assertEqual(
+            [(meal['mealType'], [dish['name'] for dish in meal['dishes']]) for meal in data['meals']],
+            [('breakfast', ['Oatmeal']), ('lunch', ['Salad']), ('dinner', ['Steak'])]
+        )
+        
+        response = self.client.get(reverse('meal_plan') + '?target=2500')
+        self.assertEqual(json.loads(response.content)['totalCalories'], 2500)
+    
+    def test_meal_plan_validation(self):
+        """Test that bad targets and dates are rejected."""
+        self.client.login(username='testuser', password='testpass123')
+        
+        for query in ('?target=abc', '?target=100', '?date=12-08-2025'):
+            response = self.client.get(reverse('meal_plan') + query)
+            self.assertEqual(response.status_code, 400)
+            self.assertFalse(json.loads(response.content)['success'])
+
+
+class SimilarDishesViewTest(TestCase):
+    """Test cases for the "more like this" APIs."""
+    
+    def setUp(self):
+        """Set up soups with shared ingredients, one with eggs, and an unrelated dessert."""
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.user.profile.allergens = ['eggs']
+        self.user.profile.save()
+        stock = 'Chicken Stock, Carrots, Celery, Onions, Thyme, Parsley, Black Pepper'
+        self.noodle_soup = MenuItem.objects.create(name='Chicken Noodle Soup', ingredients=f'{stock}, Noodles')
+        self.rice_soup = MenuItem.objects.create(name='Chicken Rice Soup', ingredients=f'{stock}, Rice')
+        egg_soup = MenuItem.objects.create(
+            name='Chicken Egg Drop Soup', ingredients=f'{stock}, Eggs', allergens=['eggs']
+        )
+        cake = MenuItem.objects.create(name='Chocolate Cake', ingredients='Cocoa, Flour, Butter, Vanilla')
+        self.hall = DiningHall.objects.create(hallName='Worcester', hours='07:00-20:00')
+        day = MenuDay.objects.create(diningHall=self.hall, date=date(2025, 12, 8))
+        for position, dish in enumerate([self.noodle_soup, self.rice_soup, egg_soup, cake]):
+            MenuOffering.objects.create(day=day, mealType='lunch', dish=dish, position=position)
+    
+    def test_similar_dishes_requires_login(self):
+        """Test that the API redirects anonymous users to login."""
+        response = self.client.get(reverse('similar_dishes', args=[self.noodle_soup.id]))
+        self.assertEqual(response.status_code, 302)
+    
+    def test_similar_dishes_are_safe_and_served(self):
+        """Test that similar dishes with the user's allergens are left out and servings are listed."""
+        self.client.login(username='testuser', password='testpass123')
+        
+        response = self.client.get(reverse('similar_dishes', args=[self.noodle_soup.id]))
+        data = json.loads(response.content)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['dish']['name'], 'Chicken Noodle Soup')
+        self.assertEqual([dish['name'] for dish in data['dishes']], ['Chicken Rice Soup'])
+        self.assertEqual(
+            data['dishes'][0]['servedAt'],
+            [{'hallId': self.hall.id, 'hallName': 'Worcester', 'date': '2025-12-08', 'mealType': 'lunch'}]
+        )
+        
+        response = self.client.get(reverse('similar_dishes', args=[999999]))
+        self.assertEqual(response.status_code, 404)
+    
+    def test_similar_to_history(self):
+        """Test suggestions based on the dishes in a day's meal history."""
+        self.client.login(username='testuser', password='testpass123')
+        MealHistory.objects.create(
+            user=self.user, date=date(2025, 12, 7), meals=[{'name': 'Chicken Rice Soup', 'diningHall': 'Worcester'}]
+        )
+        
+        response = self.client.get(reverse('similar_to_history') + '?date=2025-12-07')
+        data = json.loads(response.content)
+        
+        self.assertEqual(data['basedOn'], ['Chicken Rice Soup'])
+        self.assertEqual([dish['name'] for dish in data['dishes']], ['Chicken Noodle Soup'])
+        
+        response = self.client.get(reverse('similar_to_history'))
+        self.assertEqual(json.loads(response.content)['dishes'], [])
 
 
 class ReviewViewTest(TestCase):
@@ -775,6 +1350,264 @@ class ReviewViewTest(TestCase):
         data = json.loads(response.content)
         self.assertFalse(data['success'])
 
+    
+    def test_review_stats_follow_submit_and_delete(self):
+        """Test that hall aggregates track review submit, update and delete."""
+        self.client.login(username='testuser', password='testpass123')
+        url = reverse('submit_review', args=[self.hall.id])
+        
+        self.client.post(url, {'rating': '4', 'reviewText': 'Good'})
+        stats = ReviewStats.objects.get(diningHall=self.hall)
+        self.assertEqual((stats.reviewCount, stats.ratingSum, stats.rating4), (1, 4, 1))
+        
+        self.client.post(url, {'rating': '2', 'reviewText': 'Worse now'})
+        stats.refresh_from_db()
+        self.assertEqual((stats.reviewCount, stats.ratingSum, stats.rating4, stats.rating2), (1, 2, 0, 1))
+        
+        self.client.post(reverse('delete_review', args=[self.hall.id]))
+        stats.refresh_from_db()
+        self.assertEqual((stats.reviewCount, stats.ratingSum, stats.rating2), (0, 0, 0))
+
+
+class ReviewListViewTest(TestCase):
+    """Test cases for the keyset-paginated reviews API."""
+    
+    def setUp(self):
+        """Set up a hall with 25 reviews, several sharing a timestamp."""
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.hall = DiningHall.objects.create(hallName='Berkshire', hours='07:00-20:00')
+        base = datetime(2025, 12, 1, 12, 0)
+        for i in range(25):
+            user = User.objects.create(username=f'reviewer{i}')
+            review = Review.objects.create(user=user, diningHall=self.hall, reviewText=f'Review {i}', rating=4)
+            # Reviews 10-14 share one timestamp so the id tiebreak is exercised
+            created_at = base + timedelta(minutes=10 if 10 <= i < 15 else i)
+            Review.objects.filter(pk=review.pk).update(createdAt=timezone.make_aware(created_at))
+        self.client.login(username='testuser', password='testpass123')
+    
+    def test_pages_cover_all_reviews_in_order(self):
+        """Test walking every page returns each review once, newest first."""
+        url = reverse('list_reviews', args=[self.hall.id])
+        seen, cursor, pages = [], None, 0
+        while True:
+            response = self.client.get(url, {'cursor': cursor} if cursor else {})
+            data = json.loads(response.content)
+            self.assertTrue(data['success'])
+            seen.extend(review['id'] for review in data['reviews'])
+            pages += 1
+            cursor = data['nextCursor']
+            if not data['hasMore']:
+                break
+        
+        expected = list(
+            Review.objects.filter(diningHall=self.hall).order_by('-createdAt', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(pages, 3)
+        self.assertEqual(seen, expected)
+    
+    def test_limit_param(self):
+        """Test page size is taken from the limit parameter and clamped."""
+        url = reverse('list_reviews', args=[self.hall.id])
+        
+        self.assertEqual(len(json.loads(self.client.get(url, {'limit': 3}).content)['reviews']), 3)
+        self.assertEqual(len(json.loads(self.client.get(url, {'limit': 500}).content)['reviews']), 25)
+    
+    def test_invalid_cursor(self):
+        """Test that a malformed cursor is rejected."""
+        response = self.client.get(reverse('list_reviews', args=[self.hall.id]), {'cursor': 'garbage'})
+        
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(json.loads(response.content)['success'])
+    
+    def test_invalid_hall(self):
+        """Test listing reviews of a non-existent hall."""
+        response = self.client.get(reverse('list_reviews', args=[9999]))
+        
+        self.assertEqual(response.status_code, 404)
+    
+    def test_menu_page_ships_first_page(self):
+        """Test that the menu page embeds only the newest reviews plus a cursor."""
+        response = self.client.get(reverse('menu'))
+        hall = response.context['dining_halls'][0]
+        
+        self.assertEqual(len(hall['reviews']), 10)
+        self.assertEqual(hall['reviewCount'], 25)
+        
+        data = json.loads(self.client.get(
+            reverse('list_reviews', args=[self.hall.id]), {'cursor': hall['reviewsCursor']}
+        ).content)
+        self.assertEqual(data['reviews'][0]['id'], Review.objects.order_by('-createdAt', '-id')[10].id)
+
+
+class QueryBudgetTest(TestCase):
+    """Pin per-request query counts so N+1 regressions fail (50 halls, 10k reviews)."""
+    
+    HALL_COUNT = 50
+    REVIEWERS_PER_HALL = 200
+    
+    @classmethod
+    def setUpTestData(cls):
+        """Bulk-create the halls, reviewers and reviews."""
+        halls = DiningHall.objects.bulk_create([
+            DiningHall(
+                hallName=f'Hall {i}',
+                hours='07:00-21:00',
+                meals={'lunch': [{'name': f'Dish {i}', 'calories': 300, 'allergens': ['eggs']}]},
+            )
+            for i in range(cls.HALL_COUNT)
+        ])
+        reviewers = User.objects.bulk_create([
+            User(username=f'reviewer{i}') for i in range(cls.REVIEWERS_PER_HALL)
+        ])
+        Review.objects.bulk_create([
+            Review(user=reviewer, diningHall=hall, reviewText='Fine', rating=1 + (reviewer.id + hall.id) % 5)
+            for hall in halls
+            for reviewer in reviewers
+        ], batch_size=2000)
+        # bulk_create skips signals, so aggregates are rebuilt once
+        ReviewStats.rebuild()
+        cls.user = User.objects.create_user(username='testuser', password='testpass123')
+    
+    def setUp(self):
+        """Log in and warm the menu cache so only per-request queries are counted."""
+        from .cache import invalidate_menu_cache, get_menu_snapshot
+        invalidate_menu_cache()
+        get_menu_snapshot()
+        self.client = Client()
+        self.client.login(username='testuser', password='testpass123')
+    
+    def test_fixture_size(self):
+        """Test the fixture really has 10k reviews."""
+        self.assertEqual(Review.objects.count(), self.HALL_COUNT * self.REVIEWERS_PER_HALL)
+    
+    def test_recommendations_view_query_count(self):
+        """Session, user, menu version, profile, review stats, the user's own reviews (+ precomputed lookup on a cold cache)."""
+        with self.assertNumQueries(7):
+            response = self.client.get(reverse('recommendations'))
+        self.assertIsNone(response.context['error'])
+        self.assertEqual(len(response.context['dining_halls']), self.HALL_COUNT)
+        
+        with self.assertNumQueries(6):
+            self.client.get(reverse('recommendations'))
+    
+    def test_menu_view_query_count(self):
+        """Session, user, menu version, profile, review stats, the user's own reviews, first page of reviews."""
+        with self.assertNumQueries(7):
+            response = self.client.get(reverse('menu'))
+        self.assertIsNone(response.context['error'])
+        halls = response.context['dining_halls']
+        self.assertEqual(len(halls), self.HALL_COUNT)
+        self.assertTrue(all(hall['reviewCount'] == self.REVIEWERS_PER_HALL for hall in halls))
+        self.assertTrue(all(len(hall['reviews']) == REVIEW_PAGE_SIZE for hall in halls))
+    
+    def test_reviews_api_query_count(self):
+        """Session, user, hall check, one page of reviews."""
+        url = reverse('list_reviews', args=[DiningHall.objects.first().id])
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertTrue(json.loads(response.content)['hasMore'])
+    
+    def test_query_count_independent_of_reviews(self):
+        """Test that more reviews don't add queries to the menu page."""
+        extra = User.objects.create(username='late_reviewer')
+        Review.objects.create(user=extra, diningHall=DiningHall.objects.first(), reviewText='Late', rating=5)
+        
+        with self.assertNumQueries(7):
+            self.client.get(reverse('menu'))
+
+
+class ReviewStatsModelTest(TestCase):
+    """Test cases for ReviewStats aggregates."""
+    
+    def setUp(self):
+        """Set up a hall with reviews from two users."""
+        self.hall = DiningHall.objects.create(hallName='Berkshire', hours='07:00-20:00')
+        self.users = [
+            User.objects.create_user(username=f'user{i}', password='testpass123') for i in range(3)
+        ]
+        Review.objects.create(user=self.users[0], diningHall=self.hall, reviewText='A', rating=5)
+        Review.objects.create(user=self.users[1], diningHall=self.hall, reviewText='B', rating=2)
+    
+    def test_stats_created_with_first_review(self):
+        """Test that the first review creates the aggregate row."""
+        stats = self.hall.review_stats
+        
+        self.assertEqual(stats.reviewCount, 2)
+        self.assertEqual(stats.avgRating, 3.5)
+        self.assertEqual(stats.get_histogram(), {1: 0, 2: 1, 3: 0, 4: 0, 5: 1})
+    
+    def test_stats_follow_orm_update(self):
+        """Test that changing a loaded review's rating moves it between buckets."""
+        review = Review.objects.get(user=self.users[1])
+        review.rating = 3
+        review.save()
+        
+        stats = ReviewStats.objects.get(diningHall=self.hall)
+        self.assertEqual(stats.get_histogram(), {1: 0, 2: 0, 3: 1, 4: 0, 5: 1})
+        self.assertEqual(stats.ratingSum, 8)
+    
+    def test_stats_follow_cascade_delete(self):
+        """Test that deleting a user removes their review from the aggregates."""
+        self.users[0].delete()
+        
+        stats = ReviewStats.objects.get(diningHall=self.hall)
+        self.assertEqual((stats.reviewCount, stats.ratingSum), (1, 2))
+    
+    def test_stats_follow_save_of_unloaded_instance(self):
+        """Test that saving a review built by hand with an existing pk updates it, not adds one."""
+        existing = Review.objects.get(user=self.users[1])
+        Review(
+            pk=existing.pk, user=self.users[1], diningHall=self.hall, reviewText='B', rating=4,
+            createdAt=existing.createdAt,
+        ).save()
+        
+        stats = ReviewStats.objects.get(diningHall=self.hall)
+        self.assertEqual((stats.reviewCount, stats.ratingSum), (2, 9))
+        self.assertEqual(stats.get_histogram(), {1: 0, 2: 0, 3: 0, 4: 1, 5: 1})
+    
+    def test_stats_follow_delete_of_unloaded_instance(self):
+        """Test that deleting a review built by hand removes its stored rating."""
+        existing = Review.objects.get(user=self.users[1])
+        Review(pk=existing.pk, diningHall=self.hall, rating=5).delete()
+        
+        stats = ReviewStats.objects.get(diningHall=self.hall)
+        self.assertEqual((stats.reviewCount, stats.ratingSum, stats.rating5), (1, 5, 1))
+    
+    def test_rating_change_without_stats_row(self):
+        """Test that changing a rating when the aggregate row is missing rebuilds it."""
+        ReviewStats.objects.filter(diningHall=self.hall).delete()
+        review = Review.objects.get(user=self.users[1])
+        review.rating = 4
+        review.save()
+        
+        stats = ReviewStats.objects.get(diningHall=self.hall)
+        self.assertEqual((stats.reviewCount, stats.ratingSum, stats.rating2, stats.rating4), (2, 9, 0, 1))
+    
+    def test_stats_follow_save_with_deferred_rating(self):
+        """Test that saving a review loaded without its rating updates it, not adds one."""
+        review = Review.objects.only('id', 'user', 'diningHall').get(user=self.users[1])
+        review.reviewText = 'Better now'
+        review.save()
+        
+        stats = ReviewStats.objects.get(diningHall=self.hall)
+        self.assertEqual((stats.reviewCount, stats.ratingSum), (2, 7))
+    
+    def test_hall_delete_with_reviews(self):
+        """Test that deleting a hall removes its reviews and aggregates."""
+        self.hall.delete()
+        
+        self.assertFalse(ReviewStats.objects.exists())
+        self.assertFalse(Review.objects.exists())
+    
+    def test_rebuild_matches_reviews(self):
+        """Test recomputing aggregates from the Review table."""
+        ReviewStats.objects.filter(diningHall=self.hall).update(reviewCount=0, ratingSum=0, rating5=0)
+        ReviewStats.rebuild()
+        
+        stats = ReviewStats.objects.get(diningHall=self.hall)
+        self.assertEqual((stats.reviewCount, stats.ratingSum, stats.rating5), (2, 7, 1))
+
 
 class MealHistoryViewTest(TestCase):
     """Test cases for meal history views."""
@@ -975,7 +1808,7 @@ class AIAssistantViewTest(TestCase):
         self.assertEqual(response.status_code, 302)
         self.assertIn('login', response.url)
     
-    @patch('menus.views.get_recommendations_for_all_dining')
+    @patch('menus.views.get_recommendations_for_all_dining_async')
     def test_ai_assistant_authenticated(self, mock_recommendations):
         """Test AI assistant when authenticated."""
         self.client.login(username='testuser', password='testpass123')
@@ -1024,3 +1857,167 @@ class AIAssistantViewTest(TestCase):
         
         response = self.client.get(reverse('ai_assistant'))
         self.assertEqual(response.status_code, 405)  # Method not allowed
+
+
+class FakeLLMServer:
+    """
+    Local OpenAI-compatible chat completions server for tests.
+    Answers every request with `content` after `delay` seconds and records
+    the most requests it had in flight at once.
+    """
+
+    def __init__(self):
+        import threading
+        from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+        self.content = '{"berkshire": ["B1"]}'
+        self.delay = 0
+        self.inFlight = self.maxInFlight = self.requests = 0
+        lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                with lock:
+                    server.requests += 1
+                    server.inFlight += 1
+                    server.maxInFlight = max(server.maxInFlight, server.inFlight)
+                try:
+                    time.sleep(server.delay)
+                    body = json.dumps({
+                        'id': 'fake', 'object': 'chat.completion', 'created': 0, 'model': 'fake',
+                        'choices': [{
+                            'index': 0, 'finish_reason': 'stop',
+                            'message': {'role': 'assistant', 'content': server.content},
+                        }],
+                    }).encode()
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # The client gave up (deadline tests)
+                finally:
+                    with lock:
+                        server.inFlight -= 1
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}/v1'
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class AIAssistantAsyncTest(TestCase):
+    """Test cases for the async AI assistant against a local fake LLM server."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.llm = FakeLLMServer()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.llm.close()
+        super().tearDownClass()
+
+    def setUp(self):
+        from openai import AsyncOpenAI
+        import recommendation
+        import weakref
+
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        DiningHall.objects.create(
+            hallName='Berkshire',
+            meals={'breakfast': [{'name': 'Oatmeal', 'calories': 150, 'allergens': [], 'dietTags': []}]}
+        )
+        self.llm.delay = 0
+        self.llm.maxInFlight = self.llm.requests = 0
+        recommendation.rank_cache.clear()
+        self.addCleanup(recommendation.rank_cache.clear)
+        for name, value in {
+            'async_client': AsyncOpenAI(base_url=self.llm.url, api_key='test', max_retries=0),
+            '_llm_semaphores': weakref.WeakKeyDictionary(),
+            '_current_meal_keys': lambda: ['breakfast'],
+        }.items():
+            patcher = patch.object(recommendation, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def ask(self, message):
+        return await self.async_client.post(
+            reverse('ai_assistant'), json.dumps({'message': message}), content_type='application/json'
+        )
+
+    async def test_answer_from_llm(self):
+        """Test that the endpoint returns the LLM's ranking."""
+        await self.async_client.aforce_login(self.user)
+        response = await self.ask('something warm')
+
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertTrue(data['success'])
+        self.assertEqual(data['recommendations']['berkshire'], ['Oatmeal'])
+        self.assertEqual(self.llm.requests, 1)
+
+    async def test_deadline(self):
+        """Test that a slow LLM gets a 504 once the deadline passes."""
+        await self.async_client.aforce_login(self.user)
+        self.llm.delay = 1
+        start = time.perf_counter()
+        with patch('recommendation.LLM_DEADLINE_SECONDS', 0.2), patch('recommendation.RECOMMENDATION_RANKER', 'llm'):
+            response = await self.ask('something warm')
+
+        self.assertEqual(response.status_code, 504)
+        self.assertFalse(json.loads(response.content)['success'])
+        self.assertLess(time.perf_counter() - start, 0.9)
+
+    async def test_concurrency_limit(self):
+        """Test that in-flight LLM calls are capped while other views keep being served."""
+        await self.async_client.aforce_login(self.user)
+        self.llm.delay = 0.3
+
+        async def timed_menu_request():
+            await asyncio.sleep(0.05)
+            start = time.perf_counter()
+            response = await self.async_client.get(reverse('menu'))
+            return response, time.perf_counter() - start
+
+        with patch('recommendation.LLM_MAX_CONCURRENCY', 2):
+            *answers, (menu_response, menu_seconds) = await asyncio.gather(
+                *(self.ask(f'request {i}') for i in range(5)), timed_menu_request()
+            )
+
+        self.assertTrue(all(response.status_code == 200 for response in answers))
+        self.assertEqual(self.llm.requests, 5)
+        self.assertEqual(self.llm.maxInFlight, 2)
+        self.assertEqual(menu_response.status_code, 200)
+        self.assertLess(menu_seconds, 0.3)
+
+    async def test_lexical_fallback_and_hedge(self):
+        """Test that the lexical ranker answers when the LLM times out or loses the hedge race."""
+        await self.async_client.aforce_login(self.user)
+        self.llm.delay = 1
+
+        with patch('recommendation.LLM_DEADLINE_SECONDS', 0.2), patch('recommendation.RECOMMENDATION_RANKER', 'fallback'):
+            response = await self.ask('warm oatmeal')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['recommendations']['berkshire'], ['Oatmeal'])
+
+        start = time.perf_counter()
+        with patch('recommendation.LLM_HEDGE_SECONDS', 0.1), patch('recommendation.RECOMMENDATION_RANKER', 'hedge'):
+            response = await self.ask('some oatmeal')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['recommendations']['berkshire'], ['Oatmeal'])
+        self.assertLess(time.perf_counter() - start, 0.9)
+        # The losing LLM call is cancelled, not left pending on the loop
+        await asyncio.sleep(0)
+        self.assertEqual(asyncio.all_tasks() - {asyncio.current_task()}, set())
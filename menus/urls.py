@@ -6,10 +6,16 @@ urlpatterns = [
     # Page views
     path('', views.menu_view, name='menu'),
     path('recommendations/', views.recommendations_view, name='recommendations'),
+    path('recommendations/dishes/', views.top_dishes, name='top_dishes'),
+    path('recommendations/week/', views.week_plan, name='week_plan'),
+    path('recommendations/meal-plan/', views.meal_plan, name='meal_plan'),
+    path('recommendations/similar/<int:dish_id>/', views.similar_dishes, name='similar_dishes'),
+    path('recommendations/similar/history/', views.similar_to_history, name='similar_to_history'),
     
     # Review API endpoints (AJAX only)
     path('review/<int:hall_id>/', views.submit_review, name='submit_review'),
     path('review/<int:hall_id>/delete/', views.delete_review, name='delete_review'),
+    path('review/<int:hall_id>/list/', views.list_reviews, name='list_reviews'),
     
     # Meal History API endpoints
     path('history/', views.get_meal_history, name='meal_history'),
@@ -1,14 +1,62 @@
+from asgiref.sync import sync_to_async
 from django.http import JsonResponse
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from datetime import datetime, timedelta
 from django.views.decorators.http import require_http_methods
+import base64
+import heapq
 import json
 import os
-import copy
+from itertools import islice
+from collections.abc import Mapping
 from django.conf import settings
-from .models import DiningHall, Review, UserProfile, MealHistory, ALLERGEN_CHOICES, DIET_CHOICES
-from recommendation import get_recommendations_for_all_dining
+from django.db import transaction
+from django.db.models import Q, F, Window
+from django.db.models.functions import RowNumber
+from django.utils.dateparse import parse_datetime
+from .models import (
+    DiningHall, Review, ReviewStats, UserProfile, MealHistory, MenuItem,
+    ALLERGEN_CHOICES, DIET_CHOICES, get_allergen_mask, get_diet_mask, get_item_masks
+)
+from .artifacts import artifact_counters
+from .cache import get_menu_snapshot, LRUCache
+from .snapshot import build_meal_indexes
+from .precompute import StoredSummaries
+from .planner import meal_options, combine_meals, pick_plan
+from .collab import get_dish_factors
+from .similarity import SimilarityIndex, unpack_signature
+from .schedule import parse_window, window_contains, minute_of_day, default_meal_type
+from . import scoring
+from .scoring import ScoringEngine, ProfileBatch, OPEN_HALL_BONUS
+from recommendation import get_recommendations_for_all_dining_async, LLMTimeoutError
+
+
+# Reviews shipped with the menu page per hall; the rest are loaded from the reviews API
+REVIEW_PAGE_SIZE = 10
+MAX_REVIEW_PAGE_SIZE = 50
+
+# Dishes returned by the top-dishes API (per-hall rankings keep MAX_TOP_DISHES each)
+TOP_DISHES = 10
+MAX_TOP_DISHES = 50
+
+# Filter/score results shared by every user with the same preference profile
+filtered_menu_cache = LRUCache(maxsize=getattr(settings, 'FILTERED_MENU_CACHE_SIZE', 512))
+
+# Per-meal summaries and dish rankings, keyed by the MealIndex they come from
+meal_artifact_cache = LRUCache(maxsize=getattr(settings, 'MEAL_ARTIFACT_CACHE_SIZE', 4096))
+
+# Vectorized scoring engines per (menu version, date)
+scoring_engine_cache = LRUCache(maxsize=8)
+
+# Ingredient similarity indexes per menu version
+similarity_index_cache = LRUCache(maxsize=2)
+
+# Minimum estimated ingredient similarity for "more like this" results
+SIMILAR_DISH_THRESHOLD = 0.25
+
+# Neutral (3-star) reviews blended into each hall's rating for the AI assistant's pre-ranking
+HALL_QUALITY_PRIOR_REVIEWS = 5
 
 
 # ============== Load Menu Data from Database ==============
@@ -16,7 +64,8 @@ from recommendation import get_recommendations_for_all_dining
 def get_menu_data_from_db():
     """Load dining hall menu data from database."""
     try:
-        halls = DiningHall.objects.all()
+        halls = list(DiningHall.objects.all())
+        dishes_by_id = get_dishes_for_halls(halls)
         dining_halls = []
         
         for hall in halls:
@@ -25,7 +74,7 @@ def get_menu_data_from_db():
                 "hallName": hall.hallName,
                 "hours": hall.hours,
                 "mealHours": hall.mealHours,
-                "meals": hall.meals or {"breakfast": [], "lunch": [], "dinner": []}
+                "meals": hall.get_resolved_meals(dishes_by_id) or {"breakfast": [], "lunch": [], "dinner": []}
             })
         
         return {
@@ -57,33 +106,20 @@ def get_menu_data_from_db():
         return {"diningHalls": [], "allergenCategories": [], "dietCategories": []}
 
 
-# Cache the menu data
-_cached_menu_data = None
-
-def get_menu_data():
-    """Get cached menu data or load from database."""
-    global _cached_menu_data
-    if _cached_menu_data is None:
-        _cached_menu_data = get_menu_data_from_db()
-    return _cached_menu_data
-
-
-def clear_menu_cache():
-    """Clear the menu data cache to force reload from database."""
-    global _cached_menu_data
-    _cached_menu_data = None
+def get_dishes_for_halls(halls):
+    """Fetch every dish referenced by the halls' meals with a single query."""
+    dish_ids = set()
+    for hall in halls:
+        dish_ids |= hall.get_dish_ids()
+    return MenuItem.objects.in_bulk(dish_ids) if dish_ids else {}
 
 
 def is_hall_open(hours_str):
     """Check if dining hall is currently open based on hours string."""
-    try:
-        start_str, end_str = hours_str.split('-')
-        start_time = datetime.strptime(start_str, '%H:%M').time()
-        end_time = datetime.strptime(end_str, '%H:%M').time()
-        current_time = datetime.now().time()
-        return start_time <= current_time <= end_time
-    except Exception:
+    window = parse_window(hours_str)
+    if window is None:
         return False
+    return window_contains(window, minute_of_day(datetime.now().time()))
 
 
 def is_weekend():
@@ -94,31 +130,26 @@ def is_weekend():
 def get_current_meal_type():
     """Get current meal type based on time. Returns lunch if weekend and before 15:00."""
     now = datetime.now()
-    current_time = now.time()
     
     # No breakfast on weekends
-    if is_weekend():
-        if current_time < datetime.strptime("15:00", "%H:%M").time():
-            return "lunch"
-        else:
-            return "dinner"
-    
-    # Weekday logic
-    if current_time < datetime.strptime("10:30", "%H:%M").time():
-        return "breakfast"
-    elif current_time < datetime.strptime("15:00", "%H:%M").time():
-        return "lunch"
-    else:
-        return "dinner"
+    return default_meal_type(minute_of_day(now.time()), weekend=is_weekend())
 
 
-def filter_meals_for_user(meals, user_allergens=None, user_diet_prefs=None):
-    """Filter meals based on user preferences."""
+def filter_meals_for_user(meals, user_allergens=None, user_diet_prefs=None, indexes=None):
+    """
+    Filter meals based on user preferences.
+    Pass the meals' {meal_type: MealIndex} (snapshot menus carry them) to avoid rebuilding it.
+    """
     filtered = {"breakfast": [], "lunch": [], "dinner": []}
+    if indexes is None:
+        indexes = build_meal_indexes(meals)
+    user_allergen_mask = get_allergen_mask(user_allergens)
     
     for meal_type in ["breakfast", "lunch", "dinner"]:
-        items = meals.get(meal_type, [])
-        for item in items:
+        index = indexes[meal_type]
+        # Skip items with user's allergens; plain string items are always kept
+        kept = index.safe_dishes(user_allergen_mask) | index.strings
+        for item in index.items_at(kept):
             # Handle both old format (string) and new format (dict)
             if isinstance(item, str):
                 filtered[meal_type].append({
@@ -130,11 +161,6 @@ def filter_meals_for_user(meals, user_allergens=None, user_diet_prefs=None):
                     "weeklySelections": 0
                 })
             else:
-                # Check allergens - skip items containing user's allergens
-                item_allergens = item.get("allergens", [])
-                if user_allergens and any(a in item_allergens for a in user_allergens):
-                    continue  # Skip items with user's allergens
-                
                 filtered[meal_type].append(item)
     
     return filtered
@@ -147,6 +173,8 @@ def calculate_hall_score(hall_data, user_allergens=None, user_diet_prefs=None):
     total_matching_items = 0
     total_calories = 0
     preference_matches = 0
+    user_allergen_mask = get_allergen_mask(user_allergens)
+    user_diet_mask = get_diet_mask(user_diet_prefs)
     
     meals = hall_data.get("meals", {})
     current_meal = get_current_meal_type()
@@ -156,16 +184,15 @@ def calculate_hall_score(hall_data, user_allergens=None, user_diet_prefs=None):
         for item in items:
             total_items += 1
             
-            if isinstance(item, dict):
+            if isinstance(item, Mapping):
                 # Check allergens - skip if has user's allergens
-                item_allergens = item.get("allergens", [])
-                if user_allergens and any(a in item_allergens for a in user_allergens):
+                item_allergen_mask, item_diet_mask = get_item_masks(item)
+                if item_allergen_mask & user_allergen_mask:
                     continue
                 
                 # Add points for diet preference matches (use dietCategories or dietTags)
-                item_diet_categories = item.get("dietCategories", []) or item.get("dietTags", [])
                 if user_diet_prefs:
-                    matches = sum(1 for d in user_diet_prefs if d in item_diet_categories)
+                    matches = (item_diet_mask & user_diet_mask).bit_count()
                     if matches > 0:
                         preference_matches += 1
                     score += matches * 10
@@ -178,7 +205,7 @@ def calculate_hall_score(hall_data, user_allergens=None, user_diet_prefs=None):
     
     # Bonus for being open
     if hall_data.get("isOpen"):
-        score += 50
+        score += OPEN_HALL_BONUS
     
     # Bonus for having more matching items
     score += total_matching_items * 5
@@ -192,11 +219,81 @@ def calculate_hall_score(hall_data, user_allergens=None, user_diet_prefs=None):
     return score, total_matching_items, total_calories, match_rate
 
 
-def get_dining_halls_data(current_user=None, include_filtered=False):
-    """Load dining hall data from database with reviews."""
+def review_to_dict(review, current_user=None):
+    """Serialize a review (with user selected) for templates and JSON responses."""
+    return {
+        "id": review.id,
+        "userId": review.user.id,
+        "username": review.user.username,
+        "rating": review.rating,
+        "reviewText": review.reviewText,
+        "foodPreferences": review.foodPreferences,
+        "createdAt": review.createdAt.strftime("%Y-%m-%d %H:%M"),
+        "updatedAt": review.updatedAt.strftime("%Y-%m-%d %H:%M"),
+        "isOwner": bool(current_user and current_user.is_authenticated and review.user.id == current_user.id),
+    }
+
+
+def encode_review_cursor(review):
+    """Opaque keyset cursor for the position just after this review."""
+    payload = json.dumps([review.createdAt.isoformat(), review.id])
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+
+def decode_review_cursor(cursor):
+    """Decode a cursor into (createdAt, id). Raises ValueError if it is malformed."""
     try:
-        # Load dining halls from database
-        db_halls = DiningHall.objects.all()
+        created_at, review_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        created_at = parse_datetime(created_at)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if created_at is None or not isinstance(review_id, int):
+        raise ValueError("Invalid cursor")
+    return created_at, review_id
+
+
+def get_reviews_page(hall_id, cursor=None, limit=REVIEW_PAGE_SIZE):
+    """
+    Get one page of a hall's reviews, newest first, using keyset pagination.
+    
+    Args:
+        hall_id: DiningHall ID
+        cursor: Optional cursor from a previous page
+        limit: Page size
+    
+    Returns:
+        (reviews, next_cursor) where next_cursor is None on the last page
+    """
+    reviews = Review.objects.filter(diningHall_id=hall_id).select_related('user').order_by('-createdAt', '-id')
+    if cursor:
+        created_at, review_id = decode_review_cursor(cursor)
+        reviews = reviews.filter(Q(createdAt__lt=created_at) | Q(createdAt=created_at, id__lt=review_id))
+    
+    # Fetch one extra row to know whether another page exists
+    page = list(reviews[:limit + 1])
+    if len(page) > limit:
+        return page[:limit], encode_review_cursor(page[limit - 1])
+    return page, None
+
+
+def get_dining_halls_data(current_user=None, include_filtered=False, snapshot=None, include_reviews=True,
+                          review_limit=None, profile=None, include_scores=True):
+    """
+    Load dining hall data from database with reviews.
+    Ratings come from ReviewStats; review lists are only loaded when include_reviews is set,
+    and review_limit caps them to the newest N per hall (see reviewsCursor for the next page).
+    Pass the user's profile if the caller already loaded it to avoid fetching it again.
+    Set include_scores=False to skip the whole-day hall scores when the caller scores meals itself.
+    """
+    try:
+        # Shared, read-only menu data for every hall
+        snapshot = snapshot or get_menu_snapshot()
+        # Which halls are open, recomputed only at the next opening/closing time
+        open_halls = snapshot.schedule.status(datetime.now()).openHalls
+        
+        # Vectorized hall scores for this user (None without NumPy)
+        engine = get_scoring_engine(snapshot) if include_scores else None
+        hall_scores = None
         
         response = []
         
@@ -207,68 +304,87 @@ def get_dining_halls_data(current_user=None, include_filtered=False):
         
         if current_user and current_user.is_authenticated:
             try:
-                profile = UserProfile.objects.get(user=current_user)
+                if profile is None:
+                    profile = UserProfile.objects.get(user=current_user)
                 user_allergens = profile.allergens or []
                 user_diet_prefs = profile.dietPreferences or []
                 calorie_target = profile.calorieTarget or 2000
             except UserProfile.DoesNotExist:
                 pass
+        
+        if engine is not None:
+            hall_scores = engine.hall_scores(ProfileBatch([(user_allergens, user_diet_prefs)]), open_halls)
 
-        for db_hall in db_halls:
-            hall_id = db_hall.id
-            hall_name = db_hall.hallName
-            
-            # Get reviews from database for this hall
-            reviews_data = []
-            user_review = None
-            
-            try:
-                reviews = Review.objects.filter(diningHall=db_hall).select_related('user')
-                for review in reviews:
-                    review_dict = {
-                        "id": review.id,
-                        "userId": review.user.id,
-                        "username": review.user.username,
-                        "rating": review.rating,
-                        "reviewText": review.reviewText,
-                        "foodPreferences": review.foodPreferences,
-                        "createdAt": review.createdAt.strftime("%Y-%m-%d %H:%M"),
-                        "updatedAt": review.updatedAt.strftime("%Y-%m-%d %H:%M"),
-                        "isOwner": current_user and current_user.is_authenticated and review.user.id == current_user.id,
-                    }
-                    reviews_data.append(review_dict)
-                    
-                    if current_user and current_user.is_authenticated and review.user.id == current_user.id:
-                        user_review = review_dict
-            except Exception as e:
-                print(f"Error getting reviews for {hall_name}: {e}")
-            
-            # Calculate average rating
-            avg_rating = sum(r["rating"] for r in reviews_data) / len(reviews_data) if reviews_data else 0
+        # Review aggregates for every hall, maintained by ReviewStats (no scan of Review)
+        stats_by_hall = {stats.diningHall_id: stats for stats in ReviewStats.objects.all()}
+        
+        # The current user's own reviews
+        user_reviews = {}
+        if current_user and current_user.is_authenticated:
+            for review in Review.objects.filter(user=current_user).select_related('user'):
+                user_reviews[review.diningHall_id] = review_to_dict(review, current_user)
+        
+        # Review lists, only for pages that display them
+        reviews_by_hall = {}
+        cursors_by_hall = {}
+        if include_reviews:
+            reviews = Review.objects.select_related('user').order_by('diningHall_id', '-createdAt', '-id')
+            if review_limit is not None:
+                # Newest review_limit + 1 per hall in one query; the extra row means there are more
+                reviews = reviews.annotate(row=Window(
+                    RowNumber(),
+                    partition_by=[F('diningHall_id')],
+                    order_by=[F('createdAt').desc(), F('id').desc()],
+                )).filter(row__lte=review_limit + 1)
+            last_shipped = {}
+            for review in reviews:
+                hall_reviews = reviews_by_hall.setdefault(review.diningHall_id, [])
+                if review_limit is not None and len(hall_reviews) == review_limit:
+                    cursors_by_hall[review.diningHall_id] = encode_review_cursor(last_shipped[review.diningHall_id])
+                    continue
+                hall_reviews.append(review_to_dict(review, current_user))
+                last_shipped[review.diningHall_id] = review
+
+        for menu_hall in snapshot.halls:
+            hall_id = menu_hall.id
+            hall_name = menu_hall.hallName
+            stats = stats_by_hall.get(hall_id)
             
-            # Get meals from database
-            # IMPORTANT: Create a deep copy to avoid modifying the original data
-            all_meals = copy.deepcopy(db_hall.meals) if db_hall.meals else {"breakfast": [], "lunch": [], "dinner": []}
-            filtered_meals = filter_meals_for_user(all_meals, user_allergens, user_diet_prefs) if include_filtered else copy.deepcopy(all_meals)
+            # Snapshot meals are immutable tuples of shared Dish records, so no copy is needed
+            all_meals = menu_hall.meals
+            filtered_meals = (
+                filter_meals_for_user(all_meals, user_allergens, user_diet_prefs, menu_hall.indexes)
+                if include_filtered else all_meals
+            )
             
             hall_data = {
                 "id": hall_id,
                 "hallName": hall_name,
-                "hours": db_hall.hours,
-                "mealHours": db_hall.mealHours or {},
-                "isOpen": is_hall_open(db_hall.hours),
-                "meals": all_meals,  # This is now a deep copy, safe from modification
+                "hours": menu_hall.hours,
+                "mealHours": menu_hall.mealHours,
+                "isOpen": hall_id in open_halls,
+                "meals": all_meals,
                 "filteredMeals": filtered_meals,
-                "reviews": reviews_data,
-                "avgRating": round(avg_rating, 1),
-                "reviewCount": len(reviews_data),
-                "userReview": user_review,
+                "reviews": reviews_by_hall.get(hall_id, []),
+                "reviewsCursor": cursors_by_hall.get(hall_id),
+                "avgRating": stats.avgRating if stats else 0,
+                "reviewCount": stats.reviewCount if stats else 0,
+                "ratingHistogram": stats.get_histogram() if stats else {rating: 0 for rating in range(1, 6)},
+                "userReview": user_reviews.get(hall_id),
             }
             
+            if not include_scores:
+                response.append(hall_data)
+                continue
+            
             # Calculate recommendation score
-            score, matching_items, total_calories, match_rate = calculate_hall_score(
-                hall_data, user_allergens, user_diet_prefs
-            )
+            if hall_scores is not None:
+                index = engine.hallIndex[hall_id]
+                score, matching_items, total_calories, match_rate = (int(values[index, 0]) for values in hall_scores)
+            else:
+                score, matching_items, total_calories, match_rate = calculate_hall_score(
+                    hall_data, user_allergens, user_diet_prefs
+                )
             hall_data["score"] = score
             hall_data["matchingItems"] = matching_items
             hall_data["estimatedCalories"] = total_calories
@@ -299,18 +415,19 @@ def calculate_meal_specific_score(hall_data, meal_type, user_allergens=None, use
     safe_items = 0  # Items without user's allergens
     diet_matched_items = 0  # Items matching diet preferences
     total_items = 0
+    user_allergen_mask = get_allergen_mask(user_allergens)
+    user_diet_mask = get_diet_mask(user_diet_prefs)
     
     meals = hall_data.get("meals", {})
     items = meals.get(meal_type, [])
     
     for item in items:
         total_items += 1
-        if isinstance(item, dict):
+        if isinstance(item, Mapping):
             # Check allergens - skip items with user's allergens
-            item_allergens = item.get("allergens", [])
-            has_allergen = user_allergens and any(a in item_allergens for a in user_allergens)
+            item_allergen_mask, item_diet_mask = get_item_masks(item)
             
-            if has_allergen:
+            if item_allergen_mask & user_allergen_mask:
                 continue  # Skip unsafe items
             
             # Item is safe
@@ -318,9 +435,8 @@ def calculate_meal_specific_score(hall_data, meal_type, user_allergens=None, use
             score += 10  # Base points for safe item
             
             # Check diet preference matches (support both dietCategories and dietTags)
-            item_diet_categories = item.get("dietCategories", []) or item.get("dietTags", [])
-            if user_diet_prefs and item_diet_categories:
-                diet_matches = sum(1 for d in user_diet_prefs if d in item_diet_categories)
+            if user_diet_prefs and item_diet_mask:
+                diet_matches = (item_diet_mask & user_diet_mask).bit_count()
                 if diet_matches > 0:
                     diet_matched_items += 1
                     score += diet_matches * 15  # Significant bonus for diet match
@@ -331,7 +447,7 @@ def calculate_meal_specific_score(hall_data, meal_type, user_allergens=None, use
     
     # Bonus for being open
     if hall_data.get("isOpen"):
-        score += 50
+        score += OPEN_HALL_BONUS
     
     # Variety bonus - reward halls with more safe options
     score += safe_items * 2
@@ -374,26 +490,24 @@ def filter_meals_by_preferences(meals, user_allergens, user_diet_prefs):
         'lunch': [],
         'dinner': []
     }
+    user_allergen_mask = get_allergen_mask(user_allergens)
+    user_diet_mask = get_diet_mask(user_diet_prefs)
     
     for meal_type in ['breakfast', 'lunch', 'dinner']:
         items = meals.get(meal_type, [])
         
         for item in items:
-            if isinstance(item, dict):
+            if isinstance(item, Mapping):
                 # Check 1: Allergen safety (MUST PASS)
-                item_allergens = item.get('allergens', [])
-                has_allergen = user_allergens and any(a in item_allergens for a in user_allergens)
+                # Masks cover both dietCategories (from scraped data) and dietTags (from old format)
+                item_allergen_mask, item_diet_mask = get_item_masks(item)
                 
-                if has_allergen:
+                if item_allergen_mask & user_allergen_mask:
                     continue  # Skip items with user's allergens
                 
                 # Check 2: Diet preference matching (if user has preferences)
                 if user_diet_prefs:
-                    # Support both dietCategories (from scraped data) and dietTags (from old format)
-                    item_diet_categories = item.get('dietCategories', []) or item.get('dietTags', [])
-                    matches_diet = any(d in item_diet_categories for d in user_diet_prefs)
-                    
-                    if matches_diet:
+                    if item_diet_mask & user_diet_mask:
                         filtered[meal_type].append(item)
                 else:
                     # No diet preferences - include all safe items
@@ -406,6 +520,481 @@ def filter_meals_by_preferences(meals, user_allergens, user_diet_prefs):
     return filtered
 
 
+def summarize_meal(index, user_allergens=None, user_diet_prefs=None):
+    """
+    Filter and score one meal from its inverted tag index.
+    
+    Filtering and counting are set algebra on the index's bitsets, so the cost
+    depends on the user's tags rather than on the number of dishes.
+    
+    Returns:
+        Dict with filtered (tuple of kept items), positions (bitset of kept
+        item positions), mealScore, matchingItems (safe items), calories (of
+        safe dishes) and matchRate
+    """
+    user_allergen_mask = get_allergen_mask(user_allergens)
+    user_diet_mask = get_diet_mask(user_diet_prefs)
+    has_diets = bool(user_diet_prefs)
+    
+    # Universe minus the union of the user's allergen sets...
+    safe = index.safe_dishes(user_allergen_mask)
+    # ...intersected with the union of their diet sets
+    kept = index.matching(safe, user_diet_mask) if has_diets else safe
+    # Simple string items are kept only when no allergens are set
+    if not user_allergens:
+        kept |= index.strings
+    
+    safe_dishes = safe.bit_count()
+    string_items = index.strings.bit_count()
+    safe_items = safe_dishes + string_items
+    total_items = len(index.items)
+    
+    score = safe_dishes * 10 + string_items * 5 + safe_items * 2
+    diet_matched_items = 0
+    if has_diets:
+        diet_matched_items = index.matching(safe, user_diet_mask).bit_count()
+        score += index.diet_match_total(safe, user_diet_mask) * 15
+    calories = sum(item.get('calories', 0) or 0 for item in index.items_at(safe))
+    
+    if total_items > 0:
+        safe_rate = (safe_items / total_items) * 100
+        if has_diets:
+            diet_rate = (diet_matched_items / safe_items * 100) if safe_items > 0 else 0
+            match_rate = int(safe_rate * 0.7 + diet_rate * 0.3)
+        else:
+            match_rate = int(safe_rate)
+        match_rate = min(100, max(0, match_rate))
+    else:
+        match_rate = 0
+    
+    return {
+        'filtered': tuple(index.items_at(kept)),
+        'positions': kept,
+        'mealScore': score,
+        'matchingItems': safe_items,
+        'calories': calories,
+        'matchRate': match_rate,
+    }
+
+
+def score_and_filter_meals(meals, meal_type, user_allergens=None, user_diet_prefs=None, indexes=None):
+    """
+    Filter every meal and score one meal type in a single pass.
+    
+    Gives the same results as filter_meals_by_preferences plus
+    calculate_meal_specific_score (without the open-hall bonus); see summarize_meal.
+    
+    Args:
+        indexes: Optional {meal_type: MealIndex} for meals (snapshot menus carry them);
+            built on the fly when missing
+    
+    Returns:
+        Dict with filteredMeals ({meal_type: [items]}), filteredPositions
+        ({meal_type: bitset of kept item positions}), and for meal_type:
+        mealScore, matchingItems (safe items), calories (of safe dishes) and matchRate
+    """
+    if indexes is None:
+        indexes = build_meal_indexes(meals)
+    summaries = {
+        current_type: summarize_meal(indexes[current_type], user_allergens, user_diet_prefs)
+        for current_type in ('breakfast', 'lunch', 'dinner')
+    }
+    summary = summaries[meal_type]
+    return {
+        'filteredMeals': {current_type: list(s['filtered']) for current_type, s in summaries.items()},
+        'filteredPositions': {current_type: s['positions'] for current_type, s in summaries.items()},
+        'mealScore': summary['mealScore'],
+        'matchingItems': summary['matchingItems'],
+        'calories': summary['calories'],
+        'matchRate': summary['matchRate'],
+    }
+
+
+def get_meal_summary(index, user_allergens, user_diet_prefs, stored=None):
+    """
+    summarize_meal for a snapshot meal, cached per (MealIndex, profile).
+    
+    Snapshot rebuilds keep the MealIndex of every meal that did not change, so
+    after a menu edit only the edited meals miss. On a miss, a matching stored
+    summary (see menus.precompute.StoredSummaries) is used before computing live.
+    
+    Args:
+        user_allergens / user_diet_prefs: Sorted tuples
+        stored: Optional callable returning the stored summary for index, or None
+    """
+    rebuilt = []
+    
+    def compute():
+        summary = stored(index) if stored is not None else None
+        if summary is None:
+            rebuilt.append(index)
+            summary = summarize_meal(index, user_allergens, user_diet_prefs)
+        return summary
+    
+    summary = meal_artifact_cache.get_or_set(('summary', index, user_allergens, user_diet_prefs), compute)
+    artifact_counters.add('mealSummaries', rebuilt=len(rebuilt), reused=1 - len(rebuilt))
+    return summary
+
+
+def get_scoring_engine(snapshot, date_str=None):
+    """NumPy ScoringEngine for the snapshot (dated menus for date_str), or None without NumPy."""
+    if scoring.np is None:
+        return None
+    if snapshot.version is None:
+        return ScoringEngine.from_snapshot(snapshot, date_str)
+    return scoring_engine_cache.get_or_set(
+        (snapshot.version, date_str), lambda: ScoringEngine.from_snapshot(snapshot, date_str)
+    )
+
+
+def get_filtered_hall_menus(snapshot, date_str, meal_type, user_allergens, user_diet_prefs):
+    """
+    Filter and score every hall's menu for one preference profile.
+    
+    Results are cached per (menu version, date, meal type, allergens, diet
+    preferences), so users with the same profile share one entry. On a cache
+    miss each meal comes from get_meal_summary, so only meals edited since the
+    last snapshot are recomputed. Scores exclude OPEN_HALL_BONUS because open
+    status changes during the day.
+    
+    Returns:
+        {hall_id: {'meals', 'filteredMeals', 'filteredCount', 'mealScore', 'matchingItems', 'matchRate'}}
+    """
+    allergens = tuple(sorted(set(user_allergens or [])))
+    diet_prefs = tuple(sorted(set(user_diet_prefs or [])))
+    key = (snapshot.version, date_str, meal_type, allergens, diet_prefs)
+    
+    def compute():
+        # Summaries written offline by precompute_recommendations, loaded on the first miss
+        stored = StoredSummaries(date_str, allergens, diet_prefs)
+        result = {}
+        for hall in snapshot.halls:
+            # Use the dated menu if it lists dishes, otherwise fall back to the hall's meals
+            menu = hall.get_menu(date_str)
+            summaries = {
+                meal: get_meal_summary(index, allergens, diet_prefs, stored.for_hall(hall.id, meal))
+                for meal, index in menu.indexes.items()
+            }
+            result[hall.id] = {
+                'meals': menu.meals,
+                'filteredMeals': {meal: summary['filtered'] for meal, summary in summaries.items()},
+                'filteredCount': {meal: len(summary['filtered']) for meal, summary in summaries.items()},
+                'mealScore': summaries[meal_type]['mealScore'],
+                'matchingItems': summaries[meal_type]['matchingItems'],
+                'matchRate': summaries[meal_type]['matchRate'],
+            }
+        return result
+    
+    if snapshot.version is None:
+        return compute()
+    return filtered_menu_cache.get_or_set(key, compute)
+
+
+def get_ranked_hall_dishes(snapshot, date_str, meal_type, user_allergens, user_diet_prefs):
+    """
+    Each hall's best dishes for one preference profile, best first.
+    
+    Candidates come from the meal's inverted index (safe and, if the user has
+    diet preferences, matching at least one). A dish scores 10 points plus 15
+    per matching diet tag, ties broken by weekly selections. Only the top
+    MAX_TOP_DISHES per hall are kept, selected with a bounded heap. Results are
+    cached like get_filtered_hall_menus and exclude OPEN_HALL_BONUS.
+    
+    Returns:
+        {hall_id: tuple of (score, weeklySelections, Dish) in descending order}
+    """
+    allergens = tuple(sorted(set(user_allergens or [])))
+    diet_prefs = tuple(sorted(set(user_diet_prefs or [])))
+    key = ('dishes', snapshot.version, date_str, meal_type, allergens, diet_prefs)
+    
+    def compute():
+        result = {}
+        for hall in snapshot.halls:
+            menu = hall.get_menu(date_str)
+            result[hall.id] = get_meal_dish_ranking(
+                menu.indexes[meal_type], menu.selections[meal_type], allergens, diet_prefs
+            )
+        return result
+    
+    if snapshot.version is None:
+        return compute()
+    return filtered_menu_cache.get_or_set(key, compute)
+
+
+def get_meal_dish_ranking(index, selections, user_allergens, user_diet_prefs):
+    """
+    One meal's top MAX_TOP_DISHES dishes for a profile, cached per
+    (MealIndex, selections, profile) like get_meal_summary.
+    
+    Returns:
+        Tuple of (score, weeklySelections, Dish) in descending order
+    """
+    rebuilt = []
+    
+    def compute():
+        rebuilt.append(index)
+        allergen_mask = get_allergen_mask(user_allergens)
+        diet_mask = get_diet_mask(user_diet_prefs)
+        candidates = index.safe_dishes(allergen_mask)
+        if user_diet_prefs:
+            candidates = index.matching(candidates, diet_mask)
+        
+        # A dish listed more than once in a meal is ranked once, with its highest selections
+        scored = {}
+        for position, dish in index.entries_at(candidates):
+            _, dish_diet_mask = get_item_masks(dish)
+            entry = (10 + (dish_diet_mask & diet_mask).bit_count() * 15, selections[position] or 0, dish)
+            # Hand-entered dishes have no catalog ID, so they are told apart by name
+            dish_key = dish['id'] if dish['id'] is not None else dish['name']
+            previous = scored.get(dish_key)
+            if previous is None or entry[1] > previous[1]:
+                scored[dish_key] = entry
+        return tuple(heapq.nlargest(MAX_TOP_DISHES, scored.values(), key=_dish_rank_key))
+    
+    ranking = meal_artifact_cache.get_or_set(
+        ('ranking', index, selections, user_allergens, user_diet_prefs), compute
+    )
+    artifact_counters.add('dishRankings', rebuilt=len(rebuilt), reused=1 - len(rebuilt))
+    return ranking
+
+
+def _dish_rank_key(entry):
+    return entry[0], entry[1]
+
+
+def get_top_dishes(snapshot, date_str, meal_type, user_allergens, user_diet_prefs, open_halls, limit=TOP_DISHES):
+    """
+    The best `limit` dishes across all halls.
+    
+    Each hall's cached ranking is already sorted and the open-hall bonus is
+    the same for every dish of a hall, so the overall ranking is a k-way heap
+    merge that stops after MAX_TOP_DISHES entries. The merged list is cached
+    per profile and set of open halls, which only changes at hall
+    transitions, so most requests just slice it.
+    
+    Returns:
+        List of (score, weeklySelections, Dish, HallMenu), best first
+    """
+    allergens = tuple(sorted(set(user_allergens or [])))
+    diet_prefs = tuple(sorted(set(user_diet_prefs or [])))
+    key = ('top-dishes', snapshot.version, date_str, meal_type, allergens, diet_prefs, frozenset(open_halls))
+    
+    def compute():
+        ranked = get_ranked_hall_dishes(snapshot, date_str, meal_type, allergens, diet_prefs)
+        streams = [
+            _hall_dish_stream(ranked[hall.id], hall, OPEN_HALL_BONUS if hall.id in open_halls else 0)
+            for hall in snapshot.halls
+        ]
+        return tuple(islice(heapq.merge(*streams, key=_dish_rank_key, reverse=True), MAX_TOP_DISHES))
+    
+    if snapshot.version is None:
+        return list(compute()[:limit])
+    return list(filtered_menu_cache.get_or_set(key, compute)[:limit])
+
+
+def _hall_dish_stream(entries, hall, bonus):
+    for score, selections, dish in entries:
+        yield score + bonus, selections, dish, hall
+
+
+def top_dish_to_dict(entry, user_diet_mask=0, open_halls=(), personal_scores=None):
+    """
+    Serialize a get_top_dishes entry for the JSON API.
+    personal_scores: optional {dish name: collaborative-filtering score} for the user
+    """
+    score, selections, dish, hall = entry
+    return {
+        **dish_to_dict(dish),
+        "matchedDiets": [
+            tag for tag in dish.get('dietCategories') or [] if get_diet_mask([tag]) & user_diet_mask
+        ],
+        "weeklySelections": selections,
+        "score": score,
+        "personalScore": (personal_scores or {}).get(dish['name']),
+        "hallId": hall.id,
+        "hallName": hall.hallName,
+        "isOpen": hall.id in open_halls,
+    }
+
+
+def resolve_meal_type(meal_param, weekend):
+    """Meal type from a ?meal= parameter, or the current meal; no breakfast on weekends."""
+    if meal_param == 'breakfast' and weekend:
+        return 'lunch'  # Default to lunch on weekend
+    if meal_param in ['breakfast', 'lunch', 'dinner']:
+        return meal_param
+    return get_current_meal_type()
+
+
+def get_week_plan(snapshot, user_allergens, user_diet_prefs):
+    """
+    Ranked halls and their safe dishes for every (date, meal) in menuByDate.
+    
+    Built in one pass over the snapshot's dated menus. Each hall's meal comes
+    from get_meal_summary, so the per-meal work is shared with the
+    recommendations page and survives edits to other halls and days. Halls are
+    ranked like recommendations_view (match rate, then score) without
+    OPEN_HALL_BONUS, which only applies to the current moment. The plan is
+    cached per (menu version, allergens, diet preferences).
+    
+    Returns:
+        JSON-ready list of {'date', 'dateDisplay', 'dayOfWeek', 'isWeekend',
+        'meals': {meal_type: [hall entries, best first]}} ordered by date;
+        meals no hall serves that day are left out
+    """
+    allergens = tuple(sorted(set(user_allergens or [])))
+    diet_prefs = tuple(sorted(set(user_diet_prefs or [])))
+    key = ('week', snapshot.version, allergens, diet_prefs)
+    
+    def compute():
+        # Dishes repeat across days and halls, so each one is serialized once
+        dish_dicts = {}
+        
+        def serialize(item):
+            if id(item) not in dish_dicts:
+                dish_dicts[id(item)] = dish_to_dict(item)
+            return dish_dicts[id(item)]
+        
+        days = {}
+        for hall in snapshot.halls:
+            for day in hall.days:
+                plan_day = days.get(day.date)
+                if plan_day is None:
+                    plan_day = days[day.date] = {
+                        'date': day.date,
+                        'dateDisplay': day.dateDisplay,
+                        'dayOfWeek': day.dayOfWeek,
+                        'isWeekend': day.isWeekend,
+                        'meals': {},
+                    }
+                for meal_type, index in day.indexes.items():
+                    if not index.items:
+                        continue
+                    summary = get_meal_summary(index, allergens, diet_prefs)
+                    plan_day['meals'].setdefault(meal_type, []).append({
+                        'hallId': hall.id,
+                        'hallName': hall.hallName,
+                        'mealScore': summary['mealScore'],
+                        'matchRate': summary['matchRate'],
+                        'matchingItems': summary['matchingItems'],
+                        'filteredCount': len(summary['filtered']),
+                        'dishes': [serialize(item) for item in summary['filtered']],
+                    })
+        
+        plan = []
+        for date_str in sorted(days):
+            plan_day = days[date_str]
+            meals = plan_day['meals']
+            plan_day['meals'] = {
+                meal_type: sorted(meals[meal_type], key=_week_plan_rank_key, reverse=True)
+                for meal_type in ('breakfast', 'lunch', 'dinner') if meal_type in meals
+            }
+            plan.append(plan_day)
+        return plan
+    
+    if snapshot.version is None:
+        return compute()
+    return filtered_menu_cache.get_or_set(key, compute)
+
+
+def _week_plan_rank_key(entry):
+    return entry['matchRate'], entry['mealScore']
+
+
+def get_meal_calorie_options(index, user_allergens, user_diet_prefs):
+    """
+    planner.meal_options over one meal's safe, diet-matching dishes, cached
+    per (MealIndex, profile) like get_meal_summary.
+    """
+    rebuilt = []
+    
+    def compute():
+        rebuilt.append(index)
+        summary = get_meal_summary(index, user_allergens, user_diet_prefs)
+        return meal_options(summary['filtered'], user_diet_prefs)
+    
+    options = meal_artifact_cache.get_or_set(('calories', index, user_allergens, user_diet_prefs), compute)
+    artifact_counters.add('calorieOptions', rebuilt=len(rebuilt), reused=1 - len(rebuilt))
+    return options
+
+
+def get_calorie_plan_table(snapshot, date_str, user_allergens, user_diet_prefs):
+    """
+    planner.combine_meals over every hall's menus for a date: the best day per
+    calorie bucket for one preference profile. The table answers any calorie
+    target and is cached per (menu version, date, allergens, diet preferences).
+    """
+    allergens = tuple(sorted(set(user_allergens or [])))
+    diet_prefs = tuple(sorted(set(user_diet_prefs or [])))
+    key = ('calorie-plan', snapshot.version, date_str, allergens, diet_prefs)
+    
+    def compute():
+        meal_tables = []
+        for meal_type in ('breakfast', 'lunch', 'dinner'):
+            hall_tables = []
+            for hall in snapshot.halls:
+                menu = hall.get_menu(date_str)
+                hall_tables.append((hall, get_meal_calorie_options(menu.indexes[meal_type], allergens, diet_prefs)))
+            meal_tables.append((meal_type, hall_tables))
+        return combine_meals(meal_tables)
+    
+    if snapshot.version is None:
+        return compute()
+    return filtered_menu_cache.get_or_set(key, compute)
+
+
+def get_similarity_index(snapshot):
+    """SimilarityIndex (ingredient LSH + where dishes are served) for the snapshot, built once per version."""
+    def build():
+        signatures = {}
+        for dish_id, packed in MenuItem.objects.values_list('id', 'minhash').iterator():
+            signature = unpack_signature(packed)
+            if signature is not None:
+                signatures[dish_id] = signature
+        return SimilarityIndex(snapshot, signatures)
+    
+    if snapshot.version is None:
+        return build()
+    return similarity_index_cache.get_or_set(snapshot.version, build)
+
+
+def similar_dishes_to_dicts(index, dish_ids, profile, limit):
+    """The `limit` most similar served dishes that are safe for the profile, serialized best first."""
+    user_diet_prefs = profile.dietPreferences or []
+    similar = index.similar(
+        dish_ids,
+        get_allergen_mask(profile.allergens or []),
+        get_diet_mask(user_diet_prefs),
+        bool(user_diet_prefs),
+        SIMILAR_DISH_THRESHOLD,
+    )
+    best = heapq.nsmallest(limit, similar.items(), key=lambda pair: (-pair[1], index.snapshot.dishes[pair[0]].name))
+    return [
+        {
+            **dish_to_dict(index.snapshot.dishes[dish_id]),
+            "similarity": round(similarity, 3),
+            "servedAt": [
+                {"hallId": hall.id, "hallName": hall.hallName, "date": date, "mealType": meal_type}
+                for hall, date, meal_type in index.servings[dish_id]
+            ],
+        }
+        for dish_id, similarity in best
+    ]
+
+
+def dish_to_dict(item):
+    """Serialize a snapshot meal item (Dish or plain name) for the JSON APIs."""
+    if not isinstance(item, Mapping):
+        return {"id": None, "name": item, "calories": 0, "allergens": [], "dietCategories": []}
+    return {
+        "id": item.get('id'),
+        "name": item['name'],
+        "calories": item.get('calories', 0) or 0,
+        "allergens": list(item.get('allergens') or []),
+        "dietCategories": list(item.get('dietCategories') or []),
+    }
+
+
 @login_required
 def recommendations_view(request):
     """Display personalized dining recommendations based on user preferences."""
@@ -417,78 +1006,38 @@ def recommendations_view(request):
     show_preferences_banner = not profile.surveyCompleted
     
     # Get meal type from URL parameter or auto-detect
-    meal_param = request.GET.get('meal', None)
     weekend = is_weekend()
-    
-    # No breakfast on weekends
-    if meal_param == 'breakfast' and weekend:
-        current_meal = 'lunch'  # Default to lunch on weekend
-    elif meal_param in ['breakfast', 'lunch', 'dinner']:
-        current_meal = meal_param
-    else:
-        current_meal = get_current_meal_type()
+    current_meal = resolve_meal_type(request.GET.get('meal', None), weekend)
     
     try:
-        dining_halls = get_dining_halls_data(current_user=request.user, include_filtered=True)
+        snapshot = get_menu_snapshot()
+        # Hall-level scores are skipped: this page ranks by the meal-specific scores below
+        dining_halls = get_dining_halls_data(
+            current_user=request.user, snapshot=snapshot, include_reviews=False, profile=profile,
+            include_scores=False
+        )
         
         # Get user preferences
         user_allergens = profile.allergens or []
         user_diet_prefs = profile.dietPreferences or []
         
-        # Get today's date to fetch menuByDate data
+        # Get today's date to fetch per-date menu data
         today = datetime.now().date()
-        today_str = today.strftime('%Y-%m-%d')
-        
-        # Get all dining halls from database to access menuByDate
-        db_halls = DiningHall.objects.all()
-        hall_menu_by_date = {}
-        for db_hall in db_halls:
-            if db_hall.menuByDate:
-                try:
-                    hall_dates = json.loads(db_hall.menuByDate)
-                    # Find today's menu data
-                    today_menu = next((d for d in hall_dates if d.get('date') == today_str), None)
-                    if today_menu and today_menu.get('meals'):
-                        hall_menu_by_date[db_hall.hallName] = today_menu.get('meals', {})
-                except (json.JSONDecodeError, TypeError):
-                    pass
-        
-        # Calculate meal-specific scores and filter meals for each hall
+        
+        # Filtered meals and meal-specific scores, shared by users with the same preferences
+        # Only items that are safe (no allergens) AND match diet preferences are kept
+        hall_menus = get_filtered_hall_menus(
+            snapshot, today.strftime('%Y-%m-%d'), current_meal, user_allergens, user_diet_prefs
+        )
+        
         for hall in dining_halls:
-            hall_name = hall.get('hallName', '')
-            
-            # Use menuByDate data for today if available, otherwise fallback to meals field
-            if hall_name in hall_menu_by_date:
-                # Use today's menu from menuByDate (this has correct breakfast/lunch separation)
-                original_meals = copy.deepcopy(hall_menu_by_date[hall_name])
-                hall['meals'] = original_meals  # Update hall['meals'] with today's data
-            else:
-                # Fallback to meals field if menuByDate not available
-                original_meals = hall.get('meals', {})
-                if not original_meals:
-                    original_meals = {"breakfast": [], "lunch": [], "dinner": []}
-            
-            # Calculate scores using the correct meal data
-            meal_score, meal_items, meal_rate = calculate_meal_specific_score(
-                hall, current_meal, user_allergens, user_diet_prefs
-            )
-            hall['mealScore'] = meal_score
-            hall['matchingItems'] = meal_items
-            hall['matchRate'] = meal_rate
-            
-            # Filter meals based on user preferences
-            # Only show items that are safe (no allergens) AND match diet preferences
-            # Filter meals separately for each meal type (breakfast, lunch, dinner)
-            hall['filteredMeals'] = filter_meals_by_preferences(
-                original_meals, user_allergens, user_diet_prefs
-            )
-            
-            # Count filtered items for display
-            hall['filteredCount'] = {
-                'breakfast': len(hall['filteredMeals'].get('breakfast', [])),
-                'lunch': len(hall['filteredMeals'].get('lunch', [])),
-                'dinner': len(hall['filteredMeals'].get('dinner', []))
-            }
+            hall_menu = hall_menus[hall['id']]
+            hall['meals'] = hall_menu['meals']
+            hall['filteredMeals'] = hall_menu['filteredMeals']
+            hall['mealScore'] = hall_menu['mealScore'] + (OPEN_HALL_BONUS if hall.get('isOpen') else 0)
+            hall['matchingItems'] = hall_menu['matchingItems']
+            hall['matchRate'] = hall_menu['matchRate']
+            hall['filteredCount'] = hall_menu['filteredCount']
         
         # Sort by match rate (percentage) first, then by score as tiebreaker
         # This ensures the displayed percentage matches the ranking order
@@ -530,41 +1079,190 @@ def recommendations_view(request):
     return render(request, 'menus/recommendations.html', context)
 
 
+@login_required
+@require_http_methods(["GET"])
+def top_dishes(request):
+    """
+    The best dishes for the user right now across all halls, as JSON.
+    Query params: meal (defaults to the current meal), limit (1-50).
+    """
+    try:
+        limit = min(max(int(request.GET.get("limit", TOP_DISHES)), 1), MAX_TOP_DISHES)
+    except ValueError:
+        return JsonResponse({"success": False, "error": "Invalid limit"}, status=400)
+    
+    profile, created = UserProfile.objects.get_or_create(user=request.user)
+    user_allergens = profile.allergens or []
+    user_diet_prefs = profile.dietPreferences or []
+    
+    now = datetime.now()
+    meal_type = resolve_meal_type(request.GET.get("meal"), is_weekend())
+    date_str = now.strftime('%Y-%m-%d')
+    snapshot = get_menu_snapshot()
+    open_halls = snapshot.schedule.status(now).openHalls
+    
+    entries = get_top_dishes(snapshot, date_str, meal_type, user_allergens, user_diet_prefs, open_halls, limit)
+    user_diet_mask = get_diet_mask(user_diet_prefs)
+    # Offline-trained factors (train_recommender), if any: one dot product per dish
+    factors = get_dish_factors()
+    personal_scores = factors.score(request.user.id, [entry[2]['name'] for entry in entries]) if factors else {}
+    return JsonResponse({
+        "success": True,
+        "meal": meal_type,
+        "date": date_str,
+        "dishes": [top_dish_to_dict(entry, user_diet_mask, open_halls, personal_scores) for entry in entries],
+    })
+
+
+@login_required
+@require_http_methods(["GET"])
+def week_plan(request):
+    """
+    "Plan my week": ranked halls and safe dishes for every date and meal with a
+    dated menu, for the user's preferences, as JSON.
+    """
+    profile, created = UserProfile.objects.get_or_create(user=request.user)
+    snapshot = get_menu_snapshot()
+    plan = get_week_plan(snapshot, profile.allergens or [], profile.dietPreferences or [])
+    return JsonResponse({"success": True, "days": plan})
+
+
+@login_required
+@require_http_methods(["GET"])
+def meal_plan(request):
+    """
+    Breakfast, lunch and dinner picks that add up to the user's calorie target, as JSON.
+    Query params: date (YYYY-MM-DD, defaults to today), target (kcal, defaults to calorieTarget).
+    """
+    profile, created = UserProfile.objects.get_or_create(user=request.user)
+    
+    date_str = request.GET.get("date") or datetime.now().strftime('%Y-%m-%d')
+    try:
+        datetime.strptime(date_str, '%Y-%m-%d')
+    except ValueError:
+        return JsonResponse({"success": False, "error": "Invalid date format"}, status=400)
+    try:
+        calorie_target = int(request.GET.get("target") or profile.calorieTarget or 2000)
+    except ValueError:
+        return JsonResponse({"success": False, "error": "Invalid calorie target"}, status=400)
+    if not 500 <= calorie_target <= 5000:
+        return JsonResponse({"success": False, "error": "Calorie target must be between 500 and 5000"}, status=400)
+    
+    snapshot = get_menu_snapshot()
+    table = get_calorie_plan_table(snapshot, date_str, profile.allergens or [], profile.dietPreferences or [])
+    plan = pick_plan(table, calorie_target)
+    score, total_calories, picks = plan if plan is not None else (0, 0, ())
+    return JsonResponse({
+        "success": True,
+        "date": date_str,
+        "calorieTarget": calorie_target,
+        "totalCalories": total_calories,
+        "score": score,
+        "meals": [
+            {
+                "mealType": meal_type,
+                "hallId": hall.id,
+                "hallName": hall.hallName,
+                "calories": sum(dish['calories'] for dish in dishes),
+                "dishes": [dish_to_dict(dish) for dish in dishes],
+            }
+            for meal_type, hall, dishes in picks
+        ],
+    })
+
+
+def _similar_limit(request):
+    return min(max(int(request.GET.get("limit", TOP_DISHES)), 1), MAX_TOP_DISHES)
+
+
+@login_required
+@require_http_methods(["GET"])
+def similar_dishes(request, dish_id):
+    """
+    Safe alternatives with similar ingredients to a dish, across all halls and dates, as JSON.
+    Query params: limit (1-50).
+    """
+    try:
+        limit = _similar_limit(request)
+    except ValueError:
+        return JsonResponse({"success": False, "error": "Invalid limit"}, status=400)
+    
+    snapshot = get_menu_snapshot()
+    dish = snapshot.dishes.get(dish_id)
+    if dish is None:
+        return JsonResponse({"success": False, "error": "Dish not found"}, status=404)
+    
+    profile, created = UserProfile.objects.get_or_create(user=request.user)
+    index = get_similarity_index(snapshot)
+    return JsonResponse({
+        "success": True,
+        "dish": dish_to_dict(dish),
+        "dishes": similar_dishes_to_dicts(index, [dish_id], profile, limit),
+    })
+
+
+@login_required
+@require_http_methods(["GET"])
+def similar_to_history(request):
+    """
+    Safe dishes similar to what the user ate on a day (default yesterday), as JSON.
+    Query params: date (YYYY-MM-DD), limit (1-50).
+    """
+    try:
+        limit = _similar_limit(request)
+    except ValueError:
+        return JsonResponse({"success": False, "error": "Invalid limit"}, status=400)
+    date_str = request.GET.get("date")
+    try:
+        day = datetime.strptime(date_str, '%Y-%m-%d').date() if date_str else datetime.now().date() - timedelta(days=1)
+    except ValueError:
+        return JsonResponse({"success": False, "error": "Invalid date format"}, status=400)
+    
+    record = MealHistory.objects.filter(user=request.user, date=day).first()
+    eaten = list(dict.fromkeys(
+        str(meal['name']) for meal in (record.meals if record else []) if isinstance(meal, dict) and meal.get('name')
+    ))
+    
+    profile, created = UserProfile.objects.get_or_create(user=request.user)
+    index = get_similarity_index(get_menu_snapshot())
+    dish_ids = [dish_id for name in eaten for dish_id in index.idsByName.get(name, ())]
+    return JsonResponse({
+        "success": True,
+        "date": day.strftime('%Y-%m-%d'),
+        "basedOn": eaten,
+        "dishes": similar_dishes_to_dicts(index, dish_ids, profile, limit),
+    })
+
+
 @login_required
 def menu_view(request):
     """Display dining halls with their menus and open/closed status."""
     weekend = is_weekend()
     
     try:
-        dining_halls = get_dining_halls_data(current_user=request.user)
+        # One snapshot for the whole page (each lookup reads the shared menu version)
+        snapshot = get_menu_snapshot()
+        dining_halls = get_dining_halls_data(
+            current_user=request.user, snapshot=snapshot, review_limit=REVIEW_PAGE_SIZE
+        )
         
-        # Get menuByDate for each dining hall
-        all_halls = DiningHall.objects.all()
-        menus_by_date = {}
-        available_dates = []
+        # Get per-date menus for each dining hall
+        menus_by_date = snapshot.get_menus_by_date()
         
-        for hall in all_halls:
-            # Parse menuByDate from TextField (stored as JSON string)
-            if hall.menuByDate:
-                try:
-                    hall_dates = json.loads(hall.menuByDate)
-                except (json.JSONDecodeError, TypeError):
-                    hall_dates = []
-            else:
-                hall_dates = []
-            menus_by_date[hall.hallName] = hall_dates
-            
-            # Collect available dates (use first hall's dates)
-            if not available_dates and hall_dates:
+        # Collect available dates (use first hall's dates)
+        available_dates = []
+        for hall_dates in menus_by_date.values():
+            if hall_dates:
                 available_dates = [
                     {
-                        'date': d.get('date'),
-                        'dateDisplay': d.get('dateDisplay'),
-                        'dayOfWeek': d.get('dayOfWeek'),
-                        'isWeekend': d.get('isWeekend', False)
+                        'date': d.date,
+                        'dateDisplay': d.dateDisplay,
+                        'dayOfWeek': d.dayOfWeek,
+                        'isWeekend': d.isWeekend
                     }
                     for d in hall_dates
                 ]
+                break
         
         context = {
             'dining_halls': dining_halls,
@@ -600,30 +1298,22 @@ def submit_review(request, hall_id):
             foodPreferences = request.POST.getlist("foodPreferences")
             
             # Try to get existing review, or create new one
-            review, created = Review.objects.update_or_create(
-                user=request.user,
-                diningHall=hall,
-                defaults={
-                    'rating': rating,
-                    'reviewText': reviewText,
-                    'foodPreferences': foodPreferences,
-                }
-            )
+            # ReviewStats is updated with F() by the Review post_save handler in the same transaction
+            with transaction.atomic():
+                review, created = Review.objects.update_or_create(
+                    user=request.user,
+                    diningHall=hall,
+                    defaults={
+                        'rating': rating,
+                        'reviewText': reviewText,
+                        'foodPreferences': foodPreferences,
+                    }
+                )
             
             return JsonResponse({
                 "success": True,
                 "created": created,  # True if new, False if updated
-                "review": {
-                    "id": review.id,
-                    "userId": review.user.id,
-                    "username": review.user.username,
-                    "rating": review.rating,
-                    "reviewText": review.reviewText,
-                    "foodPreferences": review.foodPreferences,
-                    "createdAt": review.createdAt.strftime("%Y-%m-%d %H:%M"),
-                    "updatedAt": review.updatedAt.strftime("%Y-%m-%d %H:%M"),
-                    "isOwner": True,
-                }
+                "review": review_to_dict(review, request.user),
             })
         except DiningHall.DoesNotExist:
             return JsonResponse({"success": False, "error": "Dining hall not found"}, status=404)
@@ -633,6 +1323,30 @@ def submit_review(request, hall_id):
     return JsonResponse({"success": False, "error": "Invalid request method"}, status=405)
 
 
+@login_required
+@require_http_methods(["GET"])
+def list_reviews(request, hall_id):
+    """
+    Reviews for one hall, newest first, via keyset pagination.
+    Query params: cursor (from nextCursor of the previous page), limit (1-50).
+    """
+    if not DiningHall.objects.filter(pk=hall_id).exists():
+        return JsonResponse({"success": False, "error": "Dining hall not found"}, status=404)
+    
+    try:
+        limit = min(max(int(request.GET.get("limit", REVIEW_PAGE_SIZE)), 1), MAX_REVIEW_PAGE_SIZE)
+        reviews, next_cursor = get_reviews_page(hall_id, request.GET.get("cursor"), limit)
+    except ValueError as e:
+        return JsonResponse({"success": False, "error": str(e)}, status=400)
+    
+    return JsonResponse({
+        "success": True,
+        "reviews": [review_to_dict(review, request.user) for review in reviews],
+        "nextCursor": next_cursor,
+        "hasMore": next_cursor is not None,
+    })
+
+
 @login_required
 def delete_review(request, hall_id):
     """Handle review deletion via AJAX."""
@@ -640,9 +1354,10 @@ def delete_review(request, hall_id):
         try:
             hall = DiningHall.objects.get(pk=hall_id)
             
-            # Only delete the current user's review
-            review = Review.objects.get(user=request.user, diningHall=hall)
-            review.delete()
+            # Only delete the current user's review (ReviewStats is updated by post_delete)
+            with transaction.atomic():
+                review = Review.objects.select_for_update().get(user=request.user, diningHall=hall)
+                review.delete()
             
             return JsonResponse({
                 "success": True,
@@ -873,7 +1588,8 @@ def convert_db_menu_to_recommendation_format(dining_halls_data):
                 "meal-name": "breakfast",
                 "allergens": [...],
                 "diets": [...],
-                "category-name": "..."
+                "category-name": "...",
+                "ingredient-list": ["..."]
             }
         ]
     }
@@ -897,14 +1613,15 @@ def convert_db_menu_to_recommendation_format(dining_halls_data):
         for meal_type in ['breakfast', 'lunch', 'dinner']:
             items = meals.get(meal_type, [])
             for item in items:
-                if isinstance(item, dict):
+                if isinstance(item, Mapping):
                     converted_item = {
                         "dish-name": item.get('name', 'Unknown'),
                         "meal-name": meal_type,
                         "allergens": item.get('allergens', []),
-                        "diets": item.get('dietTags', []),
+                        "diets": item.get('dietTags') or item.get('dietCategories') or [],
                         "category-name": meal_type.capitalize(),
-                        "calories": item.get('calories', 0)
+                        "calories": item.get('calories', 0),
+                        "ingredient-list": [item['ingredients']] if item.get('ingredients') else [],
                     }
                     result[slug].append(converted_item)
     
@@ -924,11 +1641,47 @@ def get_user_preferences_for_recommendation(profile):
     }
 
 
+def get_hall_quality_for_recommendation(dining_halls_data):
+    """
+    {hall slug: average rating} for recommendation.py, shrunk towards 3 by
+    HALL_QUALITY_PRIOR_REVIEWS neutral reviews so a hall with one 5-star
+    review doesn't outrank one with hundreds of 4-star reviews.
+    """
+    quality = {}
+    for hall in dining_halls_data:
+        count = hall.get('reviewCount', 0)
+        total = hall.get('avgRating', 0) * count
+        quality[hall.get('hallName', '').lower()] = (total + 3 * HALL_QUALITY_PRIOR_REVIEWS) / (count + HALL_QUALITY_PRIOR_REVIEWS)
+    return quality
+
+
+def get_ai_assistant_context(user):
+    """Menu data, preferences and hall quality for the AI assistant, in recommendation.py's format."""
+    profile, _ = UserProfile.objects.get_or_create(user=user)
+
+    # Get menu data from database
+    dining_halls_data = get_dining_halls_data(
+        current_user=user, include_filtered=False, include_reviews=False, profile=profile,
+        include_scores=False
+    )
+
+    # Convert to recommendation.py format
+    menu_data = convert_db_menu_to_recommendation_format(dining_halls_data)
+    return (
+        menu_data,
+        get_user_preferences_for_recommendation(profile),
+        get_hall_quality_for_recommendation(dining_halls_data),
+    )
+
+
 @login_required
 @require_http_methods(["POST"])
-def ai_assistant_api(request):
+async def ai_assistant_api(request):
     """
     AI Assistant API endpoint that uses recommendation.py to provide intelligent responses.
+    Async, so a pending LLM call holds no worker thread when served over ASGI
+    (smartdine.asgi); the call is capped by LLM_DEADLINE_SECONDS and
+    LLM_MAX_CONCURRENCY in recommendation.py.
     """
     try:
         data = json.loads(request.body)
@@ -940,20 +1693,13 @@ def ai_assistant_api(request):
                 'error': 'Message is required'
             }, status=400)
         
-        # Get user profile
-        profile, _ = UserProfile.objects.get_or_create(user=request.user)
-        
-        # Get menu data from database
-        dining_halls_data = get_dining_halls_data(current_user=request.user, include_filtered=False)
-        
-        # Convert to recommendation.py format
-        menu_data = convert_db_menu_to_recommendation_format(dining_halls_data)
-        
-        # Get user preferences
-        user_prefs = get_user_preferences_for_recommendation(profile)
+        user = await request.auser()
+        menu_data, user_prefs, hall_quality = await sync_to_async(get_ai_assistant_context)(user)
         
         # Use recommendation.py to get recommendations (pass menu_data from database)
-        recommendations = get_recommendations_for_all_dining(user_message, user_prefs, menu_data=menu_data)
+        recommendations = await get_recommendations_for_all_dining_async(
+            user_message, user_prefs, menu_data=menu_data, hall_quality=hall_quality
+        )
         
         # Format response for display
         response_text = format_recommendations_response(recommendations, user_message)
@@ -964,6 +1710,11 @@ def ai_assistant_api(request):
             'recommendations': recommendations
         })
         
+    except LLMTimeoutError as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=504)
     except Exception as e:
         import traceback
         traceback.print_exc()
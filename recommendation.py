@@ -1,14 +1,22 @@
 # recommendation.py
+import asyncio
+import hashlib
+import itertools
 import json
 import re
 import sys
 import os
-from datetime import datetime, date
-from collections import defaultdict
+import threading
+import weakref
+from datetime import datetime, date, timedelta
+from collections import defaultdict, OrderedDict
 from pathlib import Path
 
 from django.utils import timezone
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI, APITimeoutError
+
+from menus import lexical
+from menus.lexical import CandidateIndex
 
 # Load environment variables from .env file using python-dotenv
 from dotenv import load_dotenv
@@ -26,14 +34,41 @@ from umass_toolkit.dining import get_locations, get_menu
 
 # Get API key from environment variables (loaded from .env file or system env)
 _openrouter_api_key = os.environ.get('OPENROUTER_API_KEY') or os.environ.get('OPENAI_API_KEY')
-client = OpenAI(
+_openrouter_options = dict(
     base_url="https://openrouter.ai/api/v1",
     api_key=_openrouter_api_key,
     default_headers={
         "HTTP-Referer": "https://github.com/yourusername/UMass-SmartDine-Finder",  # Optional: for analytics
         "X-Title": "UMass SmartDine Finder",  # Optional: app name
     }
+)
+client = OpenAI(**_openrouter_options) if _openrouter_api_key else None
+
+LLM_MODEL = "openai/gpt-4o-mini"
+# Async calls (the AI assistant endpoint) give up after this many seconds,
+# counting the wait for one of the LLM_MAX_CONCURRENCY slots
+LLM_DEADLINE_SECONDS = float(os.environ.get('LLM_DEADLINE_SECONDS', 20))
+LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', 8))
+# No retries: a retry would only run into the deadline
+async_client = AsyncOpenAI(
+    **_openrouter_options, timeout=LLM_DEADLINE_SECONDS, max_retries=0
 ) if _openrouter_api_key else None
+_llm_semaphores = weakref.WeakKeyDictionary()  # event loop -> asyncio.Semaphore
+
+# Who ranks the filtered candidates:
+# - "llm": the LLM only; errors and timeouts propagate
+# - "lexical": the local BM25 ranker only (menus/lexical.py), no LLM call
+# - "fallback": the LLM, or the lexical ranker if the LLM fails, times out or has no API key
+# - "hedge": like fallback, but async callers get the lexical ranking if the LLM
+#   hasn't answered within LLM_HEDGE_SECONDS; the LLM call is then cancelled,
+#   since under WSGI the event loop ends with the request anyway
+RANKERS = ("llm", "lexical", "fallback", "hedge")
+RECOMMENDATION_RANKER = os.environ.get('RECOMMENDATION_RANKER', 'fallback')
+if RECOMMENDATION_RANKER not in RANKERS:
+    raise ValueError(f"RECOMMENDATION_RANKER must be one of {', '.join(RANKERS)}, not {RECOMMENDATION_RANKER!r}")
+LLM_HEDGE_SECONDS = float(os.environ.get('LLM_HEDGE_SECONDS', 2))
+# Candidates per hall that the local first stage passes on to the LLM
+PRE_RANK_TOP_K = int(os.environ.get('PRE_RANK_TOP_K', lexical.PRE_RANK_TOP_K))
 
 DINING_SLUGS = ["berkshire", "worcester", "franklin", "hampshire"]
 
@@ -57,6 +92,14 @@ def _current_meal_keys():
     return []
 
 
+def _meal_window_end(now):
+    """End of the meal window (see _current_meal_keys) containing now."""
+    for boundary in (7, 11, 16, 21):
+        if now.hour < boundary:
+            return now.replace(hour=boundary, minute=0, second=0, microsecond=0)
+    return now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+
+
 # ------------------------------------------------------------
 # Map slug → location ID
 # ------------------------------------------------------------
@@ -157,7 +200,8 @@ def _filter_menu_by_time_and_prefs(full_menu, prefs):
                 "diets": d.get("diets") or [],
             })
 
-        filtered[slug] = hall_candidates[:25]  # limit to reduce tokens
+        # No cap here: _build_rank_prompt packs as many as fit its token budget
+        filtered[slug] = hall_candidates
 
     return filtered
 
@@ -185,40 +229,173 @@ def _extract_json(raw):
 # ------------------------------------------------------------
 # Call LLM to rank dishes
 # ------------------------------------------------------------
-def _rank_with_llm(mood_text, prefs, candidates):
-    prefs_json = json.dumps(prefs, indent=2)
-    cands_json = json.dumps(candidates, indent=2)
-
-    prompt = f"""
-You are the UMass Dining recommendation engine.
-
-The user stored preferences:
-{prefs_json}
-
-User's current mood/request:
-\"\"\"{mood_text}\"\"\"
-
-These dishes are available NOW (after time-based filtering + allergen filtering):
-{cands_json}
-
-TASK:
-For each hall (berkshire, worcester, franklin, hampshire),
-select UP TO 3 dishes that BEST match:
-- allergies (must follow strictly)
-- diet (e.g., vegetarian)
-- user's likes/dislikes
-- user's goals
-- user's current mood text
-Return ONLY valid JSON like:
-
-{{
-  "berkshire": ["Dish A", "Dish B"],
-  "worcester": [],
-  "franklin": ["Dish"],
-  "hampshire": []
-}}
-"""
+# Upper bound for the whole ranking prompt; candidates are packed until it's reached
+LLM_PROMPT_TOKEN_BUDGET = int(os.environ.get('LLM_PROMPT_TOKEN_BUDGET', 1500))
+_HALL_ID_PREFIXES = {"berkshire": "B", "worcester": "W", "franklin": "F", "hampshire": "H"}
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("o200k_base")  # gpt-4o family
+except Exception:  # not installed, or the encoding can't be loaded offline
+    _encoding = None
+
+
+def count_tokens(text):
+    """Prompt tokens for text: exact with tiktoken, otherwise about 4 characters per token."""
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return (len(text) + 3) // 4
+
+
+class _CodeBook:
+    """Short codes (a1, a2, ... / d1, ...) for allergen and diet names, in order of first use."""
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.codes = {}
+
+    def preview(self, values):
+        """(codes for values, legend entries they would add) without assigning anything."""
+        codes, new = [], {}
+        for value in dict.fromkeys(values):
+            code = self.codes.get(value) or new.get(value)
+            if code is None:
+                code = new[value] = f"{self.prefix}{len(self.codes) + len(new) + 1}"
+            codes.append(code)
+        return " ".join(codes), [f"{code}={value}" for value, code in new.items()]
+
+    def add(self, values):
+        for value in values:
+            self.codes.setdefault(value, f"{self.prefix}{len(self.codes) + 1}")
+
+    def legend(self):
+        return ",".join(f"{code}={value}" for value, code in self.codes.items())
+
 
+def _hall_id_prefixes(slugs):
+    """
+    {slug: dish ID prefix}, distinct per hall and letters only, so no two
+    halls' IDs can collide. Other halls start with their first letter and
+    take more of the slug's letters while that prefix is taken.
+    """
+    prefixes = {slug: _HALL_ID_PREFIXES[slug] for slug in slugs if slug in _HALL_ID_PREFIXES}
+    taken = set(prefixes.values())
+    for slug in slugs:
+        if slug in prefixes:
+            continue
+        letters = "".join(c for c in slug.upper() if "A" <= c <= "Z") or "X"
+        prefix = letters[:1]
+        while prefix in taken:
+            prefix = letters[:len(prefix) + 1] if len(prefix) < len(letters) else prefix + "X"
+        prefixes[slug] = prefix
+        taken.add(prefix)
+    return prefixes
+
+
+def _build_rank_prompt(mood_text, prefs, candidates, token_budget=None):
+    """
+    Compact ranking prompt within token_budget (default LLM_PROMPT_TOKEN_BUDGET).
+
+    Each dish is one line "id|name|category|allergen codes|diet codes", with
+    the codes explained once in a legend. Candidates are taken round-robin
+    across halls in menu order and added while the prompt stays within the
+    budget, so every hall gets its share. The model answers with IDs.
+
+    Returns:
+        (prompt, {dish ID: (hall slug, dish name)} for the dishes included)
+    """
+    token_budget = LLM_PROMPT_TOKEN_BUDGET if token_budget is None else token_budget
+    prefs_json = json.dumps({k: v for k, v in prefs.items() if v}, separators=(",", ":"))
+    meals = {(d.get("meal") or "").lower() for dishes in candidates.values() for d in dishes}
+
+    head = (
+        "Rank UMass dining hall dishes for a student.\n"
+        f"Preferences: {prefs_json}\n"
+        f"Request: \"\"\"{mood_text}\"\"\"\n"
+    )
+    task = "Dishes available now, already filtered by meal time and allergens, as id|name|category|allergens|diets:\n"
+    tail = (
+        "For each hall pick UP TO 3 dish ids that best match: allergies (strictly), diet, "
+        "likes/dislikes, goals and the request.\n"
+        f"Return ONLY JSON with dish ids, like {json.dumps({slug: [] for slug in DINING_SLUGS})}"
+    )
+    # Fixed text, plus "Codes: " and its newline in case a legend is needed
+    used = count_tokens(head + task + tail) + 3
+
+    allergens, diets = _CodeBook("a"), _CodeBook("d")
+    prefixes = _hall_id_prefixes(candidates)
+    lines = {slug: [] for slug in candidates}
+    ids = {}
+    for row in itertools.zip_longest(*candidates.values()):
+        for slug, d in zip(candidates, row):
+            if d is None:
+                continue
+            category = d.get("category") or ""
+            if category.lower() in meals:
+                category = ""  # just the meal name again
+            if len(meals) > 1:
+                category = f"{d.get('meal') or ''} {category}".strip()
+            dish_allergens = [str(a) for a in d.get("allergens") or []]
+            dish_diets = [str(x) for x in d.get("diets") or []]
+            allergen_codes, new_allergens = allergens.preview(dish_allergens)
+            diet_codes, new_diets = diets.preview(dish_diets)
+            dish_id = f"{prefixes[slug]}{len(lines[slug]) + 1}"
+            line = f"{dish_id}|{d['name']}|{category}|{allergen_codes}|{diet_codes}"
+
+            cost = count_tokens(line) + 1
+            if not lines[slug]:
+                cost += count_tokens(slug) + 1
+            if new_allergens or new_diets:
+                cost += count_tokens(",".join(new_allergens + new_diets)) + 1
+            if used + cost > token_budget:
+                continue  # a shorter dish may still fit
+            used += cost
+            allergens.add(dish_allergens)
+            diets.add(dish_diets)
+            lines[slug].append(line)
+            ids[dish_id] = (slug, d["name"])
+
+    legend = ";".join(filter(None, [allergens.legend(), diets.legend()]))
+    body = "".join(f"{slug}\n" + "\n".join(hall_lines) + "\n" for slug, hall_lines in lines.items() if hall_lines)
+    prompt = head + (f"Codes: {legend}\n" if legend else "") + task + body + tail
+    return prompt, ids
+
+
+def _rank_messages(mood_text, prefs, candidates):
+    """(chat messages, dish IDs) for a ranking request."""
+    prompt, ids = _build_rank_prompt(mood_text, prefs, candidates)
+    return [
+        {"role": "system", "content": "You output ONLY JSON. No explanations."},
+        {"role": "user", "content": prompt},
+    ], ids
+
+
+def _parse_rank_response(resp, ids):
+    """
+    {hall slug: dish names} from the model's ID answer.
+    IDs are looked up exactly (case-insensitively); unknown IDs, repeats and
+    anything past 3 per hall are dropped, and a dish always goes to the hall
+    its ID belongs to.
+    """
+    raw = resp.choices[0].message.content.strip()
+    parsed = _extract_json(raw)
+    lookup = {dish_id.upper(): dish for dish_id, dish in ids.items()}
+
+    result = {slug: [] for slug in DINING_SLUGS}
+    for picks in parsed.values():
+        if not isinstance(picks, list):
+            continue
+        for pick in picks:
+            dish = lookup.get(str(pick).strip().upper())
+            if dish is None:
+                continue
+            hall = result.setdefault(dish[0], [])
+            if dish[1] not in hall and len(hall) < 3:
+                hall.append(dish[1])
+    return result
+
+
+def _rank_with_llm(mood_text, prefs, candidates):
     if client is None:
         raise ValueError(
             "OpenRouter API key not found. Please set OPENROUTER_API_KEY or OPENAI_API_KEY environment variable."
@@ -226,30 +403,251 @@ Return ONLY valid JSON like:
     
     # OpenRouter supports many models. Using a cost-effective model.
     # You can change this to any model supported by OpenRouter (e.g., "openai/gpt-4o-mini", "anthropic/claude-3-haiku", etc.)
+    messages, ids = _rank_messages(mood_text, prefs, candidates)
     resp = client.chat.completions.create(
-        model="openai/gpt-4o-mini",  # OpenRouter model format: provider/model-name
-        messages=[
-            {"role": "system", "content": "You output ONLY JSON. No explanations."},
-            {"role": "user", "content": prompt},
-        ],
+        model=LLM_MODEL,  # OpenRouter model format: provider/model-name
+        messages=messages,
         temperature=0.2
     )
+    return _parse_rank_response(resp, ids)
 
-    raw = resp.choices[0].message.content.strip()
-    parsed = _extract_json(raw)
 
-    result = {slug: parsed.get(slug, []) for slug in DINING_SLUGS}
-    for k in result:
-        if not isinstance(result[k], list):
-            result[k] = []
-        result[k] = [str(x) for x in result[k]]
-    return result
+class LLMTimeoutError(Exception):
+    """The LLM did not answer within LLM_DEADLINE_SECONDS (including the wait for a free slot)."""
+
+
+def _llm_semaphore():
+    """
+    Semaphore capping in-flight async LLM calls at LLM_MAX_CONCURRENCY.
+    asyncio semaphores belong to one event loop; an ASGI server runs one loop
+    per process, so this is the process-wide limit.
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = _llm_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _llm_semaphores[loop] = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return semaphore
+
+
+async def _rank_with_llm_async(mood_text, prefs, candidates):
+    """_rank_with_llm on the async client, bounded by the semaphore and the deadline."""
+    if async_client is None:
+        raise ValueError(
+            "OpenRouter API key not found. Please set OPENROUTER_API_KEY or OPENAI_API_KEY environment variable."
+        )
+    messages, ids = _rank_messages(mood_text, prefs, candidates)
+
+    async def call():
+        async with _llm_semaphore():
+            return await async_client.chat.completions.create(
+                model=LLM_MODEL,
+                messages=messages,
+                temperature=0.2
+            )
+
+    try:
+        resp = await asyncio.wait_for(call(), LLM_DEADLINE_SECONDS)
+    except (asyncio.TimeoutError, APITimeoutError):
+        raise LLMTimeoutError(f"No answer from the LLM within {LLM_DEADLINE_SECONDS:g}s") from None
+    return _parse_rank_response(resp, ids)
+
+
+# ------------------------------------------------------------
+# LLM response cache
+# ------------------------------------------------------------
+RANK_CACHE_SIZE = 1024
+
+
+class RankCache:
+    """
+    Thread-safe LRU cache whose entries also expire at a given time.
+    Counts hits, misses (including expired entries), expirations and evictions.
+    """
+
+    def __init__(self, maxsize=RANK_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.expired = self.evictions = 0
+
+    def get(self, key, now):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] <= now:
+                del self._data[key]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, expires_at):
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.expired = self.evictions = 0
+
+    def info(self):
+        with self._lock:
+            return {
+                "hits": self.hits, "misses": self.misses, "expired": self.expired,
+                "evictions": self.evictions, "size": len(self._data), "maxsize": self.maxsize,
+            }
+
+
+rank_cache = RankCache()
+
+
+def _normalize_mood(mood_text):
+    """Lowercase words only, so case, spacing and punctuation don't change the key."""
+    return " ".join(re.findall(r"[a-z0-9']+", (mood_text or "").lower()))
+
+
+def _canonical(value):
+    """Preferences with lowercased strings and lists sorted, so ordering doesn't change the key."""
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        return sorted((_canonical(v) for v in value), key=lambda v: json.dumps(v, sort_keys=True))
+    if isinstance(value, str):
+        return value.strip().lower()
+    return value
+
+
+def _rank_cache_key(mood_text, prefs, candidates):
+    candidates_hash = hashlib.sha256(json.dumps(candidates, sort_keys=True).encode()).hexdigest()
+    payload = json.dumps([_normalize_mood(mood_text), _canonical(prefs), candidates_hash], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _rank_with_cache(mood_text, prefs, candidates):
+    """
+    _rank_with_llm behind rank_cache.
+    Entries expire when the current meal window ends, since the candidates
+    and what the user is asking for change with the meal. Failed calls are
+    not cached.
+    """
+    key = _rank_cache_key(mood_text, prefs, candidates)
+    now = timezone.localtime()
+    result = rank_cache.get(key, now)
+    if result is None:
+        result = _rank_with_llm(mood_text, prefs, candidates)
+        rank_cache.set(key, result, _meal_window_end(now))
+    return _copy_ranking(result)
+
+
+async def _rank_with_cache_async(mood_text, prefs, candidates):
+    """_rank_with_cache for the async client."""
+    key = _rank_cache_key(mood_text, prefs, candidates)
+    now = timezone.localtime()
+    result = rank_cache.get(key, now)
+    if result is None:
+        result = await _rank_with_llm_async(mood_text, prefs, candidates)
+        rank_cache.set(key, result, _meal_window_end(now))
+    return _copy_ranking(result)
+
+
+def _copy_ranking(result):
+    # Callers get their own lists; the cached ones are shared
+    return {slug: list(dishes) for slug, dishes in result.items()}
+
+
+# ------------------------------------------------------------
+# Local lexical ranking and ranker selection
+# ------------------------------------------------------------
+lexical_index_cache = RankCache(maxsize=64)
+
+
+def _ingredients_by_name(full_menu):
+    ingredients = {}
+    for dishes in full_menu.values():
+        for d in dishes:
+            if d.get("ingredient-list"):
+                ingredients[_extract_name(d)] = " ".join(d["ingredient-list"])
+    return ingredients
+
+
+def _candidate_index(candidates, full_menu):
+    """BM25 index over the candidates, built once per candidate set and meal window."""
+    ingredients = _ingredients_by_name(full_menu)
+    ingredients = {
+        dish["name"]: ingredients[dish["name"]]
+        for dishes in candidates.values() for dish in dishes if dish["name"] in ingredients
+    }
+    key = hashlib.sha256(json.dumps([candidates, ingredients], sort_keys=True).encode()).hexdigest()
+    now = timezone.localtime()
+    index = lexical_index_cache.get(key, now)
+    if index is None:
+        index = CandidateIndex(candidates, ingredients)
+        lexical_index_cache.set(key, index, _meal_window_end(now))
+    return index
+
+
+def _lexical_query(mood_text, prefs):
+    return " ".join([mood_text or "", *(str(like) for like in prefs.get("likes") or [])])
+
+
+def _rank_lexical(mood_text, prefs, index):
+    """Local BM25 ranking: up to 3 dishes per hall."""
+    result = index.rank(_lexical_query(mood_text, prefs), prefs.get("diet") or [])
+    return {slug: result.get(slug, []) for slug in DINING_SLUGS}
+
+
+def _shortlist(mood_text, prefs, index, hall_quality):
+    """
+    First stage in front of the LLM: the PRE_RANK_TOP_K best candidates per
+    hall by mood keyword overlap and diet match, best-reviewed halls first.
+    """
+    return index.prerank(_lexical_query(mood_text, prefs), prefs.get("diet") or [], PRE_RANK_TOP_K, hall_quality)
+
+
+def _rank(mood_text, prefs, candidates, full_menu, hall_quality=None):
+    """Rank with RECOMMENDATION_RANKER. Without an event loop "hedge" can't race, so it acts as "fallback"."""
+    index = _candidate_index(candidates, full_menu)
+    if RECOMMENDATION_RANKER == "lexical":
+        return _rank_lexical(mood_text, prefs, index)
+    try:
+        return _rank_with_cache(mood_text, prefs, _shortlist(mood_text, prefs, index, hall_quality))
+    except Exception:
+        if RECOMMENDATION_RANKER == "llm":
+            raise
+        return _rank_lexical(mood_text, prefs, index)
+
+
+async def _rank_async(mood_text, prefs, candidates, full_menu, hall_quality=None):
+    """_rank for async callers, including the "hedge" race."""
+    index = _candidate_index(candidates, full_menu)
+    if RECOMMENDATION_RANKER == "lexical":
+        return _rank_lexical(mood_text, prefs, index)
+    shortlist = _shortlist(mood_text, prefs, index, hall_quality)
+    llm = asyncio.ensure_future(_rank_with_cache_async(mood_text, prefs, shortlist))
+    if RECOMMENDATION_RANKER == "hedge":
+        done, _ = await asyncio.wait({llm}, timeout=LLM_HEDGE_SECONDS)
+        if not done:
+            llm.cancel()
+            return _rank_lexical(mood_text, prefs, index)
+    try:
+        return await llm
+    except Exception:
+        if RECOMMENDATION_RANKER == "llm":
+            raise
+        return _rank_lexical(mood_text, prefs, index)
 
 
 # ------------------------------------------------------------
 # MAIN PUBLIC FUNCTION
 # ------------------------------------------------------------
-def get_recommendations_for_all_dining(mood_text, stored_preferences, menu_data=None):
+def get_recommendations_for_all_dining(mood_text, stored_preferences, menu_data=None, hall_quality=None):
     """
     Get recommendations for all dining halls.
     
@@ -258,30 +656,50 @@ def get_recommendations_for_all_dining(mood_text, stored_preferences, menu_data=
         stored_preferences: User preferences dict
         menu_data: Optional pre-formatted menu data (from database).
                    If None, will fetch from umass_toolkit API.
+        hall_quality: Optional {hall slug: review-based rating}; better rated
+                   halls get their dishes into the LLM prompt first.
     
     Returns:
         Dict mapping hall slugs to list of recommended dish names
     """
+    full_menu = menu_data if menu_data is not None else _fetch_full_menu()
+
+    # Hard filter
+    candidates = _filter_menu_by_time_and_prefs(full_menu, stored_preferences)
+
+    # Local pre-ranking, then LLM and/or lexical ranking (RECOMMENDATION_RANKER);
+    # LLM answers are reused for repeated requests within the meal window
+    return _rank(mood_text, stored_preferences, candidates, full_menu, hall_quality)
+
+
+async def get_recommendations_for_all_dining_async(mood_text, stored_preferences, menu_data=None, hall_quality=None):
+    """
+    get_recommendations_for_all_dining for async views.
+    The LLM call doesn't block a thread, waits for one of LLM_MAX_CONCURRENCY
+    slots and raises LLMTimeoutError after LLM_DEADLINE_SECONDS (with the
+    "llm" ranker; the others answer from the lexical ranker instead).
+    """
     if menu_data is not None:
-        # Use provided menu data (from database)
         full_menu = menu_data
     else:
-        # Fetch from umass_toolkit API (original behavior)
-        if get_menu is None:
-            raise ImportError(
-                "umass_toolkit is not available and no menu_data provided. "
-                "Either install umass_toolkit or provide menu_data parameter."
-            )
-        slug_to_id = _map_slug_to_location_id()
-        today = timezone.localdate()
+        full_menu = await asyncio.to_thread(_fetch_full_menu)
 
-        # Fetch full raw menu
-        full_menu = {}
-        for slug in DINING_SLUGS:
-            full_menu[slug] = get_menu(slug_to_id[slug], date=today)
-
-    # Hard filter
     candidates = _filter_menu_by_time_and_prefs(full_menu, stored_preferences)
+    return await _rank_async(mood_text, stored_preferences, candidates, full_menu, hall_quality)
+
 
-    # LLM ranking
-    return _rank_with_llm(mood_text, stored_preferences, candidates)
+def _fetch_full_menu():
+    """Today's raw menus for every hall from the umass_toolkit API (original behavior)."""
+    if get_menu is None:
+        raise ImportError(
+            "umass_toolkit is not available and no menu_data provided. "
+            "Either install umass_toolkit or provide menu_data parameter."
+        )
+    slug_to_id = _map_slug_to_location_id()
+    today = timezone.localdate()
+
+    # Fetch full raw menu
+    full_menu = {}
+    for slug in DINING_SLUGS:
+        full_menu[slug] = get_menu(slug_to_id[slug], date=today)
+    return full_menu
@@ -82,6 +82,37 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# - default: per-process memory, holds each worker's menu snapshots
+# - shared: seen by every process (web workers, import_menus), holds the menu
+#   version so an import or admin edit reaches all workers at once. Needs
+#   `python manage.py createcachetable`; Redis/Memcached work as well
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'smartdine',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'smartdine_cache',
+    },
+}
+
+# Cache alias holding the menu version; must be shared by all processes
+MENU_VERSION_CACHE = 'shared'
+
+# Seconds a built menu snapshot stays cached before it is rebuilt from the database
+MENU_CACHE_TIMEOUT = 300
+
+# Max preference profiles whose filtered menus are kept in memory per process
+FILTERED_MENU_CACHE_SIZE = 512
+
+# Collaborative-filtering factors written by `manage.py train_recommender`
+DISH_FACTORS_PATH = BASE_DIR / 'dish_factors.npz'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 